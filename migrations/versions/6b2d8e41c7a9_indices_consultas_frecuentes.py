@@ -0,0 +1,62 @@
+"""indices consultas frecuentes
+
+Revision ID: 6b2d8e41c7a9
+Revises: 2a0599c2f04b
+Create Date: 2026-10-18 09:12:41.508310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b2d8e41c7a9'
+down_revision = '2a0599c2f04b'
+branch_labels = None
+depends_on = None
+
+
+# (nombre, tabla, columnas) - alineados con los filter_by/order_by de api/routes.py
+INDICES = [
+    # comentarios de un ticket ordenados por fecha, chats y solicitud de reapertura
+    ('ix_comentarios_id_ticket_fecha', 'comentarios', ['id_ticket', 'fecha_comentario']),
+    # escalaciones del analista en /tickets/analista
+    ('ix_comentarios_id_analista_fecha', 'comentarios', ['id_analista', 'fecha_comentario']),
+    # bandeja del analista y filter_by(id_ticket, id_analista)
+    ('ix_asignacion_id_analista_id_ticket', 'asignacion', ['id_analista', 'id_ticket']),
+    # asignación actual de un ticket
+    ('ix_asignacion_id_ticket_fecha', 'asignacion', ['id_ticket', 'fecha_asignacion']),
+    # listas del supervisor por estado, paginadas por (fecha_creacion, id)
+    ('ix_ticket_estado_fecha_id', 'ticket', ['estado', 'fecha_creacion', 'id']),
+    # tickets del cliente autenticado
+    ('ix_ticket_id_cliente_estado', 'ticket', ['id_cliente', 'estado']),
+    # listar_tickets paginado por (fecha_creacion, id)
+    ('ix_ticket_fecha_id', 'ticket', ['fecha_creacion', 'id']),
+]
+
+
+def _concurrente():
+    return op.get_context().dialect.name == 'postgresql'
+
+
+def upgrade():
+    # En PostgreSQL se construyen con CREATE INDEX CONCURRENTLY, que no puede ir dentro de una transacción
+    if _concurrente():
+        with op.get_context().autocommit_block():
+            for nombre, tabla, columnas in INDICES:
+                op.create_index(nombre, tabla, columnas, unique=False,
+                                postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for nombre, tabla, columnas in INDICES:
+            op.create_index(nombre, tabla, columnas, unique=False)
+
+
+def downgrade():
+    if _concurrente():
+        with op.get_context().autocommit_block():
+            for nombre, tabla, _ in reversed(INDICES):
+                op.drop_index(nombre, table_name=tabla,
+                              postgresql_concurrently=True, if_exists=True)
+    else:
+        for nombre, tabla, _ in reversed(INDICES):
+            op.drop_index(nombre, table_name=tabla)
@@ -0,0 +1,66 @@
+"""ticket asignacion actual y reapertura pendiente
+
+Revision ID: 9e4a73c1d5f2
+Revises: 6b2d8e41c7a9
+Create Date: 2026-10-18 10:03:17.224961
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4a73c1d5f2'
+down_revision = '6b2d8e41c7a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('ticket', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('id_asignacion_actual', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('reapertura_pendiente', sa.Boolean(), server_default=sa.false(), nullable=False))
+        batch_op.create_foreign_key('fk_ticket_asignacion_actual', 'asignacion',
+                                    ['id_asignacion_actual'], ['id'], ondelete='SET NULL')
+
+    # Backfill: asignación más reciente de cada ticket
+    op.execute(sa.text("""
+        UPDATE ticket SET id_asignacion_actual = (
+            SELECT a.id FROM asignacion a
+            WHERE a.id_ticket = ticket.id
+            ORDER BY a.fecha_asignacion DESC, a.id DESC
+            LIMIT 1
+        )
+    """))
+
+    # Backfill: misma regla que tiene_solicitud_reapertura_pendiente() - primera solicitud
+    # del cliente sin aprobación posterior de un supervisor
+    op.get_bind().execute(sa.text("""
+        UPDATE ticket SET reapertura_pendiente = :verdadero
+        WHERE lower(ticket.estado) = 'solucionado'
+        AND EXISTS (
+            SELECT 1 FROM comentarios s
+            WHERE s.id = (
+                SELECT min(s2.id) FROM comentarios s2
+                WHERE s2.id_ticket = ticket.id AND s2.texto = :solicitud
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM comentarios d
+                WHERE d.id_ticket = ticket.id
+                AND d.fecha_comentario > s.fecha_comentario
+                AND d.id_supervisor IS NOT NULL
+                AND d.texto LIKE :aprobacion
+            )
+        )
+    """), {
+        "verdadero": True,
+        "solicitud": "Cliente solicitó reapertura del ticket - Pendiente de decisión del supervisor",
+        "aprobacion": "%Supervisor aprobó solicitud de reapertura%",
+    })
+
+
+def downgrade():
+    with op.batch_alter_table('ticket', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_ticket_asignacion_actual', type_='foreignkey')
+        batch_op.drop_column('reapertura_pendiente')
+        batch_op.drop_column('id_asignacion_actual')
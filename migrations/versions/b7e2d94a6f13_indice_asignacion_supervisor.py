@@ -0,0 +1,44 @@
+"""indice asignacion supervisor
+
+Revision ID: b7e2d94a6f13
+Revises: f1a7c3e5d920
+Create Date: 2026-10-18 16:42:08.214377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2d94a6f13'
+down_revision = 'f1a7c3e5d920'
+branch_labels = None
+depends_on = None
+
+
+# tickets asignados por el supervisor (join_critical_rooms)
+INDICE = ('ix_asignacion_id_supervisor_id_ticket', 'asignacion', ['id_supervisor', 'id_ticket'])
+
+
+def _concurrente():
+    return op.get_context().dialect.name == 'postgresql'
+
+
+def upgrade():
+    nombre, tabla, columnas = INDICE
+    # En PostgreSQL se construye con CREATE INDEX CONCURRENTLY, que no puede ir dentro de una transacción
+    if _concurrente():
+        with op.get_context().autocommit_block():
+            op.create_index(nombre, tabla, columnas, unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+    else:
+        op.create_index(nombre, tabla, columnas, unique=False)
+
+
+def downgrade():
+    nombre, tabla, _ = INDICE
+    if _concurrente():
+        with op.get_context().autocommit_block():
+            op.drop_index(nombre, table_name=tabla, postgresql_concurrently=True, if_exists=True)
+    else:
+        op.drop_index(nombre, table_name=tabla)
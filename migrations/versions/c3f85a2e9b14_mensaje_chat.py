@@ -0,0 +1,103 @@
+"""mensaje chat
+
+Revision ID: c3f85a2e9b14
+Revises: 9e4a73c1d5f2
+Create Date: 2026-10-18 11:20:54.873102
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f85a2e9b14'
+down_revision = '9e4a73c1d5f2'
+branch_labels = None
+depends_on = None
+
+
+# prefijo en comentarios.texto -> canal en mensaje_chat
+CANALES = {
+    'CHAT_SUPERVISOR_ANALISTA:': 'supervisor_analista',
+    'CHAT_ANALISTA_CLIENTE:': 'analista_cliente',
+}
+
+canal_chat = sa.Enum('supervisor_analista', 'analista_cliente', name='canal_chat')
+
+comentarios = sa.table(
+    'comentarios',
+    sa.column('id', sa.Integer),
+    sa.column('id_ticket', sa.Integer),
+    sa.column('id_cliente', sa.Integer),
+    sa.column('id_analista', sa.Integer),
+    sa.column('id_supervisor', sa.Integer),
+    sa.column('texto', sa.Text),
+    sa.column('fecha_comentario', sa.DateTime),
+)
+
+
+def upgrade():
+    mensaje_chat = op.create_table('mensaje_chat',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('id_ticket', sa.Integer(), nullable=False),
+        sa.Column('canal', canal_chat, nullable=False),
+        sa.Column('id_cliente', sa.Integer(), nullable=True),
+        sa.Column('id_analista', sa.Integer(), nullable=True),
+        sa.Column('id_supervisor', sa.Integer(), nullable=True),
+        sa.Column('mensaje', sa.Text(), nullable=False),
+        sa.Column('fecha_mensaje', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['id_analista'], ['analista.id'], ),
+        sa.ForeignKeyConstraint(['id_cliente'], ['cliente.id'], ),
+        sa.ForeignKeyConstraint(['id_supervisor'], ['supervisor.id'], ),
+        sa.ForeignKeyConstraint(['id_ticket'], ['ticket.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_mensaje_chat_ticket_canal_id', 'mensaje_chat', ['id_ticket', 'canal', 'id'], unique=False)
+
+    # Mover los comentarios con prefijo de chat a la nueva tabla, en orden de id
+    conexion = op.get_bind()
+    for prefijo, canal in CANALES.items():
+        filas = conexion.execute(
+            sa.select(comentarios).where(comentarios.c.texto.like(prefijo + '%')).order_by(comentarios.c.id)
+        ).fetchall()
+        if not filas:
+            continue
+        op.bulk_insert(mensaje_chat, [{
+            'id_ticket': f.id_ticket,
+            'canal': canal,
+            'id_cliente': f.id_cliente,
+            'id_analista': f.id_analista,
+            'id_supervisor': f.id_supervisor,
+            'mensaje': f.texto[len(prefijo):],
+            'fecha_mensaje': f.fecha_comentario,
+        } for f in filas])
+        op.execute(comentarios.delete().where(comentarios.c.texto.like(prefijo + '%')))
+
+
+def downgrade():
+    mensaje_chat = sa.table(
+        'mensaje_chat',
+        sa.column('id', sa.Integer),
+        sa.column('id_ticket', sa.Integer),
+        sa.column('canal', sa.String),
+        sa.column('id_cliente', sa.Integer),
+        sa.column('id_analista', sa.Integer),
+        sa.column('id_supervisor', sa.Integer),
+        sa.column('mensaje', sa.Text),
+        sa.column('fecha_mensaje', sa.DateTime),
+    )
+    prefijos = {canal: prefijo for prefijo, canal in CANALES.items()}
+    filas = op.get_bind().execute(sa.select(mensaje_chat).order_by(mensaje_chat.c.id)).fetchall()
+    if filas:
+        op.bulk_insert(comentarios, [{
+            'id_ticket': f.id_ticket,
+            'id_cliente': f.id_cliente,
+            'id_analista': f.id_analista,
+            'id_supervisor': f.id_supervisor,
+            'texto': prefijos[f.canal] + f.mensaje,
+            'fecha_comentario': f.fecha_mensaje,
+        } for f in filas])
+
+    op.drop_index('ix_mensaje_chat_ticket_canal_id', table_name='mensaje_chat')
+    op.drop_table('mensaje_chat')
+    canal_chat.drop(op.get_bind(), checkfirst=True)
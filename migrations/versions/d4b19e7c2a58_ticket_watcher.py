@@ -0,0 +1,53 @@
+"""ticket watcher
+
+Revision ID: d4b19e7c2a58
+Revises: b7e2d94a6f13
+Create Date: 2026-10-18 18:21:47.530912
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b19e7c2a58'
+down_revision = 'b7e2d94a6f13'
+branch_labels = None
+depends_on = None
+
+
+# Watchers automáticos de los datos existentes: el cliente de cada ticket y el
+# analista/supervisor de su asignación actual (los mismos que mantiene models.mantener_watchers)
+RELLENO = (
+    "INSERT INTO ticket_watcher (id_ticket, rol, id_usuario, motivo, fecha_creacion) "
+    "SELECT id, 'cliente', id_cliente, 'cliente', :fecha FROM ticket",
+    "INSERT INTO ticket_watcher (id_ticket, rol, id_usuario, motivo, fecha_creacion) "
+    "SELECT t.id, 'analista', a.id_analista, 'analista', :fecha FROM ticket t "
+    "JOIN asignacion a ON a.id = t.id_asignacion_actual",
+    "INSERT INTO ticket_watcher (id_ticket, rol, id_usuario, motivo, fecha_creacion) "
+    "SELECT t.id, 'supervisor', a.id_supervisor, 'supervisor', :fecha FROM ticket t "
+    "JOIN asignacion a ON a.id = t.id_asignacion_actual",
+)
+
+
+def upgrade():
+    op.create_table('ticket_watcher',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('id_ticket', sa.Integer(), nullable=False),
+        sa.Column('rol', sa.String(length=20), nullable=False),
+        sa.Column('id_usuario', sa.Integer(), nullable=False),
+        sa.Column('motivo', sa.String(length=20), nullable=False),
+        sa.Column('fecha_creacion', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['id_ticket'], ['ticket.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('id_ticket', 'rol', 'id_usuario', 'motivo', name='uq_ticket_watcher')
+    )
+
+    fecha = datetime.now()
+    for sentencia in RELLENO:
+        op.execute(sa.text(sentencia).bindparams(fecha=fecha))
+
+
+def downgrade():
+    op.drop_table('ticket_watcher')
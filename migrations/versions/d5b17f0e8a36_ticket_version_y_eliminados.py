@@ -0,0 +1,53 @@
+"""ticket version, contador de versiones y tickets eliminados
+
+Revision ID: d5b17f0e8a36
+Revises: c3f85a2e9b14
+Create Date: 2026-10-18 11:41:05.731842
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5b17f0e8a36'
+down_revision = 'c3f85a2e9b14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    contador = op.create_table('contador_version',
+        sa.Column('nombre', sa.String(length=50), nullable=False),
+        sa.Column('valor', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('nombre')
+    )
+    op.create_table('ticket_eliminado',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('id_ticket', sa.Integer(), nullable=False),
+        sa.Column('id_cliente', sa.Integer(), nullable=True),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('fecha_eliminacion', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('ticket_eliminado', schema=None) as batch_op:
+        batch_op.create_index('ix_ticket_eliminado_version', ['version'], unique=False)
+
+    with op.batch_alter_table('ticket', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_ticket_version', ['version'], unique=False)
+
+    # Los tickets existentes quedan en la versión 0; el primer cambio usa la 1
+    op.bulk_insert(contador, [{'nombre': 'tickets', 'valor': 0}])
+
+
+def downgrade():
+    with op.batch_alter_table('ticket', schema=None) as batch_op:
+        batch_op.drop_index('ix_ticket_version')
+        batch_op.drop_column('version')
+
+    with op.batch_alter_table('ticket_eliminado', schema=None) as batch_op:
+        batch_op.drop_index('ix_ticket_eliminado_version')
+
+    op.drop_table('ticket_eliminado')
+    op.drop_table('contador_version')
@@ -0,0 +1,52 @@
+"""identidad: índice de usuarios por email
+
+Revision ID: e8c4a9d2b71f
+Revises: d5b17f0e8a36
+Create Date: 2026-10-18 13:22:48.105937
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8c4a9d2b71f'
+down_revision = 'd5b17f0e8a36'
+branch_labels = None
+depends_on = None
+
+
+# (rol, tabla) - mismos valores que ROLES_IDENTIDAD en api/models.py
+ROLES = [
+    ('cliente', 'cliente'),
+    ('analista', 'analista'),
+    ('supervisor', 'supervisor'),
+    ('administrador', 'administrador'),
+]
+
+
+def upgrade():
+    op.create_table('identidad',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('rol', sa.String(length=20), nullable=False),
+        sa.Column('id_usuario', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email', 'rol', name='uq_identidad_email_rol'),
+        sa.UniqueConstraint('rol', 'id_usuario', name='uq_identidad_rol_id_usuario')
+    )
+    with op.batch_alter_table('identidad', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_identidad_email'), ['email'], unique=False)
+
+    # Backfill desde las tablas de cada rol
+    for rol, tabla in ROLES:
+        op.get_bind().execute(sa.text(
+            f"INSERT INTO identidad (email, rol, id_usuario) SELECT email, :rol, id FROM {tabla}"
+        ), {"rol": rol})
+
+
+def downgrade():
+    with op.batch_alter_table('identidad', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_identidad_email'))
+
+    op.drop_table('identidad')
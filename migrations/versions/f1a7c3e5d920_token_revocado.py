@@ -0,0 +1,39 @@
+"""token revocado
+
+Revision ID: f1a7c3e5d920
+Revises: e8c4a9d2b71f
+Create Date: 2026-10-18 14:05:31.662104
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a7c3e5d920'
+down_revision = 'e8c4a9d2b71f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('token_revocado',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('jti', sa.String(length=64), nullable=True),
+        sa.Column('rol', sa.String(length=20), nullable=True),
+        sa.Column('id_usuario', sa.Integer(), nullable=True),
+        sa.Column('emitidos_hasta', sa.DateTime(), nullable=True),
+        sa.Column('expira', sa.DateTime(), nullable=False),
+        sa.Column('fecha_revocacion', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('jti')
+    )
+    with op.batch_alter_table('token_revocado', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_token_revocado_expira'), ['expira'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('token_revocado', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_token_revocado_expira'))
+
+    op.drop_table('token_revocado')
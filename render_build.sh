@@ -46,4 +46,4 @@ echo "📊 Insertando datos de prueba..."
 flask insert-test-data
 
 echo "✅ Despliegue completado exitosamente!"
-echo "🌐 La aplicación está lista para ejecutarse con: gunicorn --bind 0.0.0.0:\$PORT src.wsgi:app"
+echo "🌐 La aplicación está lista para ejecutarse con: gunicorn --worker-class eventlet --workers 1 --bind 0.0.0.0:\$PORT src.wsgi:app"
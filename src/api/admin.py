@@ -1,7 +1,29 @@
 import os
 from flask_admin import Admin
 from api.models import db, User, Cliente, Analista, Supervisor, Ticket
+from api.passwords import hashear_en_pool, HashingSaturado
 from flask_admin.contrib.sqla import ModelView
+from wtforms import PasswordField
+from wtforms.validators import ValidationError
+
+
+class UsuarioView(ModelView):
+    """
+    Usuarios con contraseña: el formulario pide la contraseña en texto y guarda su hash
+    (contraseña_hash solo admite hashes); en edición, vacía deja la actual
+    """
+    column_exclude_list = ('contraseña_hash',)
+    form_excluded_columns = ('contraseña_hash',)
+    form_extra_fields = {'contraseña': PasswordField('Contraseña')}
+
+    def on_model_change(self, form, model, is_created):
+        if form.contraseña.data:
+            try:
+                model.contraseña_hash = hashear_en_pool(form.contraseña.data)
+            except HashingSaturado:
+                raise ValidationError('Servidor ocupado, intente de nuevo en unos segundos')
+        elif is_created:
+            raise ValidationError('La contraseña es obligatoria')
 
 
 def setup_admin(app):
@@ -11,9 +33,9 @@ def setup_admin(app):
 
     # Add your models here, for example this is how we add a the User model to the admin
     admin.add_view(ModelView(User, db.session))
-    admin.add_view(ModelView(Cliente, db.session))
-    admin.add_view(ModelView(Analista, db.session))
-    admin.add_view(ModelView(Supervisor, db.session))
+    admin.add_view(UsuarioView(Cliente, db.session))
+    admin.add_view(UsuarioView(Analista, db.session))
+    admin.add_view(UsuarioView(Supervisor, db.session))
     admin.add_view(ModelView(Ticket, db.session))
 
     # You can duplicate that line to add mew models
@@ -0,0 +1,241 @@
+"""
+Caché de respuestas de las listas de tickets, por endpoint, rol y usuario.
+
+Las entradas se guardan bajo claves que incluyen la generación de cada alcance
+(global, cliente, analista). Al confirmar una transacción que toca tickets,
+comentarios o asignaciones se incrementa la generación de los alcances afectados,
+así las entradas viejas dejan de leerse y salen por LRU/TTL. Como las generaciones
+viven en el backend, un backend compartido invalida a todos los workers.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from itertools import chain
+from flask import request, make_response
+from sqlalchemy import event, select, inspect
+from api.models import db, Ticket, Comentarios, Asignacion
+from api.utils import leer_modo_streaming
+
+CACHE_TTL_SEGUNDOS = int(os.getenv('RESPONSE_CACHE_TTL', '30'))
+CACHE_MAX_ENTRADAS = int(os.getenv('RESPONSE_CACHE_MAX_ENTRADAS', '512'))
+
+ALCANCE_GLOBAL = "tickets:global"
+
+
+class BackendCache:
+    """
+    Interfaz de almacenamiento. Un backend compartido entre workers (p.ej. Redis)
+    implementa estos métodos; las generaciones no deben expirar ni desalojarse.
+    """
+
+    def get(self, clave):
+        raise NotImplementedError
+
+    def set(self, clave, valor, ttl):
+        raise NotImplementedError
+
+    def generaciones(self, alcances):
+        """Devuelve la generación actual de cada alcance (0 si nunca se invalidó)"""
+        raise NotImplementedError
+
+    def incrementar_generaciones(self, alcances):
+        raise NotImplementedError
+
+    def desalojos(self):
+        return 0
+
+    def limpiar(self):
+        raise NotImplementedError
+
+
+class BackendMemoria(BackendCache):
+    """Backend en memoria del proceso con desalojo LRU y expiración por TTL"""
+
+    def __init__(self, max_entradas=CACHE_MAX_ENTRADAS):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._generaciones = {}
+        self._desalojos = 0
+        self._bloqueo = threading.Lock()
+
+    def get(self, clave):
+        with self._bloqueo:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            valor, expira = entrada
+            if expira <= time.monotonic():
+                del self._entradas[clave]
+                self._desalojos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor, ttl):
+        with self._bloqueo:
+            self._entradas[clave] = (valor, time.monotonic() + ttl)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self._desalojos += 1
+
+    def generaciones(self, alcances):
+        with self._bloqueo:
+            return [self._generaciones.get(a, 0) for a in alcances]
+
+    def incrementar_generaciones(self, alcances):
+        with self._bloqueo:
+            for alcance in alcances:
+                self._generaciones[alcance] = self._generaciones.get(alcance, 0) + 1
+
+    def desalojos(self):
+        return self._desalojos
+
+    def limpiar(self):
+        with self._bloqueo:
+            self._entradas.clear()
+            self._generaciones.clear()
+
+
+_backend = BackendMemoria()
+_estadisticas = {"aciertos": 0, "fallos": 0, "invalidaciones": 0}
+_bloqueo_estadisticas = threading.Lock()
+
+
+def configurar_backend(backend):
+    """Reemplaza el backend (p.ej. uno compartido entre workers)"""
+    global _backend
+    _backend = backend
+
+
+def obtener_backend():
+    return _backend
+
+
+def estadisticas_cache():
+    with _bloqueo_estadisticas:
+        datos = dict(_estadisticas)
+    datos["desalojos"] = _backend.desalojos()
+    return datos
+
+
+def _contar(clave, cantidad=1):
+    with _bloqueo_estadisticas:
+        _estadisticas[clave] += cantidad
+
+
+def alcance_cliente(id_cliente):
+    return f"tickets:cliente:{id_cliente}"
+
+
+def alcance_analista(id_analista):
+    return f"tickets:analista:{id_analista}"
+
+
+def invalidar(alcances):
+    alcances = list(alcances)
+    if alcances:
+        _backend.incrementar_generaciones(alcances)
+        _contar("invalidaciones", len(alcances))
+
+
+def cache_respuesta(alcance):
+    """
+    Decorador read-through para listas de tickets. Va debajo de require_role.
+
+    Args:
+        alcance (str): 'global' (compartida por rol), 'cliente' o 'analista'
+            (por usuario autenticado)
+
+    Returns:
+        Decorator function
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # Las respuestas en streaming no se guardan (ver responder_streaming)
+            if leer_modo_streaming():
+                return f(*args, **kwargs)
+
+            user = request.current_user
+            if alcance == 'cliente':
+                alcances = [alcance_cliente(user['id'])]
+                id_usuario = user['id']
+            elif alcance == 'analista':
+                alcances = [alcance_analista(user['id'])]
+                id_usuario = user['id']
+            else:
+                alcances = [ALCANCE_GLOBAL]
+                id_usuario = '*'
+
+            # Las generaciones se leen antes de calcular: si hay una invalidación en medio,
+            # la respuesta queda guardada bajo una clave que ya no se consultará
+            generaciones = '.'.join(str(g) for g in _backend.generaciones(alcances))
+            clave = (f"{request.path}|{user['role']}|{id_usuario}|"
+                     f"{request.query_string.decode('utf-8')}|{generaciones}")
+
+            cuerpo = _backend.get(clave)
+            if cuerpo is not None:
+                _contar("aciertos")
+                return make_response(cuerpo, 200, {'Content-Type': 'application/json'})
+
+            _contar("fallos")
+            respuesta = make_response(f(*args, **kwargs))
+            if respuesta.status_code == 200:
+                _backend.set(clave, respuesta.get_data(), CACHE_TTL_SEGUNDOS)
+            return respuesta
+        return decorated_function
+    return decorator
+
+
+@event.listens_for(db.session, "before_flush")
+def registrar_alcances_modificados(session, flush_context, instances):
+    """Anota en la sesión los alcances de caché que toca este flush; se invalidan al confirmar"""
+    ids_ticket = set()
+    clientes = set()
+    analistas = set()
+
+    modificados = [o for o in session.dirty if session.is_modified(o, include_collections=False)]
+    for obj in chain(session.new, modificados, session.deleted):
+        if isinstance(obj, Ticket):
+            ids_ticket.add(obj.id)
+            clientes.add(obj.id_cliente)
+        elif isinstance(obj, (Comentarios, Asignacion)):
+            ids_ticket.add(obj.id_ticket)
+            if isinstance(obj, Asignacion):
+                # Valor nuevo y, si se reasignó, el anterior
+                historial = inspect(obj).attrs.id_analista.history
+                analistas.update(chain([obj.id_analista], historial.deleted or ()))
+
+    if not ids_ticket and not clientes:
+        return
+
+    # Cliente y analistas de los tickets afectados según la base de datos antes del flush
+    ids_ticket.discard(None)
+    if ids_ticket:
+        filas = session.connection().execute(
+            select(Ticket.__table__.c.id_cliente, Asignacion.__table__.c.id_analista)
+            .select_from(Ticket.__table__.outerjoin(
+                Asignacion.__table__, Asignacion.__table__.c.id_ticket == Ticket.__table__.c.id))
+            .where(Ticket.__table__.c.id.in_(ids_ticket))
+        )
+        for id_cliente, id_analista in filas:
+            clientes.add(id_cliente)
+            analistas.add(id_analista)
+
+    pendientes = session.info.setdefault("cache_alcances_pendientes", set())
+    pendientes.add(ALCANCE_GLOBAL)
+    pendientes.update(alcance_cliente(c) for c in clientes if c is not None)
+    pendientes.update(alcance_analista(a) for a in analistas if a is not None)
+
+
+@event.listens_for(db.session, "after_commit")
+def invalidar_alcances_confirmados(session):
+    invalidar(session.info.pop("cache_alcances_pendientes", ()))
+
+
+@event.listens_for(db.session, "after_rollback")
+def descartar_alcances_pendientes(session):
+    session.info.pop("cache_alcances_pendientes", None)
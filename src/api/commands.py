@@ -1,6 +1,13 @@
 
 import click
-from api.models import db, User, Cliente, Analista, Supervisor, Administrador
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from api.models import (
+    db, User, Cliente, Analista, Supervisor, Administrador, Ticket, Asignacion, Comentarios,
+    MensajeChat, Identidad, CANAL_ANALISTA_CLIENTE
+)
+from api.passwords import hashear_contraseña
 
 """
 In this file, you can add as many commands as you want using the @app.cli.command decorator
@@ -32,6 +39,8 @@ def setup_commands(app):
     @app.cli.command("insert-test-data")
     def insert_test_data():
         print("Creating test data for all roles")
+        # Un solo hash para todos los usuarios de prueba (misma contraseña)
+        contraseña_prueba = hashear_contraseña("123456")
         
         # Crear 3 clientes de prueba
         clientes_data = [
@@ -64,7 +73,7 @@ def setup_commands(app):
                     nombre=cliente_data["nombre"],
                     apellido=cliente_data["apellido"],
                     email=cliente_data["email"],
-                    contraseña_hash="123456",
+                    contraseña_hash=contraseña_prueba,
                     direccion=cliente_data["direccion"],
                     telefono=cliente_data["telefono"]
                 )
@@ -101,7 +110,7 @@ def setup_commands(app):
                     nombre=analista_data["nombre"],
                     apellido=analista_data["apellido"],
                     email=analista_data["email"],
-                    contraseña_hash="123456",
+                    contraseña_hash=contraseña_prueba,
                     especialidad=analista_data["especialidad"]
                 )
                 db.session.add(analista)
@@ -131,7 +140,7 @@ def setup_commands(app):
                     nombre=supervisor_data["nombre"],
                     apellido=supervisor_data["apellido"],
                     email=supervisor_data["email"],
-                    contraseña_hash="123456",
+                    contraseña_hash=contraseña_prueba,
                     area_responsable=supervisor_data["area_responsable"]
                 )
                 db.session.add(supervisor)
@@ -143,7 +152,7 @@ def setup_commands(app):
         try:
             administrador = Administrador(
                 email="admin@test.com",
-                contraseña_hash="123456",
+                contraseña_hash=contraseña_prueba,
                 permisos_especiales="Gestión completa del sistema"
             )
             db.session.add(administrador)
@@ -174,6 +183,8 @@ def setup_commands(app):
             Analista.query.filter(Analista.email.like('%@test.com')).delete()
             Supervisor.query.filter(Supervisor.email.like('%@test.com')).delete()
             Administrador.query.filter(Administrador.email.like('%@test.com')).delete()
+            # Los borrados masivos no pasan por sincronizar_identidades
+            Identidad.query.filter(Identidad.email.like('%@test.com')).delete()
             
             db.session.commit()
             print("Datos de prueba eliminados exitosamente!")
@@ -191,6 +202,8 @@ def setup_commands(app):
             Analista.query.filter(Analista.email.like('%@test.com')).delete()
             Supervisor.query.filter(Supervisor.email.like('%@test.com')).delete()
             Administrador.query.filter(Administrador.email.like('%@test.com')).delete()
+            # Los borrados masivos no pasan por sincronizar_identidades
+            Identidad.query.filter(Identidad.email.like('%@test.com')).delete()
             db.session.commit()
             print("Datos existentes eliminados.")
         except Exception as e:
@@ -199,6 +212,7 @@ def setup_commands(app):
         
         # Luego crear nuevos datos
         print("Creando nuevos datos de prueba...")
+        contraseña_prueba = hashear_contraseña("123456")
         
         # Crear 3 clientes de prueba
         clientes_data = [
@@ -231,7 +245,7 @@ def setup_commands(app):
                     nombre=cliente_data["nombre"],
                     apellido=cliente_data["apellido"],
                     email=cliente_data["email"],
-                    contraseña_hash="123456",
+                    contraseña_hash=contraseña_prueba,
                     direccion=cliente_data["direccion"],
                     telefono=cliente_data["telefono"]
                 )
@@ -268,7 +282,7 @@ def setup_commands(app):
                     nombre=analista_data["nombre"],
                     apellido=analista_data["apellido"],
                     email=analista_data["email"],
-                    contraseña_hash="123456",
+                    contraseña_hash=contraseña_prueba,
                     especialidad=analista_data["especialidad"]
                 )
                 db.session.add(analista)
@@ -298,7 +312,7 @@ def setup_commands(app):
                     nombre=supervisor_data["nombre"],
                     apellido=supervisor_data["apellido"],
                     email=supervisor_data["email"],
-                    contraseña_hash="123456",
+                    contraseña_hash=contraseña_prueba,
                     area_responsable=supervisor_data["area_responsable"]
                 )
                 db.session.add(supervisor)
@@ -310,7 +324,7 @@ def setup_commands(app):
         try:
             administrador = Administrador(
                 email="admin@test.com",
-                contraseña_hash="123456",
+                contraseña_hash=contraseña_prueba,
                 permisos_especiales="Gestión completa del sistema"
             )
             db.session.add(administrador)
@@ -329,4 +343,606 @@ def setup_commands(app):
             print("Contraseña para todos: 123456")
         except Exception as e:
             db.session.rollback()
-            print(f"Error al guardar usuarios: {e}")
\ No newline at end of file
+            print(f"Error al guardar usuarios: {e}")
+
+    @app.cli.command("explain-hot-queries")
+    @click.option("--seed", default=0, help="Tickets sintéticos a insertar antes de analizar")
+    def explain_hot_queries(seed):
+        """
+        Ejecuta EXPLAIN sobre las consultas frecuentes de api/routes.py y muestra
+        qué índice usa cada una. Ejemplo: $ flask explain-hot-queries --seed 5000
+        """
+        cliente = Cliente.query.first()
+        analista = Analista.query.first()
+        supervisor = Supervisor.query.first()
+        if not cliente or not analista or not supervisor:
+            print("Se necesitan usuarios de prueba: ejecuta primero 'flask insert-test-data'")
+            return
+
+        if seed:
+            print(f"Insertando {seed} tickets sintéticos...")
+            estados = ['en espera', 'en proceso', 'solucionado', 'cerrado']
+            ahora = datetime.now()
+            for i in range(seed):
+                ticket = Ticket(
+                    id_cliente=cliente.id,
+                    estado=estados[i % len(estados)],
+                    titulo=f"[explain] Ticket {i}",
+                    descripcion="Ticket sintético para EXPLAIN",
+                    fecha_creacion=ahora - timedelta(minutes=i),
+                    prioridad="media"
+                )
+                db.session.add(ticket)
+                db.session.flush()
+                db.session.add(Asignacion(id_ticket=ticket.id, id_supervisor=supervisor.id,
+                                          id_analista=analista.id, fecha_asignacion=ahora))
+                db.session.add(Comentarios(id_ticket=ticket.id, id_analista=analista.id,
+                                           texto="Analista inició trabajo en el ticket", fecha_comentario=ahora))
+            db.session.commit()
+
+        dialecto = db.engine.dialect
+        if dialecto.name == 'postgresql':
+            db.session.execute(text("ANALYZE"))
+        prefijo_explain = "EXPLAIN QUERY PLAN " if dialecto.name == 'sqlite' else "EXPLAIN "
+
+        ticket_id = db.session.query(db.func.max(Ticket.id)).scalar() or 1
+        consultas = {
+            "comentarios de un ticket (get_ticket_comentarios)": Comentarios.query.filter_by(
+                id_ticket=ticket_id).order_by(Comentarios.fecha_comentario),
+            "escalaciones del analista (get_analista_tickets)": Comentarios.query.filter(
+                Comentarios.id_analista == analista.id, Comentarios.texto.like("%escalado%")),
+            "asignaciones del analista": Asignacion.query.filter_by(id_analista=analista.id),
+            "asignaciones de un ticket (asignar_ticket)": Asignacion.query.filter_by(id_ticket=ticket_id),
+            "tickets cerrados (get_supervisor_closed_tickets)": Ticket.query.filter(
+                Ticket.estado == 'cerrado').order_by(Ticket.fecha_creacion.desc(), Ticket.id.desc()),
+            "tickets del cliente (get_cliente_tickets)": Ticket.query.filter(
+                Ticket.id_cliente == cliente.id, Ticket.estado != 'cerrado'),
+            "mensajes de chat nuevos (?after_id=)": MensajeChat.query.filter(
+                MensajeChat.id_ticket == ticket_id, MensajeChat.canal == CANAL_ANALISTA_CLIENTE,
+                MensajeChat.id > 0).order_by(MensajeChat.id),
+            "listar_tickets paginado": Ticket.query.order_by(
+                Ticket.fecha_creacion.desc(), Ticket.id.desc()).limit(50),
+            "tickets del analista (join_critical_rooms)": Ticket.consulta_ids_relevantes('analista', analista.id),
+            "tickets del supervisor (join_critical_rooms)": Ticket.consulta_ids_relevantes('supervisor', supervisor.id),
+        }
+
+        for nombre, consulta in consultas.items():
+            sql = str(consulta.statement.compile(dialect=dialecto, compile_kwargs={"literal_binds": True}))
+            plan = [" | ".join(str(c) for c in fila) for fila in db.session.execute(text(prefijo_explain + sql))]
+            indices = sorted(set(re.findall(r"ix_\w+", "\n".join(plan))))
+            print(f"\n=== {nombre}")
+            for linea in plan:
+                print(f"    {linea}")
+            print(f"    -> índices usados: {', '.join(indices) if indices else 'NINGUNO'}")
+
+    @app.cli.command("benchmark-json")
+    @click.option("--tickets", default=1000, help="Tickets en la lista serializada")
+    @click.option("--repeticiones", default=20, help="Veces que se codifica la lista")
+    def benchmark_json(tickets, repeticiones):
+        """
+        Compara el proveedor JSON por defecto de Flask con api/json_provider.py sobre
+        una lista con la forma de Ticket.serialize(), y el costo de emitir un evento a
+        varias rooms con y sin PayloadCodificado. Ejemplo: $ flask benchmark-json
+        """
+        import json
+        import time
+        from flask.json.provider import DefaultJSONProvider
+        from api import json_provider
+
+        ahora = datetime.now()
+        persona = {"id": 1, "nombre": "Ana", "apellido": "Pérez", "email": "ana@test.com"}
+        lista = [{
+            "id": i,
+            "id_cliente": 1,
+            "estado": "en_proceso",
+            "titulo": f"Ticket de prueba {i}",
+            "descripcion": "No puedo acceder al sistema de facturación desde la sucursal " * 3,
+            "fecha_creacion": (ahora - timedelta(minutes=i)).isoformat(),
+            "fecha_cierre": None,
+            "prioridad": "alta",
+            "calificacion": None,
+            "comentario": None,
+            "fecha_evaluacion": None,
+            "url_imagen": None,
+            "cliente": dict(persona, direccion="Calle 1", telefono="555", latitude=4.6, longitude=-74.0),
+            "asignacion_actual": {
+                "id": i, "id_ticket": i, "id_supervisor": 1, "id_analista": 1,
+                "fecha_asignacion": ahora.isoformat(),
+                "analista": dict(persona, especialidad="Redes"),
+                "supervisor": dict(persona, area_responsable="Soporte"),
+            },
+            "img_urls": [],
+            "comentarios": [{
+                "id": i * 3 + j, "id_ticket": i, "texto": "Analista inició trabajo en el ticket",
+                "fecha_comentario": ahora.isoformat(), "autor": dict(persona, rol="analista")
+            } for j in range(3)],
+            "tiene_solicitud_reapertura_pendiente": False,
+            "version": i,
+        } for i in range(tickets)]
+
+        def medir(nombre, funcion, veces):
+            inicio = time.perf_counter()
+            for _ in range(veces):
+                resultado = funcion()
+            tamano = sum(map(len, resultado)) if isinstance(resultado, list) else len(resultado)
+            duracion = time.perf_counter() - inicio
+            print(f"  {nombre:<38} {veces / duracion:10.1f} ops/s  {tamano / 1024:8.1f} KiB")
+            return duracion
+
+        print(f"\n=== Lista de {tickets} tickets ({repeticiones} repeticiones)")
+        print(f"    orjson disponible: {'sí' if json_provider.orjson else 'no (librería estándar)'}")
+        por_defecto = DefaultJSONProvider(app)
+        base = medir("Flask DefaultJSONProvider", lambda: por_defecto.dumps(lista), repeticiones)
+        rapido = medir("JSONRapido", lambda: json_provider.dumps_bytes(lista), repeticiones)
+        print(f"  -> {base / rapido:.1f}x")
+
+        # Un evento de cambiar_estado_ticket a 8 rooms con 25 sockets cada una
+        evento = lista[0]
+        destinatarios = 8 * 25
+        print(f"\n=== Evento a {destinatarios} destinatarios (8 rooms x 25 sockets)")
+
+        def por_destinatario():
+            return [json.dumps(["ticket_actualizado", evento], separators=(',', ':'))
+                    for _ in range(destinatarios)]
+
+        def una_vez():
+            payload = json_provider.PayloadCodificado(evento)
+            return [json_provider.dumps(["ticket_actualizado", payload]) for _ in range(destinatarios)]
+
+        base = medir("json por destinatario (actual)", por_destinatario, repeticiones * 10)
+        rapido = medir("PayloadCodificado una vez", una_vez, repeticiones * 10)
+        print(f"  -> {base / rapido:.1f}x")
+
+    @app.cli.command("benchmark-auth")
+    @click.option("--peticiones", default=20000, help="Peticiones simuladas por caso")
+    def benchmark_auth(peticiones):
+        """
+        Mide el costo por petición de require_role con y sin la caché de tokens
+        verificados de api/jwt_utils.py. Ejemplo: $ flask benchmark-auth
+        """
+        import time
+        from api import jwt_utils
+
+        token = jwt_utils.generate_token(1, "bench@test.com", "supervisor")
+
+        @jwt_utils.require_role(['supervisor', 'administrador'])
+        def vista():
+            return None
+
+        def sin_cache():
+            # Lo que hacía cada decorador antes: decode + segunda verificación de exp
+            payload = jwt_utils.decode_token(jwt_utils.get_token_from_request())
+            if datetime.utcnow() > datetime.fromtimestamp(payload['exp']):
+                return None
+            if payload['role'] not in ['supervisor', 'administrador']:
+                return None
+            from flask import request
+            request.current_user = {'id': payload['user_id'], 'email': payload['email'], 'role': payload['role']}
+            return None
+
+        print(f"\n=== Sobrecosto de autenticación por petición ({peticiones} peticiones)")
+        with app.test_request_context(headers={"Authorization": f"Bearer {token}"}):
+            resultados = {}
+            for nombre, funcion in (("jwt.decode por petición (antes)", sin_cache),
+                                    ("require_role con caché (ahora)", vista)):
+                jwt_utils.clear_token_cache()
+                inicio = time.perf_counter()
+                for _ in range(peticiones):
+                    funcion()
+                resultados[nombre] = (time.perf_counter() - inicio) / peticiones * 1e6
+                print(f"  {nombre:<34} {resultados[nombre]:8.2f} µs/petición")
+            antes, ahora = resultados.values()
+            print(f"  -> {antes / ahora:.1f}x")
+
+    @app.cli.command("benchmark-passwords")
+    @click.option("--costos", default="100000,300000,600000", help="Iteraciones PBKDF2 a comparar, separadas por coma")
+    @click.option("--logins", default=40, help="Logins simulados por costo")
+    @click.option("--concurrencia", default=8, help="Peticiones de login simultáneas")
+    def benchmark_passwords(costos, logins, concurrencia):
+        """
+        Logins por segundo (verificación en el pool de api/passwords.py) para cada
+        costo. Ejemplo: $ flask benchmark-passwords --costos 200000,600000
+        """
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        from api import passwords
+
+        pool = passwords.PoolHashing(cola=logins)
+        print(f"\n=== Logins por segundo ({logins} logins, {concurrencia} simultáneos, "
+              f"{passwords.PASSWORD_HASH_WORKERS} workers de hashing)")
+        for costo in [int(c) for c in costos.split(",") if c.strip()]:
+            almacenado = passwords.hashear_contraseña("123456", iteraciones=costo)
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrencia) as peticiones:
+                resultados = list(peticiones.map(
+                    lambda _: pool.ejecutar(passwords.verificar_contraseña, almacenado, "123456"),
+                    range(logins)))
+            duracion = time.perf_counter() - inicio
+            assert all(resultados)
+            print(f"  {costo:>9} iteraciones  {logins / duracion:8.1f} logins/s  "
+                  f"{duracion / logins * 1000:8.1f} ms/login")
+
+    @app.cli.command("benchmark-socketio")
+    @click.option("--conexiones", default=500, help="Sockets inactivos abiertos por modo")
+    @click.option("--mensajes", default=200, help="Ping/pong medidos con los sockets abiertos")
+    @click.option("--modos", default="threading,eventlet", help="async_mode a comparar, separados por coma")
+    def benchmark_socketio(conexiones, mensajes, modos):
+        """
+        Levanta gunicorn con cada async_mode (gthread para 'threading', eventlet para
+        'eventlet'), abre sockets de Socket.IO inactivos y mide memoria por conexión,
+        hilos del servidor y latencia de emit (ping -> pong) con los sockets abiertos.
+        Requiere gunicorn, eventlet y websocket-client. Ejemplo:
+        $ flask benchmark-socketio --conexiones 1000
+        """
+        import os
+        import socket
+        import subprocess
+        import sys
+        import time
+        import urllib.request
+        import websocket
+
+        src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        workers = {
+            "threading": ["--worker-class", "gthread", "--threads", str(conexiones + 50)],
+            "eventlet": ["--worker-class", "eventlet", "--worker-connections", str(conexiones + 50)],
+        }
+
+        def puerto_libre():
+            with socket.socket() as s:
+                s.bind(("127.0.0.1", 0))
+                return s.getsockname()[1]
+
+        def memoria_e_hilos(pid):
+            # Master de gunicorn + su worker
+            pids = [pid]
+            with open(f"/proc/{pid}/task/{pid}/children") as f:
+                pids += [int(p) for p in f.read().split()]
+            rss_kib, hilos = 0, 0
+            for p in pids:
+                with open(f"/proc/{p}/status") as f:
+                    for linea in f:
+                        if linea.startswith("VmRSS:"):
+                            rss_kib += int(linea.split()[1])
+                        elif linea.startswith("Threads:"):
+                            hilos += int(linea.split()[1])
+            return rss_kib, hilos
+
+        def conectar(base):
+            ws = websocket.create_connection(f"{base}/socket.io/?EIO=4&transport=websocket", timeout=30)
+            ws.recv()  # open de Engine.IO
+            ws.send("40")  # connect al namespace /
+            while not ws.recv().startswith("40"):
+                pass
+            return ws
+
+        def ping(ws):
+            inicio = time.perf_counter()
+            ws.send('42["ping"]')
+            while True:
+                paquete = ws.recv()
+                if paquete == "2":
+                    ws.send("3")
+                elif paquete.startswith('42["pong"'):
+                    return time.perf_counter() - inicio
+
+        def percentil(valores, p):
+            return valores[min(len(valores) - 1, int(len(valores) * p))] * 1000
+
+        print(f"\n=== Socket.IO: {conexiones} sockets inactivos, {mensajes} ping/pong por modo")
+        print(f"  {'modo':<10} {'abiertos':>8} {'conexión s':>10} {'RSS MiB':>8} {'KiB/conexión':>12} "
+              f"{'hilos':>6} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7}")
+        for modo in [m.strip() for m in modos.split(",") if m.strip()]:
+            puerto = puerto_libre()
+            servidor = subprocess.Popen(
+                [sys.executable, "-m", "gunicorn", *workers[modo], "--workers", "1",
+                 "--bind", f"127.0.0.1:{puerto}", "--chdir", src, "wsgi:app"],
+                env=dict(os.environ, SOCKETIO_ASYNC_MODE=modo),
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            base = f"ws://127.0.0.1:{puerto}"
+            abiertos = []
+            try:
+                limite = time.time() + 30
+                while True:
+                    try:
+                        urllib.request.urlopen(f"http://127.0.0.1:{puerto}/socket.io/?EIO=4&transport=polling", timeout=2)
+                        break
+                    except OSError:
+                        if time.time() > limite or servidor.poll() is not None:
+                            raise click.ClickException(f"gunicorn no arrancó en modo {modo}")
+                        time.sleep(0.2)
+
+                medidor = conectar(base)
+                ping(medidor)
+                rss_inicial, _ = memoria_e_hilos(servidor.pid)
+
+                inicio = time.perf_counter()
+                for _ in range(conexiones):
+                    try:
+                        abiertos.append(conectar(base))
+                    except Exception:
+                        break
+                tiempo_conexion = time.perf_counter() - inicio
+                time.sleep(1)
+                rss_kib, hilos = memoria_e_hilos(servidor.pid)
+
+                latencias = sorted(ping(medidor) for _ in range(mensajes))
+                por_conexion = (rss_kib - rss_inicial) / max(len(abiertos), 1)
+                print(f"  {modo:<10} {len(abiertos):>8} {tiempo_conexion:>10.2f} {rss_kib / 1024:>8.1f} "
+                      f"{por_conexion:>12.1f} {hilos:>6} {percentil(latencias, 0.5):>7.2f} "
+                      f"{percentil(latencias, 0.95):>7.2f} {percentil(latencias, 0.99):>7.2f}")
+                medidor.close()
+            finally:
+                for ws in abiertos:
+                    ws.close()
+                servidor.terminate()
+                servidor.wait(timeout=30)
+
+    @app.cli.command("benchmark-tiempo-real")
+    @click.option("--clientes", default=200, help="Dashboards simulados conectados por Socket.IO")
+    @click.option("--mezcla", default="cliente:50,analista:25,supervisor:20,administrador:5",
+                  help="Porcentaje de dashboards por rol")
+    @click.option("--tickets", default=20, help="Tickets que crea el driver antes de medir")
+    @click.option("--cambios", default=300, help="Cambios de estado que hace el driver por la API REST")
+    @click.option("--intervalo", default=0.02, help="Segundos entre cambios de estado")
+    @click.option("--servidor", type=click.Choice(["gunicorn", "flask"]), default="gunicorn",
+                  help="gunicorn -k eventlet (Procfile) o flask run (Pipfile start, threading)")
+    def benchmark_tiempo_real(clientes, mezcla, tickets, cambios, intervalo, servidor):
+        """
+        Prueba de carga de tiempo real: levanta la app de src/app.py contra una base
+        SQLite temporal con los datos de insert-test-data, conecta dashboards simulados
+        por rol que se unen a sus rooms como el frontend (join_room, join_role_room,
+        join_critical_rooms, join_ticket) y, mientras un driver asigna, inicia y escala
+        tickets por la API REST, mide la latencia de punta a punta de cada evento
+        recibido, los mensajes por segundo y la memoria del servidor. Requiere
+        websocket-client (y gunicorn y eventlet para --servidor gunicorn). Ejemplo:
+        $ flask benchmark-tiempo-real --clientes 500 --cambios 600
+        """
+        import json
+        import os
+        import selectors
+        import shutil
+        import socket
+        import subprocess
+        import sys
+        import tempfile
+        import threading
+        import time
+        import urllib.request
+        import websocket
+        from sqlalchemy import create_engine, select
+        from api.jwt_utils import generate_token
+
+        pesos = {}
+        for parte in mezcla.split(","):
+            rol, _, peso = parte.partition(":")
+            if rol.strip() not in ("cliente", "analista", "supervisor", "administrador"):
+                raise click.ClickException(f"Rol desconocido en --mezcla: {rol}")
+            pesos[rol.strip()] = float(peso or 0)
+
+        src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        raiz = os.path.dirname(src)
+        directorio = tempfile.mkdtemp(prefix="benchmark-tiempo-real-")
+        url_db = f"sqlite:///{os.path.join(directorio, 'benchmark.db')}"
+        env = dict(os.environ, DATABASE_URL=url_db, FLASK_APP=os.path.join(src, "app.py"))
+        env.pop("SOCKETIO_MESSAGE_QUEUE", None)
+
+        print(f"\n=== Base de prueba: {url_db}")
+        # El esquema sale de los modelos: las migraciones antiguas no corren sobre SQLite vacío
+        motor = create_engine(url_db)
+        db.metadata.create_all(motor)
+        resultado = subprocess.run([sys.executable, "-m", "flask", "insert-test-data"], cwd=raiz, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if resultado.returncode:
+            raise click.ClickException(f"flask insert-test-data falló:\n{resultado.stderr[-2000:]}")
+
+        usuarios = {}
+        with motor.connect() as conexion:
+            for rol, modelo in (("cliente", Cliente), ("analista", Analista),
+                                ("supervisor", Supervisor), ("administrador", Administrador)):
+                tabla = modelo.__table__
+                usuarios[rol] = [{"id": fila.id, "token": generate_token(fila.id, fila.email, rol)}
+                                 for fila in conexion.execute(select(tabla.c.id, tabla.c.email).order_by(tabla.c.id))]
+        motor.dispose()
+        if not all(usuarios.values()):
+            raise click.ClickException("insert-test-data no creó usuarios de todos los roles")
+
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            puerto = s.getsockname()[1]
+        if servidor == "gunicorn":
+            argumentos = [sys.executable, "-m", "gunicorn", "--worker-class", "eventlet", "--workers", "1",
+                          "--worker-connections", str(clientes + 100), "--bind", f"127.0.0.1:{puerto}",
+                          "--chdir", src, "wsgi:app"]
+        else:
+            argumentos = [sys.executable, "-m", "flask", "run", "--port", str(puerto), "--no-reload"]
+        proceso = subprocess.Popen(argumentos, cwd=raiz, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        http = f"http://127.0.0.1:{puerto}"
+
+        def rss_mib():
+            # Procesos que atienden: los workers de gunicorn o el propio flask run
+            pids = [proceso.pid]
+            with open(f"/proc/{proceso.pid}/task/{proceso.pid}/children") as f:
+                pids = [int(p) for p in f.read().split()] or pids
+            total = 0
+            for pid in pids:
+                with open(f"/proc/{pid}/status") as f:
+                    total += next(int(l.split()[1]) for l in f if l.startswith("VmRSS:"))
+            return total / 1024
+
+        def api(metodo, ruta, usuario, cuerpo=None):
+            peticion = urllib.request.Request(
+                f"{http}/api{ruta}", method=metodo, data=json.dumps(cuerpo or {}).encode(),
+                headers={"Content-Type": "application/json", "Authorization": f"Bearer {usuario['token']}"})
+            with urllib.request.urlopen(peticion, timeout=30) as respuesta:
+                return json.loads(respuesta.read())
+
+        conexiones = []
+        try:
+            limite = time.time() + 60
+            while True:
+                try:
+                    urllib.request.urlopen(f"{http}/socket.io/?EIO=4&transport=polling", timeout=2)
+                    break
+                except OSError:
+                    if time.time() > limite or proceso.poll() is not None:
+                        raise click.ClickException(f"el servidor ({servidor}) no arrancó")
+                    time.sleep(0.2)
+            rss_inicial = rss_mib()
+
+            # Tickets de los clientes de prueba, repartidos entre ellos
+            ids_tickets = []
+            for i in range(tickets):
+                cliente = usuarios["cliente"][i % len(usuarios["cliente"])]
+                ticket = api("POST", "/tickets", cliente, {
+                    "titulo": f"[benchmark] Ticket {i}", "descripcion": "Ticket de prueba de carga",
+                    "prioridad": ("alta", "media", "baja")[i % 3]})
+                ids_tickets.append((ticket["id"], cliente["id"]))
+            analistas = usuarios["analista"]
+            analista_de = {tid: analistas[i % len(analistas)] for i, (tid, _) in enumerate(ids_tickets)}
+
+            # Las rooms que pide cada dashboard (ver joinRoom y joinAllCriticalRooms en front/store.js)
+            def mensajes_union(rol, usuario, numero):
+                uid = usuario["id"]
+                if rol == "cliente":
+                    propios = [tid for tid, cid in ids_tickets if cid == uid]
+                    rooms = ["clientes", f"cliente_{uid}"]
+                elif rol == "analista":
+                    propios = [tid for tid, _ in ids_tickets if analista_de[tid]["id"] == uid]
+                    rooms = ["analistas", f"analista_{uid}"]
+                else:
+                    # Supervisores y administradores siguen unos pocos tickets abiertos en detalle
+                    propios = [ids_tickets[(numero + k) % len(ids_tickets)][0] for k in range(3)]
+                    rooms = ["supervisores"] + (["administradores"] if rol == "administrador" else [])
+                mensajes = [["join_room", room] for room in rooms]
+                mensajes.append(["join_role_room", {"role": rol, "user_id": uid}])
+                mensajes.append(["join_critical_rooms", {"role": rol, "user_id": uid, "ticket_ids": propios}])
+                mensajes += [["join_ticket", {"ticket_id": tid}] for tid in propios]
+                return mensajes
+
+            total_pesos = sum(pesos.values()) or 1
+            roles = []
+            for rol, peso in pesos.items():
+                roles += [rol] * round(clientes * peso / total_pesos)
+            roles = (roles + ["cliente"] * clientes)[:clientes]
+
+            print(f"=== {servidor}: conectando {clientes} dashboards "
+                  f"({', '.join(f'{rol} {roles.count(rol)}' for rol in pesos)})")
+            inicio = time.perf_counter()
+            for numero, rol in enumerate(roles):
+                usuario = usuarios[rol][numero % len(usuarios[rol])]
+                ws = websocket.create_connection(
+                    f"ws://127.0.0.1:{puerto}/socket.io/?EIO=4&transport=websocket", timeout=30)
+                ws.recv()  # open de Engine.IO
+                ws.send("40" + json.dumps({"token": usuario["token"]}))
+                while not ws.recv().startswith("40"):
+                    pass
+                for mensaje in mensajes_union(rol, usuario, numero):
+                    ws.send("42" + json.dumps(mensaje))
+                conexiones.append(ws)
+            print(f"  conexión y unión a rooms: {time.perf_counter() - inicio:.2f} s")
+            time.sleep(1)
+
+            # Lector único: registra cada evento con ticket_id contra el último cambio de ese ticket
+            enviados = {}
+            latencias = []
+            recibidos = {"mensajes": 0}
+            activo = threading.Event()
+            activo.set()
+            selector = selectors.DefaultSelector()
+            for ws in conexiones:
+                ws.sock.setblocking(True)
+                selector.register(ws.sock, selectors.EVENT_READ, ws)
+
+            def leer():
+                while activo.is_set():
+                    for clave, _ in selector.select(timeout=0.1):
+                        ws = clave.data
+                        try:
+                            paquete = ws.recv()
+                        except Exception:
+                            selector.unregister(clave.fileobj)
+                            continue
+                        ahora = time.perf_counter()
+                        if paquete == "2":
+                            ws.send("3")
+                        elif paquete.startswith("42"):
+                            recibidos["mensajes"] += 1
+                            datos = json.loads(paquete[2:])
+                            carga = datos[1] if len(datos) > 1 and isinstance(datos[1], dict) else {}
+                            enviado = enviados.get(carga.get("ticket_id"))
+                            if enviado is not None:
+                                latencias.append(ahora - enviado)
+
+            lector = threading.Thread(target=leer, daemon=True)
+            lector.start()
+            time.sleep(0.5)
+            recibidos["mensajes"] = 0
+
+            # Ciclo por ticket: el supervisor asigna, el analista inicia y el analista escala
+            supervisor = usuarios["supervisor"][0]
+            pasos = {tid: 0 for tid, _ in ids_tickets}
+            errores = 0
+            rss_maximo = rss_mib()
+            inicio = time.perf_counter()
+            for i in range(cambios):
+                tid = ids_tickets[i % len(ids_tickets)][0]
+                analista = analista_de[tid]
+                paso = pasos[tid] % 3
+                enviados[tid] = time.perf_counter()
+                try:
+                    if paso == 0:
+                        api("POST", f"/tickets/{tid}/asignar", supervisor, {"id_analista": analista["id"]})
+                    elif paso == 1:
+                        api("PUT", f"/tickets/{tid}/estado", analista, {"estado": "en proceso"})
+                    else:
+                        api("PUT", f"/tickets/{tid}/estado", analista, {"estado": "en espera"})
+                except Exception:
+                    errores += 1
+                pasos[tid] += 1
+                if i % 50 == 0:
+                    rss_maximo = max(rss_maximo, rss_mib())
+                time.sleep(intervalo)
+            duracion_driver = time.perf_counter() - inicio
+            time.sleep(2)
+            duracion = time.perf_counter() - inicio
+            activo.clear()
+            lector.join()
+            rss_maximo = max(rss_maximo, rss_mib())
+
+            def percentil(p):
+                return latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000 if latencias else 0.0
+
+            latencias.sort()
+            print(f"  cambios de estado: {cambios} en {duracion_driver:.2f} s "
+                  f"({cambios / duracion_driver:.1f}/s, {errores} errores)")
+            print(f"  mensajes recibidos: {recibidos['mensajes']} ({recibidos['mensajes'] / duracion:.0f} msg/s), "
+                  f"{len(latencias)} con ticket_id")
+            print(f"  latencia de punta a punta ms: p50 {percentil(0.5):.1f}  p95 {percentil(0.95):.1f}  "
+                  f"p99 {percentil(0.99):.1f}  máx {percentil(1):.1f}")
+            print(f"  RSS del servidor: {rss_inicial:.1f} MiB en reposo, {rss_maximo:.1f} MiB máximo")
+        finally:
+            for ws in conexiones:
+                ws.close()
+            proceso.terminate()
+            proceso.wait(timeout=30)
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    @app.cli.command("emitir-evento")
+    @click.argument("evento")
+    @click.option("--datos", default="{}", help="Payload JSON del evento")
+    @click.option("--room", default=None, help="Room destino (por defecto todos los clientes)")
+    def emitir_evento(evento, datos, room):
+        """
+        Emite un evento de Socket.IO a los clientes de todos los workers a través de
+        SOCKETIO_MESSAGE_QUEUE. Ejemplo:
+        $ flask emitir-evento mantenimiento --datos '{"minutos": 5}' --room role_cliente
+        """
+        from api import json_provider
+        from app import socketio, SOCKETIO_MESSAGE_QUEUE
+
+        if not SOCKETIO_MESSAGE_QUEUE:
+            raise click.ClickException("SOCKETIO_MESSAGE_QUEUE no está configurada: el evento no llegaría a ningún worker")
+        socketio.emit(evento, json_provider.loads(datos), to=room)
+        print(f"📤 Evento {evento} publicado en {SOCKETIO_MESSAGE_QUEUE}" + (f" (room {room})" if room else ""))
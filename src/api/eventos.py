@@ -0,0 +1,469 @@
+"""
+Bus de eventos en tiempo real.
+
+Cada evento de dominio (ticket_creado, ticket_asignado, ...) declara en RUTAS qué
+eventos de Socket.IO genera y a qué rooms van. publicar() codifica el payload una vez
+y hace un solo emit por evento de Socket.IO con la lista de rooms: el manager de
+python-socketio une los participantes de esas rooms, así que un usuario que está en
+room_ticket_X, supervisores y role_supervisor recibe una copia y no tres. Con cola
+de mensajes (api/mensajeria.py) viaja un solo mensaje y cada worker hace la unión
+con sus propios clientes.
+
+Los eventos no se emiten en el hilo de la petición: publicar() los retiene hasta el
+after_commit de la sesión (un rollback los descarta) y un despachador en segundo
+plano los emite desde colas acotadas, opcionalmente coalesciendo ráfagas del mismo
+ticket (EVENTOS_VENTANA_MS).
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from flask import has_app_context
+from sqlalchemy import event
+from api.json_provider import PayloadCodificado
+from api.models import db
+from api.watchers import rooms_watchers
+from api.replay import EVENTO_RESYNC, MOTIVO_DESCARTE
+
+# Plantillas de rooms; se completan con el contexto de publicar()
+TICKET = 'room_ticket_{ticket_id}'
+CLIENTE = 'cliente_{cliente_id}'
+ANALISTA = 'analista_{analista_id}'
+CHAT_SUPERVISOR_ANALISTA = 'chat_supervisor_analista_{ticket_id}'
+CHAT_ANALISTA_CLIENTE = 'chat_analista_cliente_{ticket_id}'
+# Todos los clientes conectados
+GLOBAL = None
+# Rooms personales de los watchers del ticket (api/watchers.py)
+WATCHERS = '<watchers>'
+
+# evento de dominio -> ((evento de Socket.IO, rooms), ...)
+RUTAS = {
+    'analista_creado': (
+        ('analista_creado', ('supervisores', 'administradores')),
+    ),
+    'analista_eliminado': (
+        ('analista_eliminado', ('clientes', 'analistas', 'supervisores', 'administradores')),
+    ),
+    'accion_critica': (
+        ('critical_ticket_update', (WATCHERS, TICKET)),
+    ),
+    'comentario_agregado': (
+        ('nuevo_comentario', (TICKET,)),
+    ),
+    'ticket_creado': (
+        ('nuevo_ticket', (TICKET, 'administradores', 'role_administrador')),
+        ('nuevo_ticket_disponible', ('supervisores', 'role_supervisor', 'administradores', 'role_administrador')),
+    ),
+    'ticket_actualizado': (
+        ('ticket_actualizado', (TICKET,)),
+    ),
+    'ticket_eliminado': (
+        ('ticket_eliminado', ('clientes', 'analistas', 'supervisores', 'administradores', ANALISTA, TICKET)),
+    ),
+    'ticket_cerrado': (
+        ('ticket_cerrado', ('supervisores', 'administradores', TICKET)),
+        ('ticket_actualizado', (TICKET, 'supervisores')),
+        ('global_ticket_update', GLOBAL),
+    ),
+    'solicitud_reapertura': (
+        ('solicitud_reapertura', ('supervisores', 'administradores', TICKET)),
+        ('ticket_actualizado', (TICKET, 'supervisores')),
+        ('global_ticket_update', GLOBAL),
+    ),
+    'ticket_reabierto': (
+        ('ticket_reabierto', ('supervisores', 'administradores', TICKET)),
+    ),
+    'ticket_iniciado': (
+        ('ticket_actualizado', (TICKET, 'supervisores', 'role_supervisor', 'administradores')),
+        ('ticket_estado_changed', (TICKET,)),
+        ('global_ticket_update', GLOBAL),
+    ),
+    'ticket_solucionado': (
+        ('ticket_solucionado', (TICKET, 'supervisores', 'role_supervisor', 'administradores', CLIENTE)),
+        ('ticket_actualizado', (TICKET, 'role_supervisor', CLIENTE)),
+        ('ticket_estado_changed', (TICKET,)),
+        ('global_ticket_update', GLOBAL),
+    ),
+    'ticket_escalado': (
+        ('ticket_escalado', ('supervisores', 'administradores', 'role_supervisor', TICKET)),
+        ('ticket_actualizado', (TICKET, 'supervisores', 'role_supervisor')),
+        ('ticket_estado_changed', (TICKET,)),
+        ('global_ticket_update', GLOBAL),
+        ('nuevo_ticket_disponible', ('supervisores', 'role_supervisor')),
+    ),
+    'ticket_cerrado_por_supervisor': (
+        ('ticket_cerrado', (TICKET, 'supervisores', 'administradores')),
+        ('ticket_actualizado', (TICKET, 'supervisores')),
+        ('ticket_estado_changed', (TICKET,)),
+        ('global_ticket_update', GLOBAL),
+    ),
+    'ticket_reabierto_por_supervisor': (
+        ('ticket_reabierto', (TICKET, 'supervisores', 'administradores', CLIENTE)),
+        ('ticket_actualizado', (TICKET, 'supervisores', CLIENTE)),
+        ('ticket_estado_changed', (TICKET,)),
+        ('global_ticket_update', GLOBAL),
+    ),
+    'estado_cambiado': (
+        ('ticket_actualizado', (TICKET,)),
+    ),
+    'ticket_evaluado': (
+        ('ticket_actualizado', (TICKET,)),
+    ),
+    'ticket_asignado': (
+        ('ticket_asignado_a_mi', (ANALISTA,)),
+        ('ticket_asignado', (WATCHERS, TICKET, 'supervisores', 'administradores')),
+        ('ticket_actualizado', (TICKET, WATCHERS)),
+        ('global_ticket_update', GLOBAL),
+    ),
+    'presencia_cambiada': (
+        ('presence_delta', ('supervisores', 'role_supervisor', 'administradores', 'role_administrador')),
+    ),
+    'mensaje_chat_supervisor_analista': (
+        ('nuevo_mensaje_chat_supervisor_analista', (CHAT_SUPERVISOR_ANALISTA,)),
+        ('nuevo_mensaje_chat', (TICKET,)),
+    ),
+    'mensaje_chat_analista_cliente': (
+        ('nuevo_mensaje_chat_analista_cliente', (CHAT_ANALISTA_CLIENTE,)),
+        ('nuevo_mensaje_chat', (TICKET,)),
+    ),
+}
+
+# Eventos de dominio que van a los watchers del ticket
+EVENTOS_CON_WATCHERS = frozenset(evento for evento, rutas in RUTAS.items()
+                                 if any(WATCHERS in plantillas for _, plantillas in rutas if plantillas))
+
+# Nombres de los eventos de Socket.IO que salen por el bus (ver api/replay.py)
+EVENTOS_SOCKET = frozenset(nombre for rutas in RUTAS.values() for nombre, _ in rutas)
+
+# Workers del despachador (cada uno con su cola; los eventos de un mismo ticket van
+# siempre a la misma cola y se emiten en orden) y tamaño máximo de cada cola
+DESPACHO_WORKERS = int(os.getenv('DESPACHO_WORKERS', '2'))
+DESPACHO_COLA_MAX = int(os.getenv('DESPACHO_COLA_MAX', '1000'))
+# Ventana de coalescencia en ms (0 = desactivada): dentro de la ventana, los emits del
+# mismo ticket, evento y rooms se reducen a uno con el payload más reciente
+EVENTOS_VENTANA_MS = float(os.getenv('EVENTOS_VENTANA_MS', '0'))
+# Eventos de Socket.IO que llevan el estado completo del ticket y se pueden coalescer;
+# los demás (comentarios, chat, asignaciones, cierres) son avisos y salen todos
+COALESCIBLES = frozenset(('ticket_actualizado', 'ticket_estado_changed', 'global_ticket_update'))
+
+# Trazas de cada despacho: el camino feliz no escribe en stdout (los contadores de
+# estadisticas_eventos() lo cubren); los errores siguen saliendo con print
+logger = logging.getLogger(__name__)
+
+_estadisticas = {
+    "publicados": 0, "emits": 0, "entregas": 0, "emits_ahorrados": 0,
+    "encolados": 0, "despachados": 0, "descartados": 0, "coalescidos": 0, "avisos_descarte": 0,
+}
+_lag = {"ultimo": 0.0, "maximo": 0.0, "total": 0.0}
+_bloqueo_estadisticas = threading.Lock()
+
+
+def estadisticas_eventos():
+    with _bloqueo_estadisticas:
+        datos = dict(_estadisticas)
+        lag = dict(_lag)
+    datos["cola_profundidad"] = despachador.profundidad()
+    datos["lag_ms_ultimo"] = round(lag["ultimo"] * 1000, 2)
+    datos["lag_ms_max"] = round(lag["maximo"] * 1000, 2)
+    datos["lag_ms_promedio"] = round(lag["total"] / datos["despachados"] * 1000, 2) if datos["despachados"] else 0.0
+    return datos
+
+
+def _contar(**cantidades):
+    with _bloqueo_estadisticas:
+        for clave, cantidad in cantidades.items():
+            _estadisticas[clave] += cantidad
+
+
+def _registrar_despacho(lag):
+    with _bloqueo_estadisticas:
+        _estadisticas["despachados"] += 1
+        _lag["ultimo"] = lag
+        _lag["maximo"] = max(_lag["maximo"], lag)
+        _lag["total"] += lag
+
+
+def _socketio():
+    try:
+        from app import get_socketio
+    except ImportError:
+        return None
+    return get_socketio()
+
+
+def resolver_rooms(plantillas, contexto):
+    """Rooms concretas; se omiten las plantillas cuyo dato de contexto es None"""
+    valores = {clave: valor for clave, valor in contexto.items() if valor is not None}
+    rooms = []
+    for plantilla in plantillas:
+        if plantilla is WATCHERS:
+            rooms.extend(room for room in contexto.get('watchers', ()) if room not in rooms)
+            continue
+        try:
+            room = plantilla.format(**valores)
+        except KeyError:
+            continue
+        if room not in rooms:
+            rooms.append(room)
+    return rooms
+
+
+def expandir(evento, contexto):
+    """Emits de Socket.IO del evento de dominio: [(nombre, rooms o GLOBAL), ...]"""
+    emits = []
+    for nombre, plantillas in RUTAS[evento]:
+        if plantillas is GLOBAL:
+            emits.append((nombre, GLOBAL))
+            continue
+        rooms = resolver_rooms(plantillas, contexto)
+        if rooms:
+            emits.append((nombre, tuple(rooms)))
+    return emits
+
+
+def _emitir_socket(socketio, nombre, payload, rooms):
+    if rooms is GLOBAL:
+        socketio.emit(nombre, payload)
+    else:
+        socketio.emit(nombre, payload, to=list(rooms))
+
+
+def emitir(evento, payload, contexto):
+    """Emite ya el evento de dominio: un socketio.emit por evento de Socket.IO de RUTAS"""
+    socketio = _socketio()
+    if socketio is None:
+        return False
+    try:
+        emits = expandir(evento, contexto)
+        for nombre, rooms in emits:
+            _emitir_socket(socketio, nombre, payload, rooms)
+        _contar(publicados=1, emits=len(emits))
+        logger.debug("Evento '%s' publicado (%d emits)", evento, len(emits))
+        return True
+    except Exception as e:
+        print(f"❌ Error publicando evento '{evento}': {e}")
+        return False
+
+
+class Coalescedor:
+    """
+    Junta los emits de una ventana de tiempo: para un mismo ticket, evento de Socket.IO
+    de COALESCIBLES y rooms solo sale el último payload (el estado más reciente), en la
+    posición de su última aparición. El resto de los emits pasa tal cual y en orden.
+    """
+
+    def __init__(self):
+        self._emits = OrderedDict()
+        self._eventos = []
+
+    def agregar(self, evento, payload, contexto):
+        self._eventos.append(evento)
+        ticket_id = contexto.get('ticket_id')
+        for nombre, rooms in expandir(evento, contexto):
+            if ticket_id is not None and nombre in COALESCIBLES:
+                clave = (ticket_id, nombre, rooms)
+            else:
+                clave = object()
+            if clave in self._emits:
+                _contar(coalescidos=1)
+                self._emits.move_to_end(clave)
+            self._emits[clave] = (nombre, rooms, payload)
+
+    def vaciar(self):
+        socketio = _socketio()
+        if socketio is None:
+            return
+        try:
+            for nombre, rooms, payload in self._emits.values():
+                _emitir_socket(socketio, nombre, payload, rooms)
+            _contar(publicados=len(self._eventos), emits=len(self._emits))
+            logger.debug("%d eventos publicados en una ventana (%d emits)", len(self._eventos), len(self._emits))
+        except Exception as e:
+            print(f"❌ Error publicando eventos {', '.join(self._eventos)}: {e}")
+
+
+class Despachador:
+    """Tareas en segundo plano (hilos o green threads) que emiten desde colas acotadas"""
+
+    def __init__(self, workers=DESPACHO_WORKERS, max_cola=DESPACHO_COLA_MAX, ventana_ms=EVENTOS_VENTANA_MS):
+        self._colas = [queue.Queue(maxsize=max_cola) for _ in range(max(workers, 1))]
+        self.ventana = ventana_ms / 1000
+        self._iniciado = False
+        self._bloqueo = threading.Lock()
+        # Rooms (GLOBAL incluido) de eventos descartados que todavía no recibieron el aviso
+        self._descartes = set()
+
+    def _iniciar(self):
+        with self._bloqueo:
+            if self._iniciado:
+                return True
+            socketio = _socketio()
+            if socketio is None:
+                return False
+            for cola in self._colas:
+                socketio.start_background_task(self._trabajar, cola)
+            self._iniciado = True
+            return True
+
+    def encolar(self, evento, payload, contexto):
+        if not self._iniciado and not self._iniciar():
+            return False
+        cola = self._colas[hash(contexto.get('ticket_id')) % len(self._colas)]
+        try:
+            cola.put_nowait((time.monotonic(), evento, payload, contexto))
+        except queue.Full:
+            _contar(descartados=1)
+            print(f"❌ Cola de eventos llena, se descarta '{evento}'")
+            self._registrar_descarte(evento, contexto)
+            return False
+        _contar(encolados=1)
+        return True
+
+    def _registrar_descarte(self, evento, contexto):
+        try:
+            rooms = {room for _, rooms in expandir(evento, contexto) for room in (rooms or (GLOBAL,))}
+        except Exception:
+            rooms = {GLOBAL}
+        with self._bloqueo:
+            self._descartes |= rooms
+
+    def _avisar_descartes(self):
+        """
+        Un solo 'resync_required' (motivo MOTIVO_DESCARTE) a las rooms que perdieron
+        eventos; pasa por el manager, así cada worker marca el hueco en su replay
+        """
+        with self._bloqueo:
+            rooms, self._descartes = self._descartes, set()
+        socketio = _socketio()
+        if not rooms or socketio is None:
+            return
+        aviso = {'motivo': MOTIVO_DESCARTE, 'timestamp': time.time()}
+        try:
+            if GLOBAL in rooms:
+                socketio.emit(EVENTO_RESYNC, aviso)
+            else:
+                socketio.emit(EVENTO_RESYNC, aviso, to=sorted(rooms))
+            _contar(avisos_descarte=1)
+        except Exception as e:
+            print(f"❌ Error avisando eventos descartados: {e}")
+
+    def _trabajar(self, cola):
+        while True:
+            encolado, evento, payload, contexto = cola.get()
+            if self._descartes:
+                self._avisar_descartes()
+            if self.ventana <= 0:
+                try:
+                    emitir(evento, payload, contexto)
+                finally:
+                    _registrar_despacho(time.monotonic() - encolado)
+                    cola.task_done()
+                continue
+
+            # La ventana empieza con el primer evento: nada espera más que `ventana`
+            coalescedor = Coalescedor()
+            recibidos = []
+            limite = time.monotonic() + self.ventana
+            while True:
+                coalescedor.agregar(evento, payload, contexto)
+                recibidos.append(encolado)
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    encolado, evento, payload, contexto = cola.get(timeout=restante)
+                except queue.Empty:
+                    break
+            try:
+                coalescedor.vaciar()
+            finally:
+                ahora = time.monotonic()
+                for encolado in recibidos:
+                    _registrar_despacho(ahora - encolado)
+                    cola.task_done()
+
+    def profundidad(self):
+        return sum(cola.qsize() for cola in self._colas)
+
+    def vaciar(self, timeout=5.0):
+        """Espera a que se emita todo lo encolado; False si vence el timeout"""
+        limite = time.monotonic() + timeout
+        while any(cola.unfinished_tasks for cola in self._colas):
+            if time.monotonic() > limite:
+                return False
+            time.sleep(0.005)
+        return True
+
+
+despachador = Despachador()
+
+
+def _hay_escrituras_sin_confirmar(session):
+    return bool(session.new or session.dirty or session.deleted or session.info.get("eventos_escrituras"))
+
+
+def publicar(evento, datos, **contexto):
+    """
+    Programa el evento de dominio según RUTAS; `contexto` completa las plantillas de
+    rooms (ticket_id, cliente_id, analista_id; los watchers salen de ticket_id). Si la
+    transacción actual tiene cambios sin confirmar el evento espera al commit (y se
+    descarta con rollback); si no, pasa directo al despachador. Nunca emite en el hilo
+    de la petición.
+    """
+    if evento not in RUTAS:
+        raise KeyError(f"Evento sin ruta: {evento}")
+    try:
+        payload = datos if isinstance(datos, PayloadCodificado) else PayloadCodificado(datos)
+    except Exception as e:
+        print(f"❌ Error codificando evento '{evento}': {e}")
+        return False
+    pendiente = has_app_context() and _hay_escrituras_sin_confirmar(db.session)
+    if evento in EVENTOS_CON_WATCHERS and contexto.get('ticket_id') is not None and has_app_context():
+        # Se resuelven acá, con la sesión de la petición; el despachador no tiene app context
+        try:
+            contexto['watchers'] = rooms_watchers(contexto['ticket_id'], guardar=not pendiente)
+        except Exception as e:
+            print(f"❌ Error resolviendo watchers del ticket {contexto['ticket_id']}: {e}")
+    if pendiente:
+        db.session.info.setdefault("eventos_pendientes", []).append((evento, payload, contexto))
+        return True
+    return despachador.encolar(evento, payload, contexto)
+
+
+@event.listens_for(db.session, "after_flush")
+def marcar_escrituras(session, flush_context):
+    session.info["eventos_escrituras"] = True
+
+
+@event.listens_for(db.session, "after_commit")
+def liberar_eventos_confirmados(session):
+    session.info.pop("eventos_escrituras", None)
+    for evento, payload, contexto in session.info.pop("eventos_pendientes", ()):
+        despachador.encolar(evento, payload, contexto)
+
+
+@event.listens_for(db.session, "after_rollback")
+def descartar_eventos_pendientes(session):
+    session.info.pop("eventos_escrituras", None)
+    session.info.pop("eventos_pendientes", None)
+
+
+def contar_entregas(manager):
+    """
+    Envuelve manager.get_participants para medir cada emit a varias rooms: sockets
+    únicos alcanzados y copias que se habrían enviado emitiendo room por room.
+    """
+    original = manager.get_participants
+
+    def get_participants(namespace, room):
+        if not isinstance(room, (list, tuple)):
+            return original(namespace, room)
+        rooms_namespace = manager.rooms.get(namespace, {})
+        por_room = sum(len(rooms_namespace[r]) for r in room if r in rooms_namespace)
+        participantes = list(original(namespace, room))
+        _contar(entregas=len(participantes), emits_ahorrados=por_room - len(participantes))
+        return iter(participantes)
+
+    manager.get_participants = get_participants
@@ -0,0 +1,94 @@
+"""
+Proveedor JSON para Flask y Socket.IO.
+
+Usa orjson si está instalado (datetime, date, UUID y dataclasses nativos, fechas en
+ISO 8601 como los serialize() de los modelos); si no, la librería estándar con el
+mismo formato. El módulo expone dumps/loads para pasarlo como json= a SocketIO.
+"""
+import json as _json
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(obj):
+    """Tipos que ninguno de los dos codificadores soporta por sí mismo"""
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, PayloadCodificado):
+        return obj.datos
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    if orjson is None:
+        if isinstance(obj, (datetime, date, time)):
+            return obj.isoformat()
+        if isinstance(obj, UUID):
+            return str(obj)
+    raise TypeError(f"Objeto de tipo {type(obj).__name__} no serializable a JSON")
+
+
+if orjson is not None:
+    _OPCIONES_ORJSON = orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj):
+        return orjson.dumps(obj, default=_default, option=_OPCIONES_ORJSON)
+
+    def _loads(s):
+        return orjson.loads(s)
+else:
+    def dumps_bytes(obj):
+        return _json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def _loads(s):
+        return _json.loads(s)
+
+
+class PayloadCodificado:
+    """
+    Payload de Socket.IO serializado una sola vez. Pasarlo a varios socketio.emit()
+    reutiliza el mismo texto para cada room y cada destinatario.
+    """
+    __slots__ = ('datos', 'texto')
+
+    def __init__(self, datos):
+        self.datos = datos
+        self.texto = dumps_bytes(datos).decode('utf-8')
+
+    def __repr__(self):
+        return repr(self.datos)
+
+
+def dumps(obj, **kwargs):
+    """dumps compatible con python-socketio/engineio; ignora separators/indent"""
+    # Paquete de evento de Socket.IO: [evento, datos, ...]
+    if isinstance(obj, list) and any(isinstance(e, PayloadCodificado) for e in obj):
+        return '[' + ','.join(
+            e.texto if isinstance(e, PayloadCodificado) else dumps_bytes(e).decode('utf-8')
+            for e in obj
+        ) + ']'
+    return dumps_bytes(obj).decode('utf-8')
+
+
+def loads(s, **kwargs):
+    return _loads(s)
+
+
+class JSONRapido(JSONProvider):
+    """Proveedor JSON de la app Flask (app.json)"""
+    mimetype = "application/json"
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
@@ -4,15 +4,38 @@ Provides secure token generation and validation functionality
 """
 import jwt
 import os
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from calendar import timegm
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from functools import wraps
 from flask import request, jsonify
+from sqlalchemy import select, delete, or_
+from api.models import db, TokenRevocado
+
+logger = logging.getLogger(__name__)
 
 # JWT Configuration
 JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-super-secret-jwt-key-change-in-production')
 JWT_ALGORITHM = 'HS256'
 TOKEN_EXPIRE_HOURS = 24  # 24 hours
 
+# Verified token cache: sha256(token) -> payload, evicted at exp or by LRU
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv('JWT_CACHE_MAX_ENTRIES', '4096'))
+_token_cache = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+# Revocation list refresh from the token_revocado table
+REVOCATION_REFRESH_SECONDS = float(os.getenv('JWT_REVOCATION_REFRESH_SECONDS', '5'))
+REVOCATION_PRUNE_SECONDS = float(os.getenv('JWT_REVOCATION_PRUNE_SECONDS', '600'))
+# Ids are taken at insert but become visible at commit, possibly out of order: every
+# refresh re-reads rows revoked this long before the newest one already seen
+REVOCATION_OVERLAP_SECONDS = float(os.getenv('JWT_REVOCATION_OVERLAP_SECONDS', '60'))
+
 def generate_token(user_id, email, role):
     """
     Generate a secure JWT token
@@ -25,19 +48,23 @@ def generate_token(user_id, email, role):
     Returns:
         str: JWT token
     """
+    now = datetime.utcnow()
     payload = {
         'user_id': user_id,
         'email': email,
         'role': role,
-        'iat': datetime.utcnow(),
-        'exp': datetime.utcnow() + timedelta(hours=TOKEN_EXPIRE_HOURS)
+        'jti': uuid.uuid4().hex,
+        # Sub-second iat: a token issued right after revoke_user_tokens() in the same
+        # second must not fall under its cutoff
+        'iat': _epoch(now),
+        'exp': now + timedelta(hours=TOKEN_EXPIRE_HOURS)
     }
     
     return jwt.encode(payload, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
 
-def verify_token(token):
+def decode_token(token):
     """
-    Verify and decode a JWT token
+    Decode and validate a JWT token without the cache (signature and exp)
     
     Args:
         token (str): JWT token to verify
@@ -46,21 +73,224 @@ def verify_token(token):
         dict: Decoded token payload if valid, None if invalid
     """
     try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        
-        # Verify token is not expired
-        if datetime.utcnow() > datetime.fromtimestamp(payload['exp']):
-            return None
-            
-        return payload
-        
-    except jwt.ExpiredSignatureError:
-        return None
+        return jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
     except jwt.InvalidTokenError:
+        # Includes ExpiredSignatureError
         return None
     except Exception:
         return None
 
+def verify_token(token):
+    """
+    Verify and decode a JWT token, reusing the payload of tokens already verified
+    
+    Args:
+        token (str): JWT token to verify
+    
+    Returns:
+        dict: Decoded token payload if valid, None if invalid. Treat it as read-only,
+            it is shared with later requests that present the same token
+    """
+    if not token:
+        return None
+    key = hashlib.sha256(token.encode('utf-8')).digest()
+    
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+        if cached is not None:
+            if cached['exp'] > time.time():
+                _token_cache.move_to_end(key)
+                return None if revocation_list.is_revoked(cached) else cached
+            del _token_cache[key]
+    
+    payload = decode_token(token)
+    if payload is None or 'exp' not in payload:
+        return None
+    
+    with _token_cache_lock:
+        _token_cache[key] = payload
+        while len(_token_cache) > TOKEN_CACHE_MAX_ENTRIES:
+            _token_cache.popitem(last=False)
+    return None if revocation_list.is_revoked(payload) else payload
+
+def clear_token_cache():
+    """Forget every verified token (e.g. after rotating JWT_SECRET_KEY)"""
+    with _token_cache_lock:
+        _token_cache.clear()
+
+class RevocationList:
+    """
+    In-memory copy of token_revocado: a Bloom filter in front of an exact set of
+    revoked jtis, plus per-user and global "issued before" cutoffs. Checks are O(1)
+    and never touch the database; new rows are pulled incrementally every
+    REVOCATION_REFRESH_SECONDS (id > last seen, plus an overlap window of
+    REVOCATION_OVERLAP_SECONDS by fecha_revocacion for rows that committed after a
+    higher id). Every REVOCATION_PRUNE_SECONDS the whole table is reloaded and expired
+    entries are pruned, rebuilding the Bloom filter.
+    """
+    
+    def __init__(self, bits=1 << 20, hashes=4):
+        self._size = bits
+        self._hashes = hashes
+        self._bloom = bytearray(bits // 8)
+        self._jtis = {}           # jti -> exp (epoch)
+        self._users = {}          # (role, user_id) -> (issued_until, exp) (epoch)
+        self._global = None       # (issued_until, exp) (epoch)
+        self._last_id = 0
+        self._last_revoked_at = None  # newest fecha_revocacion seen
+        self._last_error = None
+        self._next_refresh = 0.0
+        self._next_prune = 0.0
+        self._lock = threading.Lock()
+    
+    def _bloom_add(self, jti):
+        h = hash(jti)
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        for i in range(self._hashes):
+            index = (h1 + i * h2) % self._size
+            self._bloom[index >> 3] |= 1 << (index & 7)
+    
+    def _bloom_contains(self, jti):
+        h = hash(jti)
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        for i in range(self._hashes):
+            index = (h1 + i * h2) % self._size
+            if not self._bloom[index >> 3] & (1 << (index & 7)):
+                return False
+        return True
+    
+    def add(self, jti=None, role=None, user_id=None, issued_until=None, exp=None):
+        """Apply one revocation (epoch seconds) to the in-memory copy"""
+        with self._lock:
+            if jti:
+                self._jtis[jti] = exp
+                self._bloom_add(jti)
+            elif role is not None and user_id is not None:
+                current = self._users.get((role, user_id))
+                if current is None or current[0] < issued_until:
+                    self._users[(role, user_id)] = (issued_until, exp)
+            elif self._global is None or self._global[0] < issued_until:
+                self._global = (issued_until, exp)
+    
+    def is_revoked(self, payload):
+        self.refresh()
+        jti = payload.get('jti')
+        if jti and self._bloom_contains(jti) and jti in self._jtis:
+            return True
+        # Cutoffs keep microseconds; tokens issued before sub-second iat carry whole
+        # seconds and stay revoked for the whole second of the cutoff
+        issued_at = payload.get('iat', 0)
+        if self._global is not None and issued_at < self._global[0]:
+            return True
+        if self._users:
+            cutoff = self._users.get((payload.get('role'), payload.get('user_id')))
+            if cutoff is not None and issued_at < cutoff[0]:
+                return True
+        return False
+    
+    def refresh(self):
+        """Pull revocations written by any worker since the last refresh"""
+        now = time.time()
+        if now < self._next_refresh:
+            return
+        if not self._lock.acquire(blocking=False):
+            return  # another thread is already refreshing
+        try:
+            self._next_refresh = now + REVOCATION_REFRESH_SECONDS
+            query = select(TokenRevocado.__table__).order_by(TokenRevocado.id)
+            # The prune cycle reloads everything; add() ignores repeats
+            if now < self._next_prune:
+                recent = TokenRevocado.id > self._last_id
+                if self._last_revoked_at is not None:
+                    since = self._last_revoked_at - timedelta(seconds=REVOCATION_OVERLAP_SECONDS)
+                    recent = or_(recent, TokenRevocado.fecha_revocacion >= since)
+                query = query.where(recent)
+            with db.engine.connect() as connection:
+                rows = connection.execute(query).mappings().all()
+            self._last_error = None
+        except Exception as e:
+            # Outside an app context or before the migration: keep the local copy and
+            # log once per distinct error instead of on every refresh
+            rows = []
+            if str(e) != self._last_error:
+                self._last_error = str(e)
+                logger.warning("No se pudo refrescar la lista de tokens revocados: %s", e)
+        finally:
+            self._lock.release()
+        
+        for row in rows:
+            self.add(
+                jti=row['jti'], role=row['rol'], user_id=row['id_usuario'],
+                issued_until=_epoch(row['emitidos_hasta']), exp=_epoch(row['expira'])
+            )
+            self._last_id = max(self._last_id, row['id'])
+            if row['fecha_revocacion'] is not None and (
+                    self._last_revoked_at is None or row['fecha_revocacion'] > self._last_revoked_at):
+                self._last_revoked_at = row['fecha_revocacion']
+        
+        if now >= self._next_prune:
+            self.prune(now)
+    
+    def prune(self, now=None):
+        """Drop expired revocations and rebuild the Bloom filter"""
+        now = now or time.time()
+        with self._lock:
+            self._next_prune = now + REVOCATION_PRUNE_SECONDS
+            self._jtis = {j: exp for j, exp in self._jtis.items() if exp > now}
+            self._users = {k: v for k, v in self._users.items() if v[1] > now}
+            if self._global is not None and self._global[1] <= now:
+                self._global = None
+            self._bloom = bytearray(self._size // 8)
+            for jti in self._jtis:
+                self._bloom_add(jti)
+    
+    def stats(self):
+        return {
+            "jtis": len(self._jtis),
+            "usuarios": len(self._users),
+            "global": self._global is not None,
+            "ultimo_id": self._last_id
+        }
+
+revocation_list = RevocationList()
+
+def _epoch(value):
+    """Naive UTC datetime -> epoch seconds, keeping microseconds"""
+    return timegm(value.utctimetuple()) + value.microsecond / 1e6 if value is not None else None
+
+def _persist_revocation(**values):
+    """Insert a token_revocado row and delete rows that already expired"""
+    db.session.execute(delete(TokenRevocado).where(TokenRevocado.expira < datetime.utcnow()))
+    db.session.add(TokenRevocado(**values))
+    db.session.commit()
+
+def revoke_token(payload):
+    """
+    Revoke a single token (logout)
+    
+    Args:
+        payload (dict): Verified token payload
+    
+    Returns:
+        bool: True if revoked, False for tokens issued without jti
+    """
+    if not payload.get('jti'):
+        return False
+    exp = datetime.utcfromtimestamp(payload['exp'])
+    _persist_revocation(jti=payload['jti'], expira=exp)
+    revocation_list.add(jti=payload['jti'], exp=payload['exp'])
+    return True
+
+def revoke_user_tokens(role=None, user_id=None):
+    """
+    Revoke every token issued until now to one user, or to everyone if role and
+    user_id are None (logout everywhere / admin kill switch)
+    """
+    now = datetime.utcnow()
+    exp = now + timedelta(hours=TOKEN_EXPIRE_HOURS)
+    _persist_revocation(rol=role, id_usuario=user_id, emitidos_hasta=now, expira=exp)
+    revocation_list.add(role=role, user_id=user_id, issued_until=_epoch(now), exp=_epoch(exp))
+
 def get_token_from_request():
     """
     Extract JWT token from Authorization header
@@ -73,6 +303,37 @@ def get_token_from_request():
         return auth_header.split(' ')[1]
     return None
 
+def authenticate_request(allowed_roles=None):
+    """
+    Shared pipeline for require_auth and require_role: read the Bearer token,
+    verify it and store the user in request.current_user
+    
+    Args:
+        allowed_roles (list, optional): Roles allowed, None for any authenticated user
+    
+    Returns:
+        tuple: None if authenticated, otherwise the (response, status) to return
+    """
+    token = get_token_from_request()
+    if not token:
+        return jsonify({'message': 'Token de autorización requerido'}), 401
+    
+    payload = verify_token(token)
+    if not payload:
+        return jsonify({'message': 'Token inválido o expirado'}), 401
+    
+    # Check if user has required role
+    if allowed_roles is not None and payload['role'] not in allowed_roles:
+        return jsonify({'message': 'Permisos insuficientes'}), 403
+    
+    # Add user info to request context
+    request.current_user = {
+        'id': payload['user_id'],
+        'email': payload['email'],
+        'role': payload['role']
+    }
+    return None
+
 def require_auth(f):
     """
     Decorator to require authentication for API endpoints
@@ -85,22 +346,9 @@ def require_auth(f):
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        token = get_token_from_request()
-        
-        if not token:
-            return jsonify({'message': 'Token de autorización requerido'}), 401
-        
-        payload = verify_token(token)
-        if not payload:
-            return jsonify({'message': 'Token inválido o expirado'}), 401
-        
-        # Add user info to request context
-        request.current_user = {
-            'id': payload['user_id'],
-            'email': payload['email'],
-            'role': payload['role']
-        }
-        
+        error = authenticate_request()
+        if error is not None:
+            return error
         return f(*args, **kwargs)
     
     return decorated_function
@@ -115,29 +363,14 @@ def require_role(allowed_roles):
     Returns:
         Decorator function
     """
+    allowed_roles = frozenset(allowed_roles)
+    
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            token = get_token_from_request()
-            
-            if not token:
-                return jsonify({'message': 'Token de autorización requerido'}), 401
-            
-            payload = verify_token(token)
-            if not payload:
-                return jsonify({'message': 'Token inválido o expirado'}), 401
-            
-            # Check if user has required role
-            if payload['role'] not in allowed_roles:
-                return jsonify({'message': 'Permisos insuficientes'}), 403
-            
-            # Add user info to request context
-            request.current_user = {
-                'id': payload['user_id'],
-                'email': payload['email'],
-                'role': payload['role']
-            }
-            
+            error = authenticate_request(allowed_roles)
+            if error is not None:
+                return error
             return f(*args, **kwargs)
         
         return decorated_function
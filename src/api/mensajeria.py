@@ -0,0 +1,119 @@
+"""
+Cola de mensajes de Socket.IO para varios workers o varios nodos.
+
+Sin cola, socketio.emit() solo llega a los clientes conectados al mismo proceso. Con
+SOCKETIO_MESSAGE_QUEUE cada emit se publica en la cola y todos los workers (y los
+comandos de flask que emitan) lo reparten a sus clientes:
+
+    redis://host:6379/0    RedisManager de python-socketio (requiere redis)
+    kafka://host:9092      KafkaManager (requiere kafka-python)
+    zmq+tcp://host:5555    ZmqManager (requiere pyzmq y un broker)
+    amqp://...             KombuManager (requiere kombu)
+    file:///tmp/tiback-mq  ArchivoManager: log compartido en disco, sin servicios
+                           externos, para varios workers en una misma máquina
+
+Un proceso sin la app (un job en segundo plano) puede emitir con
+crear_client_manager(url, write_only=True).emit(evento, datos, room=...).
+
+Con más de un worker los clientes que usan long-polling necesitan sesiones pegajosas
+en el balanceador; websocket no.
+"""
+import base64
+import fcntl
+import os
+import pickle
+import socketio
+
+# Al superar este tamaño el log se rota a <canal>.log.1. Un lector que no alcance a
+# leer un log entero antes de la siguiente rotación pierde esos mensajes
+ARCHIVO_MQ_MAX_BYTES = int(os.getenv('ARCHIVO_MQ_MAX_BYTES', str(16 * 1024 * 1024)))
+# Segundos entre lecturas del log cuando no hay mensajes nuevos
+ARCHIVO_MQ_INTERVALO = float(os.getenv('ARCHIVO_MQ_INTERVALO', '0.02'))
+
+
+class ArchivoManager(socketio.PubSubManager):
+    """
+    PubSubManager sobre un archivo de log de solo anexado: cada publicación agrega una
+    línea (pickle en base64) bajo flock, y cada proceso lee las líneas nuevas.
+    """
+    name = 'archivo'
+
+    def __init__(self, url='file:///tmp/tiback-mq', channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.directorio = url[len('file://'):] if url.startswith('file://') else url
+        os.makedirs(self.directorio, mode=0o700, exist_ok=True)
+        self.ruta_log = os.path.join(self.directorio, f'{channel}.log')
+        self.ruta_bloqueo = os.path.join(self.directorio, f'{channel}.lock')
+
+    def _publish(self, data):
+        linea = base64.b64encode(pickle.dumps(data)) + b'\n'
+        with open(self.ruta_bloqueo, 'a') as bloqueo:
+            fcntl.flock(bloqueo, fcntl.LOCK_EX)
+            try:
+                try:
+                    if os.path.getsize(self.ruta_log) + len(linea) > ARCHIVO_MQ_MAX_BYTES:
+                        os.replace(self.ruta_log, self.ruta_log + '.1')
+                except FileNotFoundError:
+                    pass
+                descriptor = os.open(self.ruta_log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                try:
+                    os.write(descriptor, linea)
+                finally:
+                    os.close(descriptor)
+            finally:
+                fcntl.flock(bloqueo, fcntl.LOCK_UN)
+
+    def _abrir_log(self, desde_el_final):
+        # Crea el log si todavía nadie publicó, para poder seguirlo desde ya
+        os.close(os.open(self.ruta_log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600))
+        archivo = open(self.ruta_log, 'rb')
+        if desde_el_final:
+            archivo.seek(0, os.SEEK_END)
+        return archivo
+
+    def _listen(self):
+        # Solo interesan los mensajes publicados desde que este proceso escucha
+        archivo = self._abrir_log(desde_el_final=True)
+        pendiente = b''
+        while True:
+            bloque = archivo.read()
+            if bloque:
+                pendiente += bloque
+                *lineas, pendiente = pendiente.split(b'\n')
+                for linea in lineas:
+                    if linea:
+                        yield base64.b64decode(linea)
+                continue
+            try:
+                rotado = os.stat(self.ruta_log).st_ino != os.fstat(archivo.fileno()).st_ino
+            except FileNotFoundError:
+                rotado = True
+            if rotado:
+                # Terminar el log viejo (pudo recibir líneas antes de rotar) y seguir
+                # con el nuevo desde el principio
+                pendiente += archivo.read()
+                archivo.close()
+                for linea in pendiente.split(b'\n'):
+                    if linea:
+                        yield base64.b64decode(linea)
+                archivo = self._abrir_log(desde_el_final=False)
+                pendiente = b''
+                continue
+            self.server.sleep(ARCHIVO_MQ_INTERVALO)
+
+
+def crear_client_manager(url, canal='socketio', write_only=False):
+    """client_manager de socketio.Server para la URL de SOCKETIO_MESSAGE_QUEUE (None = sin cola)"""
+    if not url:
+        return None
+    if url.startswith('file://'):
+        clase = ArchivoManager
+    elif url.startswith(('redis://', 'rediss://')):
+        clase = socketio.RedisManager
+    elif url.startswith('kafka'):
+        clase = socketio.KafkaManager
+    elif url.startswith('zmq'):
+        clase = socketio.ZmqManager
+    else:
+        clase = socketio.KombuManager
+    return clase(url, channel=canal, write_only=write_only)
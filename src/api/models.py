@@ -1,11 +1,19 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import String, Boolean, ForeignKey, DateTime, Text, JSON
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import (
+    String, Boolean, ForeignKey, DateTime, Text, JSON, Index, Enum, UniqueConstraint, false,
+    event, update, select, insert, delete, and_, case, inspect, literal, true
+)
+from sqlalchemy.orm import Mapped, mapped_column, relationship, backref, selectinload, joinedload
 from datetime import datetime
 from typing import List
+from api.passwords import es_hash
 
 db = SQLAlchemy()
 
+# Canales de chat por ticket
+CANAL_SUPERVISOR_ANALISTA = "supervisor_analista"
+CANAL_ANALISTA_CLIENTE = "analista_cliente"
+
 class User(db.Model):
     id: Mapped[int] = mapped_column(primary_key=True)
     email: Mapped[str] = mapped_column(String(120), unique=True, nullable=False)
@@ -96,6 +104,11 @@ class Supervisor(db.Model):
 
 
 class Comentarios(db.Model):
+    __table_args__ = (
+        Index('ix_comentarios_id_ticket_fecha', 'id_ticket', 'fecha_comentario'),
+        Index('ix_comentarios_id_analista_fecha', 'id_analista', 'fecha_comentario'),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True)
     id_ticket: Mapped[int] = mapped_column(
         ForeignKey("ticket.id"), nullable=False
@@ -141,12 +154,18 @@ class Comentarios(db.Model):
 
 
 class Asignacion(db.Model):
+    __table_args__ = (
+        Index('ix_asignacion_id_analista_id_ticket', 'id_analista', 'id_ticket'),
+        Index('ix_asignacion_id_ticket_fecha', 'id_ticket', 'fecha_asignacion'),
+        Index('ix_asignacion_id_supervisor_id_ticket', 'id_supervisor', 'id_ticket'),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True)
     id_ticket: Mapped[int] = mapped_column(ForeignKey("ticket.id"), nullable=False)
     id_supervisor: Mapped[int] = mapped_column(ForeignKey("supervisor.id"), nullable=False)
     id_analista: Mapped[int] = mapped_column(ForeignKey("analista.id"), nullable=False)
     fecha_asignacion: Mapped[datetime] = mapped_column(DateTime, nullable=False)
-    ticket = relationship("Ticket", backref="asignaciones")
+    ticket = relationship("Ticket", backref="asignaciones", foreign_keys=[id_ticket])
     analista = relationship("Analista", back_populates="asignaciones")
     supervisor = relationship("Supervisor", back_populates="asignaciones")
 
@@ -176,6 +195,13 @@ class Administrador(db.Model):
 
 
 class Ticket(db.Model):
+    __table_args__ = (
+        Index('ix_ticket_estado_fecha_id', 'estado', 'fecha_creacion', 'id'),
+        Index('ix_ticket_id_cliente_estado', 'id_cliente', 'estado'),
+        Index('ix_ticket_fecha_id', 'fecha_creacion', 'id'),
+        Index('ix_ticket_version', 'version'),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True)
     id_cliente: Mapped[int] = mapped_column(
         ForeignKey("cliente.id"), nullable=False
@@ -191,41 +217,96 @@ class Ticket(db.Model):
     fecha_evaluacion: Mapped[datetime] = mapped_column(DateTime, nullable=True)
     url_imagen: Mapped[str] = mapped_column(String(500), nullable=True)
     img_urls: Mapped[List[str]] = mapped_column(JSON, nullable=True)
+    # Desnormalizados: los mantienen asignar_ticket y cambiar_estado_ticket en la misma transacción
+    id_asignacion_actual: Mapped[int] = mapped_column(
+        ForeignKey("asignacion.id", name="fk_ticket_asignacion_actual", use_alter=True, ondelete="SET NULL"),
+        nullable=True
+    )
+    reapertura_pendiente: Mapped[bool] = mapped_column(
+        Boolean(), nullable=False, default=False, server_default=false()
+    )
+    # Versión global del último cambio del ticket; la asigna asignar_versiones_tickets al commit
+    version: Mapped[int] = mapped_column(nullable=False, default=0, server_default="0")
     cliente = relationship("Cliente", back_populates="tickets")
+    asignacion_actual = relationship(
+        "Asignacion", foreign_keys=[id_asignacion_actual], post_update=True
+    )
+
+    @staticmethod
+    def opciones_serializacion():
+        """Opciones de carga para serializar listas de tickets con un número fijo de consultas"""
+        return (
+            joinedload(Ticket.cliente),
+            joinedload(Ticket.asignacion_actual).joinedload(Asignacion.analista),
+            joinedload(Ticket.asignacion_actual).joinedload(Asignacion.supervisor),
+            selectinload(Ticket.comentarios).joinedload(Comentarios.cliente),
+            selectinload(Ticket.comentarios).joinedload(Comentarios.analista),
+            selectinload(Ticket.comentarios).joinedload(Comentarios.supervisor),
+        )
+
+    @classmethod
+    def serialize_many(cls, tickets):
+        """Serializar una lista de tickets cargada con opciones_serializacion() sin consultas adicionales"""
+        return [t.serialize() for t in tickets]
+
+    @staticmethod
+    def consulta_ids_relevantes(role, user_id):
+        """
+        Ids de los tickets abiertos que le conciernen al usuario: los suyos (cliente) o
+        los que tiene asignados ahora (analista) o asignó (supervisor). None para roles
+        que los siguen por sus rooms de rol (administrador).
+        """
+        abiertos = Ticket.estado != 'cerrado'
+        if role == 'cliente':
+            return db.session.query(Ticket.id).filter(Ticket.id_cliente == user_id, abiertos)
+        columna = {'analista': Asignacion.id_analista, 'supervisor': Asignacion.id_supervisor}.get(role)
+        if columna is None:
+            return None
+        # Desde los índices (id_analista|id_supervisor, id_ticket) hasta la PK del ticket
+        return (db.session.query(Ticket.id)
+                .join(Asignacion, (Asignacion.id_ticket == Ticket.id) & (Ticket.id_asignacion_actual == Asignacion.id))
+                .filter(columna == user_id, abiertos))
+
+    @staticmethod
+    def visible_para(ticket_id, role, user_id):
+        """
+        True si el usuario puede ver el ticket, con la misma regla que la API REST: el
+        cliente dueño, un analista con alguna asignación en él, supervisores y
+        administradores (estos dos, si el ticket existe).
+        """
+        if role == 'cliente':
+            condicion = Ticket.id_cliente == user_id
+        elif role == 'analista':
+            condicion = Ticket.asignaciones.any(Asignacion.id_analista == user_id)
+        elif role in ('supervisor', 'administrador'):
+            condicion = true()
+        else:
+            return False
+        return db.session.query(select(Ticket.id).where(Ticket.id == ticket_id, condicion).exists()).scalar()
+
+    def recalcular_asignacion_actual(self):
+        """Recalcula id_asignacion_actual después de borrar o editar asignaciones fuera de asignar_ticket"""
+        self.asignacion_actual = Asignacion.query.filter_by(id_ticket=self.id).order_by(
+            Asignacion.fecha_asignacion.desc(), Asignacion.id.desc()
+        ).first()
 
     def serialize(self):
-        # Obtener la asignación más reciente
+        # Asignación más reciente (puntero desnormalizado)
         asignacion_actual = None
-        if self.asignaciones:
-            asignacion_mas_reciente = max(self.asignaciones, key=lambda x: x.fecha_asignacion)
+        asignacion = self.asignacion_actual
+        if asignacion:
             asignacion_actual = {
-                "id": asignacion_mas_reciente.id,
-                "id_ticket": asignacion_mas_reciente.id_ticket,
-                "id_supervisor": asignacion_mas_reciente.id_supervisor,
-                "id_analista": asignacion_mas_reciente.id_analista,
-                "fecha_asignacion": asignacion_mas_reciente.fecha_asignacion.isoformat() if asignacion_mas_reciente.fecha_asignacion else None,
-                "analista": asignacion_mas_reciente.analista.serialize() if asignacion_mas_reciente.analista else None,
-                "supervisor": asignacion_mas_reciente.supervisor.serialize() if asignacion_mas_reciente.supervisor else None
+                "id": asignacion.id,
+                "id_ticket": asignacion.id_ticket,
+                "id_supervisor": asignacion.id_supervisor,
+                "id_analista": asignacion.id_analista,
+                "fecha_asignacion": asignacion.fecha_asignacion.isoformat() if asignacion.fecha_asignacion else None,
+                "analista": asignacion.analista.serialize() if asignacion.analista else None,
+                "supervisor": asignacion.supervisor.serialize() if asignacion.supervisor else None
             }
         
-        # Verificar si tiene solicitud de reapertura pendiente
-        tiene_solicitud_pendiente = False
-        if self.estado.lower() == 'solucionado':
-            # Importar la función helper
-            try:
-                from api.routes import tiene_solicitud_reapertura_pendiente
-                tiene_solicitud_pendiente = tiene_solicitud_reapertura_pendiente(self.id)
-            except ImportError:
-                # Si no se puede importar, verificar directamente
-                solicitud_reapertura = [c for c in self.comentarios if 
-                    c.texto == "Cliente solicitó reapertura del ticket - Pendiente de decisión del supervisor"]
-                if solicitud_reapertura:
-                    # Verificar si hay decisión del supervisor después
-                    decision_supervisor = [c for c in self.comentarios if 
-                        c.fecha_comentario > solicitud_reapertura[0].fecha_comentario and
-                        c.id_supervisor is not None and
-                        "Supervisor aprobó solicitud de reapertura" in c.texto]
-                    tiene_solicitud_pendiente = len(decision_supervisor) == 0
+        # La solicitud de reapertura solo aplica a tickets solucionados
+        tiene_solicitud_pendiente = self.estado.lower() == 'solucionado' and bool(self.reapertura_pendiente)
         
         return {
             "id": self.id,
@@ -244,7 +325,8 @@ class Ticket(db.Model):
             "asignacion_actual": asignacion_actual,
             "img_urls": self.img_urls or [],
             "comentarios": [c.serialize() for c in self.comentarios] if hasattr(self, 'comentarios') else [],
-            "tiene_solicitud_reapertura_pendiente": tiene_solicitud_pendiente
+            "tiene_solicitud_reapertura_pendiente": tiene_solicitud_pendiente,
+            "version": self.version
         }
 
 class Gestion(db.Model):
@@ -264,3 +346,337 @@ class Gestion(db.Model):
             "fecha_cambio": self.fecha_cambio.isoformat() if self.fecha_cambio else None,
             "Nota_de_caso": self.Nota_de_caso,
         }
+
+
+class MensajeChat(db.Model):
+    __tablename__ = "mensaje_chat"
+    __table_args__ = (
+        Index('ix_mensaje_chat_ticket_canal_id', 'id_ticket', 'canal', 'id'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    id_ticket: Mapped[int] = mapped_column(ForeignKey("ticket.id"), nullable=False)
+    canal: Mapped[str] = mapped_column(
+        Enum(CANAL_SUPERVISOR_ANALISTA, CANAL_ANALISTA_CLIENTE, name="canal_chat"), nullable=False
+    )
+    id_cliente: Mapped[int] = mapped_column(ForeignKey("cliente.id"), nullable=True)
+    id_analista: Mapped[int] = mapped_column(ForeignKey("analista.id"), nullable=True)
+    id_supervisor: Mapped[int] = mapped_column(ForeignKey("supervisor.id"), nullable=True)
+    mensaje: Mapped[str] = mapped_column(Text, nullable=False)
+    fecha_mensaje: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    ticket = relationship("Ticket", backref=backref("mensajes_chat", cascade="all, delete-orphan"))
+    cliente = relationship("Cliente")
+    analista = relationship("Analista")
+    supervisor = relationship("Supervisor")
+
+    def serialize(self):
+        autor = None
+        for rol, usuario in (("supervisor", self.supervisor), ("analista", self.analista), ("cliente", self.cliente)):
+            if usuario:
+                autor = {
+                    "id": usuario.id,
+                    "nombre": usuario.nombre,
+                    "apellido": usuario.apellido,
+                    "rol": rol
+                }
+                break
+
+        return {
+            "id": self.id,
+            "mensaje": self.mensaje,
+            "fecha_mensaje": self.fecha_mensaje.isoformat() if self.fecha_mensaje else None,
+            "autor": autor
+        }
+
+
+class ContadorVersion(db.Model):
+    """Contador global de versiones; la fila, bloqueada desde que se toma la versión justo antes
+    del COMMIT, ordena los cambios (ver _siguiente_version)"""
+    __tablename__ = "contador_version"
+
+    nombre: Mapped[str] = mapped_column(String(50), primary_key=True)
+    valor: Mapped[int] = mapped_column(nullable=False, default=0)
+
+    @staticmethod
+    def actual(nombre="tickets"):
+        return db.session.execute(
+            select(ContadorVersion.valor).where(ContadorVersion.nombre == nombre)
+        ).scalar() or 0
+
+
+class TicketEliminado(db.Model):
+    """Tombstone de tickets borrados para /tickets/changes"""
+    __tablename__ = "ticket_eliminado"
+    __table_args__ = (
+        Index('ix_ticket_eliminado_version', 'version'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    id_ticket: Mapped[int] = mapped_column(nullable=False)
+    id_cliente: Mapped[int] = mapped_column(nullable=True)
+    version: Mapped[int] = mapped_column(nullable=False)
+    fecha_eliminacion: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.now)
+
+
+class Identidad(db.Model):
+    """Índice de usuarios de los cuatro roles por email; lo mantiene sincronizar_identidades"""
+    __tablename__ = "identidad"
+    __table_args__ = (
+        UniqueConstraint('email', 'rol', name='uq_identidad_email_rol'),
+        UniqueConstraint('rol', 'id_usuario', name='uq_identidad_rol_id_usuario'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    email: Mapped[str] = mapped_column(String(120), nullable=False, index=True)
+    rol: Mapped[str] = mapped_column(String(20), nullable=False)
+    id_usuario: Mapped[int] = mapped_column(nullable=False)
+
+    @staticmethod
+    def buscar_credenciales(email):
+        """
+        Identidades de un email con la contraseña de su tabla, en una sola consulta.
+
+        Returns:
+            list: Filas (rol, id_usuario, email, contraseña_hash)
+        """
+        contraseña = case(
+            *[(Identidad.rol == rol, modelo.contraseña_hash) for modelo, rol in ROLES_IDENTIDAD.items()]
+        )
+        consulta = select(Identidad.rol, Identidad.id_usuario, Identidad.email, contraseña.label("contraseña_hash"))
+        for modelo, rol in ROLES_IDENTIDAD.items():
+            consulta = consulta.outerjoin(modelo, and_(Identidad.rol == rol, modelo.id == Identidad.id_usuario))
+        return db.session.execute(consulta.where(Identidad.email == email)).all()
+
+
+class TokenRevocado(db.Model):
+    """
+    Revocaciones de JWT. Con jti revoca un token; sin jti revoca todos los emitidos
+    hasta emitidos_hasta, de un usuario (rol + id_usuario) o de todos si ambos son NULL.
+    La fila deja de importar en expira y se puede borrar.
+    """
+    __tablename__ = "token_revocado"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    jti: Mapped[str] = mapped_column(String(64), nullable=True, unique=True)
+    rol: Mapped[str] = mapped_column(String(20), nullable=True)
+    id_usuario: Mapped[int] = mapped_column(nullable=True)
+    emitidos_hasta: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    expira: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    fecha_revocacion: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+# Por qué un usuario sigue un ticket; los tres primeros los mantiene mantener_watchers
+MOTIVOS_WATCHER = ('cliente', 'analista', 'supervisor', 'seguidor')
+
+
+class TicketWatcher(db.Model):
+    """
+    Usuarios (rol + id_usuario) a los que les interesan los eventos de un ticket: el
+    cliente dueño, el analista y el supervisor de la asignación actual y los seguidores
+    explícitos. api/watchers.py los cachea para emitir solo a ellos.
+    """
+    __tablename__ = "ticket_watcher"
+    __table_args__ = (
+        UniqueConstraint('id_ticket', 'rol', 'id_usuario', 'motivo', name='uq_ticket_watcher'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    id_ticket: Mapped[int] = mapped_column(ForeignKey("ticket.id", ondelete="CASCADE"), nullable=False)
+    rol: Mapped[str] = mapped_column(String(20), nullable=False)
+    id_usuario: Mapped[int] = mapped_column(nullable=False)
+    motivo: Mapped[str] = mapped_column(String(20), nullable=False)
+    fecha_creacion: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.now)
+
+
+ROLES_IDENTIDAD = {
+    Cliente: 'cliente',
+    Analista: 'analista',
+    Supervisor: 'supervisor',
+    Administrador: 'administrador',
+}
+
+
+def _exigir_hash_contraseña(target, value, oldvalue, initiator):
+    """
+    Guarda: contraseña_hash solo admite hashes. El hash no se calcula aquí (600k
+    iteraciones en línea bloquearían el hub de eventlet); las rutas lo piden con
+    hashear_en_pool y los comandos con hashear_contraseña.
+    """
+    if value is not None and not es_hash(value):
+        raise ValueError("contraseña_hash requiere un hash (api/passwords.py), no texto plano")
+
+
+for _modelo in ROLES_IDENTIDAD:
+    event.listen(_modelo.contraseña_hash, "set", _exigir_hash_contraseña)
+
+
+def _siguiente_version(session, nombre="tickets"):
+    """
+    Incrementa y devuelve el contador global. El UPDATE bloquea la fila hasta el COMMIT,
+    así que se llama como último paso antes de confirmar (asignar_versiones_tickets) y no
+    en cada flush: las escrituras de tickets solo se serializan durante ese tramo final y
+    no durante toda la transacción.
+
+    Se descartó una secuencia de PostgreSQL: no bloquea, pero una versión tomada antes
+    puede confirmarse después y /tickets/changes (Ticket.version > since) la saltaría.
+    Con el bloqueo el orden de commit coincide con el de versión, a costa de que los
+    commits concurrentes con cambios en tickets esperen su turno en ese tramo.
+    """
+    conexion = session.connection()
+    tabla = ContadorVersion.__table__
+    actualizadas = conexion.execute(
+        update(tabla).where(tabla.c.nombre == nombre).values(valor=tabla.c.valor + 1)
+    ).rowcount
+    if not actualizadas:
+        conexion.execute(insert(tabla).values(nombre=nombre, valor=1))
+    return conexion.execute(select(tabla.c.valor).where(tabla.c.nombre == nombre)).scalar()
+
+
+@event.listens_for(db.session, "after_flush")
+def registrar_versiones_tickets(session, flush_context):
+    """Anota en session.info["tickets_versionar"] los tickets creados o modificados en este
+    flush, incluidos los cambios en sus comentarios y asignaciones, y en
+    session.info["tickets_eliminados"] los borrados; la versión se asigna al commit"""
+    ids_ticket = set()
+    eliminados = {}
+
+    for obj in session.new:
+        if isinstance(obj, Ticket):
+            ids_ticket.add(obj.id)
+        elif isinstance(obj, (Comentarios, Asignacion)):
+            ids_ticket.add(obj.id_ticket)
+
+    for obj in session.dirty:
+        if isinstance(obj, (Ticket, Comentarios, Asignacion)) and session.is_modified(obj, include_collections=False):
+            ids_ticket.add(obj.id if isinstance(obj, Ticket) else obj.id_ticket)
+
+    for obj in session.deleted:
+        if isinstance(obj, Ticket):
+            eliminados[obj.id] = obj.id_cliente
+        elif isinstance(obj, (Comentarios, Asignacion)):
+            ids_ticket.add(obj.id_ticket)
+
+    ids_ticket.discard(None)
+    if ids_ticket:
+        session.info.setdefault("tickets_versionar", set()).update(ids_ticket)
+    if eliminados:
+        session.info.setdefault("tickets_eliminados", {}).update(eliminados)
+
+
+@event.listens_for(db.session, "before_commit")
+def asignar_versiones_tickets(session):
+    """Toma una única versión para todos los tickets de la transacción justo antes del
+    COMMIT (ver _siguiente_version) y deja los tombstones de los borrados"""
+    # before_commit corre antes del último flush: se fuerza para no perder cambios pendientes
+    session.flush()
+    ids_ticket = session.info.pop("tickets_versionar", set())
+    eliminados = session.info.pop("tickets_eliminados", {})
+    ids_ticket -= eliminados.keys()
+    if not ids_ticket and not eliminados:
+        return
+
+    version = _siguiente_version(session)
+    conexion = session.connection()
+    if ids_ticket:
+        conexion.execute(
+            update(Ticket.__table__).where(Ticket.__table__.c.id.in_(ids_ticket)).values(version=version)
+        )
+    if eliminados:
+        conexion.execute(insert(TicketEliminado.__table__), [
+            {"id_ticket": id_ticket, "id_cliente": id_cliente, "version": version}
+            for id_ticket, id_cliente in eliminados.items()
+        ])
+
+
+@event.listens_for(db.session, "after_rollback")
+def descartar_versiones_tickets(session):
+    session.info.pop("tickets_versionar", None)
+    session.info.pop("tickets_eliminados", None)
+
+
+@event.listens_for(db.session, "after_flush")
+def sincronizar_identidades(session, flush_context):
+    """Mantiene la tabla identidad al crear, cambiar el email o borrar usuarios de cualquier rol"""
+    tabla = Identidad.__table__
+    nuevas = []
+    for obj in session.new:
+        rol = ROLES_IDENTIDAD.get(type(obj))
+        if rol:
+            nuevas.append({"email": obj.email, "rol": rol, "id_usuario": obj.id})
+
+    for obj in session.dirty:
+        rol = ROLES_IDENTIDAD.get(type(obj))
+        if rol and inspect(obj).attrs.email.history.has_changes():
+            session.connection().execute(
+                update(tabla).where(tabla.c.rol == rol, tabla.c.id_usuario == obj.id).values(email=obj.email)
+            )
+
+    for obj in session.deleted:
+        rol = ROLES_IDENTIDAD.get(type(obj))
+        if rol:
+            session.connection().execute(
+                delete(tabla).where(tabla.c.rol == rol, tabla.c.id_usuario == obj.id)
+            )
+
+    if nuevas:
+        session.connection().execute(insert(tabla), nuevas)
+
+
+@event.listens_for(db.session, "after_flush")
+def mantener_watchers(session, flush_context):
+    """
+    Watchers automáticos: el cliente al crear el ticket y el analista y el supervisor de
+    la asignación actual, que se recalculan cuando cambia el puntero o las asignaciones
+    del ticket. Deja los tickets tocados (también por seguidores explícitos) en
+    session.info["watchers_modificados"] para invalidar la caché al commit.
+    """
+    tabla = TicketWatcher.__table__
+    clientes = []
+    borrados = set()
+    # Tickets cuyo analista/supervisor puede haber cambiado
+    reasignados = set()
+    # Seguidores explícitos: no hay nada que mantener, solo invalidar
+    seguidores = set()
+
+    for obj in session.deleted:
+        if isinstance(obj, Ticket):
+            borrados.add(obj.id)
+        elif isinstance(obj, Asignacion):
+            reasignados.add(obj.id_ticket)
+        elif isinstance(obj, TicketWatcher):
+            seguidores.add(obj.id_ticket)
+
+    for obj in session.new:
+        if isinstance(obj, Ticket):
+            clientes.append({"id_ticket": obj.id, "rol": "cliente", "id_usuario": obj.id_cliente, "motivo": "cliente"})
+            reasignados.add(obj.id)
+        elif isinstance(obj, Asignacion):
+            reasignados.add(obj.id_ticket)
+        elif isinstance(obj, TicketWatcher):
+            seguidores.add(obj.id_ticket)
+
+    for obj in session.dirty:
+        if isinstance(obj, Ticket) and inspect(obj).attrs.id_asignacion_actual.history.has_changes():
+            reasignados.add(obj.id)
+
+    reasignados -= borrados
+    if borrados:
+        session.connection().execute(delete(tabla).where(tabla.c.id_ticket.in_(borrados)))
+    fecha = datetime.now()
+    if clientes:
+        session.connection().execute(insert(tabla), [dict(fila, fecha_creacion=fecha) for fila in clientes])
+    if reasignados:
+        session.connection().execute(
+            delete(tabla).where(tabla.c.id_ticket.in_(reasignados), tabla.c.motivo.in_(("analista", "supervisor")))
+        )
+        for rol, columna in (("analista", Asignacion.id_analista), ("supervisor", Asignacion.id_supervisor)):
+            session.connection().execute(insert(tabla).from_select(
+                ["id_ticket", "rol", "id_usuario", "motivo", "fecha_creacion"],
+                select(Ticket.id, literal(rol), columna, literal(rol), literal(fecha))
+                .join(Asignacion, Asignacion.id == Ticket.id_asignacion_actual)
+                .where(Ticket.id.in_(reasignados))
+            ))
+
+    modificados = borrados | reasignados | seguidores
+    if modificados:
+        session.info.setdefault("watchers_modificados", set()).update(modificados)
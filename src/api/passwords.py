@@ -0,0 +1,110 @@
+"""
+Hash de contraseñas con costo configurable y verificación en un pool acotado.
+
+Los hashes usan el formato de werkzeug.security (pbkdf2:sha256:<iteraciones>$sal$hash),
+que guarda el costo con cada hash: si PASSWORD_HASH_ITERACIONES cambia, el login
+detecta el hash viejo y lo regenera. Los valores sin ese formato son contraseñas en
+texto plano de antes de este módulo y también se regeneran en el primer login.
+"""
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+from api.runtime import ejecutar_bloqueante
+
+PASSWORD_HASH_ITERACIONES = int(os.getenv('PASSWORD_HASH_ITERACIONES', '600000'))
+# Hilos de hashing y peticiones que pueden esperar turno antes de responder 503
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_COLA = int(os.getenv('PASSWORD_HASH_COLA', '16'))
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', '10'))
+
+PREFIJOS_HASH = ('pbkdf2:', 'scrypt:')
+
+
+class HashingSaturado(Exception):
+    """El pool de hashing está lleno; la ruta responde 503"""
+    pass
+
+
+def metodo_actual(iteraciones=None):
+    return f"pbkdf2:sha256:{iteraciones or PASSWORD_HASH_ITERACIONES}"
+
+
+def es_hash(valor):
+    return isinstance(valor, str) and valor.startswith(PREFIJOS_HASH)
+
+
+def hashear_contraseña(contraseña, iteraciones=None):
+    return generate_password_hash(contraseña, method=metodo_actual(iteraciones))
+
+
+def verificar_contraseña(almacenado, contraseña):
+    if not almacenado or contraseña is None:
+        return False
+    if es_hash(almacenado):
+        return check_password_hash(almacenado, contraseña)
+    # Texto plano heredado
+    return hmac.compare_digest(almacenado.encode('utf-8'), contraseña.encode('utf-8'))
+
+
+def necesita_rehash(almacenado, iteraciones=None):
+    """True si el hash es texto plano o se generó con otro método/costo"""
+    if not es_hash(almacenado):
+        return True
+    return almacenado.split('$', 1)[0] != metodo_actual(iteraciones)
+
+
+class PoolHashing:
+    """
+    ThreadPoolExecutor con límite de trabajos pendientes (hashlib libera el GIL). Bajo
+    eventlet los workers son green threads y el hash corre en el tpool de eventlet.
+    """
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, cola=PASSWORD_HASH_COLA, timeout=PASSWORD_HASH_TIMEOUT):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hashing")
+        self._cupos = threading.BoundedSemaphore(workers + cola)
+        self._rechazos = 0
+        self._bloqueo = threading.Lock()
+
+    def ejecutar(self, funcion, *args):
+        if not self._cupos.acquire(blocking=False):
+            with self._bloqueo:
+                self._rechazos += 1
+            raise HashingSaturado()
+        try:
+            futuro = self._executor.submit(ejecutar_bloqueante, funcion, *args)
+        except Exception:
+            self._cupos.release()
+            raise
+        futuro.add_done_callback(lambda _: self._cupos.release())
+        try:
+            return futuro.result(timeout=self.timeout)
+        except FuturesTimeoutError:
+            raise HashingSaturado()
+
+    def rechazos(self):
+        return self._rechazos
+
+
+_pool = None
+_pool_bloqueo = threading.Lock()
+
+
+def obtener_pool():
+    global _pool
+    if _pool is None:
+        with _pool_bloqueo:
+            if _pool is None:
+                _pool = PoolHashing()
+    return _pool
+
+
+def verificar_en_pool(almacenado, contraseña):
+    """verificar_contraseña en el pool; lanza HashingSaturado si no hay cupo"""
+    return obtener_pool().ejecutar(verificar_contraseña, almacenado, contraseña)
+
+
+def hashear_en_pool(contraseña):
+    return obtener_pool().ejecutar(hashear_contraseña, contraseña)
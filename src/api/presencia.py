@@ -0,0 +1,78 @@
+"""
+Presencia en línea por rol.
+
+Se alimenta de los sockets autenticados (api/sesiones.py): el primer socket de un
+usuario lo pone en línea y el último que se desconecta lo saca. Los usuarios en línea
+se guardan agrupados por rol: contar un rol o listar sus analistas no recorre las
+sesiones. Cada 'ping' del cliente renueva su latido; un analista en línea sin latido reciente
+figura como inactivo.
+
+Los cambios de estado salen como 'presence_delta' por el bus de eventos:
+
+    {"r": "analista", "u": 3, "o": 1, "n": 4}    rol, id, en línea (1/0), total del rol
+
+Como el registro de sesiones, la presencia es por proceso.
+"""
+import os
+import threading
+import time
+
+# Segundos sin ping tras los que un usuario conectado se considera inactivo
+PRESENCIA_INACTIVO_SEGUNDOS = float(os.getenv('PRESENCIA_INACTIVO_SEGUNDOS', '120'))
+
+ROLES = ('cliente', 'analista', 'supervisor', 'administrador')
+
+
+class Presencia:
+    """Sockets y último latido de cada usuario en línea, agrupados por rol"""
+
+    def __init__(self):
+        self._roles = {rol: {} for rol in ROLES}
+        self._bloqueo = threading.Lock()
+
+    def conectar(self, role, user_id):
+        """Devuelve el delta si el usuario pasó a estar en línea, si no None"""
+        with self._bloqueo:
+            usuarios = self._roles.setdefault(role, {})
+            estado = usuarios.get(user_id)
+            if estado is not None:
+                estado['sockets'] += 1
+                estado['latido'] = time.monotonic()
+                return None
+            usuarios[user_id] = {'sockets': 1, 'latido': time.monotonic(), 'desde': time.time()}
+            return {'r': role, 'u': user_id, 'o': 1, 'n': len(usuarios)}
+
+    def desconectar(self, role, user_id):
+        """Devuelve el delta si se fue el último socket del usuario, si no None"""
+        with self._bloqueo:
+            usuarios = self._roles.get(role, {})
+            estado = usuarios.get(user_id)
+            if estado is None:
+                return None
+            estado['sockets'] -= 1
+            if estado['sockets'] > 0:
+                return None
+            del usuarios[user_id]
+            return {'r': role, 'u': user_id, 'o': 0, 'n': len(usuarios)}
+
+    def latido(self, role, user_id):
+        estado = self._roles.get(role, {}).get(user_id)
+        if estado is not None:
+            estado['latido'] = time.monotonic()
+
+    def en_linea(self, role, user_id):
+        return user_id in self._roles.get(role, ())
+
+    def conteos(self):
+        with self._bloqueo:
+            return {rol: len(usuarios) for rol, usuarios in self._roles.items()}
+
+    def usuarios(self, role):
+        """[(user_id, sockets, segundos desde el último latido, en línea desde)] del rol"""
+        ahora = time.monotonic()
+        with self._bloqueo:
+            return [(user_id, estado['sockets'], ahora - estado['latido'], estado['desde'])
+                    for user_id, estado in self._roles.get(role, {}).items()]
+
+
+presencia = Presencia()
@@ -0,0 +1,209 @@
+"""
+Reenvío de eventos perdidos a clientes que se reconectan.
+
+Cada evento del bus (api/eventos.py) que este proceso entrega a sus sockets recibe un
+número de secuencia y queda en un buffer circular por room (y uno para los emits
+globales). El cliente recibe la secuencia como segundo argumento del evento:
+
+    socket.on('ticket_actualizado', (datos, meta) => ...)   // meta = {seq, epoca}
+
+Al reconectarse, vuelve a unirse a sus rooms y emite 'resume' con la última epoca y
+seq que vio. Si los buffers de esas rooms cubren el hueco recibe 'resumed' con los
+eventos faltantes en orden; si no (buffer desbordado, room caducada, otro proceso u
+otro arranque del servidor) recibe 'resync_required' y recarga todo, solo él.
+
+La secuencia se asigna en la entrega local, no al publicar: con cola de mensajes
+cada worker numera lo que entrega a sus propios clientes, y la epoca identifica al
+proceso.
+
+Si el despachador descarta un evento (cola llena) avisa con 'resync_required' y
+motivo MOTIVO_DESCARTE a las rooms afectadas; cada worker, al entregar ese aviso,
+marca el hueco en sus buffers para que una reanudación que lo cruce también pida
+resincronizar.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+# Eventos retenidos por room y segundos sin eventos tras los que se olvida una room
+REPLAY_EVENTOS_POR_ROOM = int(os.getenv('REPLAY_EVENTOS_POR_ROOM', '200'))
+REPLAY_TTL_SEGUNDOS = float(os.getenv('REPLAY_TTL_SEGUNDOS', '300'))
+# Cada cuántos segundos se buscan rooms caducadas
+_INTERVALO_PODA = 30
+# Aviso del despachador cuando descarta eventos (api/eventos.py)
+EVENTO_RESYNC = 'resync_required'
+MOTIVO_DESCARTE = 'descartado'
+
+
+class _Room:
+    __slots__ = ('eventos', 'descartado_hasta', 'ultimo')
+
+    def __init__(self, maximo):
+        self.eventos = deque(maxlen=maximo)
+        # Secuencia del último evento que salió del buffer por desborde
+        self.descartado_hasta = 0
+        self.ultimo = 0.0
+
+
+class BufferReplay:
+    """Buffers circulares por room con la secuencia de este proceso"""
+
+    def __init__(self, por_room=REPLAY_EVENTOS_POR_ROOM, ttl=REPLAY_TTL_SEGUNDOS):
+        self.epoca = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.por_room = por_room
+        self.ttl = ttl
+        self._rooms = {}
+        # Mayor secuencia de una room olvidada por TTL
+        self._seq_caducado = 0
+        self._ultima_poda = time.monotonic()
+        self._bloqueo = threading.Lock()
+        self._estadisticas = {"reanudaciones": 0, "reenviados": 0, "resyncs": 0, "huecos_descartados": 0}
+
+    def posicion(self):
+        """Epoca y última secuencia entregada por este proceso"""
+        with self._bloqueo:
+            return {"epoca": self.epoca, "seq": self.seq}
+
+    def entregar(self, evento, datos, rooms, enviar):
+        """
+        Numera el evento, lo guarda en el buffer de cada room (None = global) y llama a
+        enviar(meta) bajo el mismo bloqueo: una posicion() leída después garantiza que
+        los eventos hasta esa secuencia ya están en la cola de cada socket.
+        """
+        ahora = time.monotonic()
+        with self._bloqueo:
+            self.seq += 1
+            entrada = (self.seq, evento, datos)
+            for room in rooms:
+                buffer = self._rooms.get(room)
+                if buffer is None:
+                    buffer = self._rooms[room] = _Room(self.por_room)
+                if len(buffer.eventos) == buffer.eventos.maxlen:
+                    buffer.descartado_hasta = buffer.eventos[0][0]
+                buffer.eventos.append(entrada)
+                buffer.ultimo = ahora
+            if ahora - self._ultima_poda > _INTERVALO_PODA:
+                self._podar(ahora)
+            return enviar({"seq": self.seq, "epoca": self.epoca})
+
+    def marcar_descarte(self, rooms):
+        """
+        Un evento para estas rooms (None = global) no se entregó: consume una secuencia
+        y la deja como hueco, así resume desde antes de ella responde 'hueco'
+        """
+        ahora = time.monotonic()
+        with self._bloqueo:
+            self.seq += 1
+            self._estadisticas["huecos_descartados"] += 1
+            for room in rooms:
+                buffer = self._rooms.get(room)
+                if buffer is None:
+                    buffer = self._rooms[room] = _Room(self.por_room)
+                buffer.descartado_hasta = self.seq
+                buffer.ultimo = ahora
+
+    def _podar(self, ahora):
+        self._ultima_poda = ahora
+        for room, buffer in list(self._rooms.items()):
+            if ahora - buffer.ultimo > self.ttl:
+                # Una room solo con descartes (marcar_descarte) tiene el buffer vacío
+                ultimo_seq = buffer.eventos[-1][0] if buffer.eventos else 0
+                self._seq_caducado = max(self._seq_caducado, ultimo_seq, buffer.descartado_hasta)
+                del self._rooms[room]
+
+    def pendientes(self, epoca, ultimo_seq, rooms):
+        """
+        Eventos con secuencia mayor a ultimo_seq en las rooms del cliente (y los
+        globales), sin repetir los que fueron a varias de ellas. Devuelve
+        (eventos, None) o (None, motivo) si hace falta una resincronización completa.
+        """
+        with self._bloqueo:
+            if epoca != self.epoca:
+                motivo = 'epoca'
+            elif not isinstance(ultimo_seq, int) or not 0 <= ultimo_seq <= self.seq:
+                motivo = 'seq_invalida'
+            else:
+                motivo = None
+                eventos = {}
+                for room in (None, *rooms):
+                    buffer = self._rooms.get(room)
+                    if buffer is None:
+                        if ultimo_seq < self._seq_caducado:
+                            motivo = 'room_caducada'
+                            break
+                        continue
+                    if ultimo_seq < buffer.descartado_hasta:
+                        motivo = 'hueco'
+                        break
+                    for entrada in reversed(buffer.eventos):
+                        if entrada[0] <= ultimo_seq:
+                            break
+                        eventos[entrada[0]] = entrada
+            if motivo:
+                self._estadisticas["resyncs"] += 1
+                return None, motivo
+            self._estadisticas["reanudaciones"] += 1
+            self._estadisticas["reenviados"] += len(eventos)
+            return [eventos[seq] for seq in sorted(eventos)], None
+
+    def estadisticas(self):
+        with self._bloqueo:
+            datos = dict(self._estadisticas)
+            datos.update({
+                "epoca": self.epoca,
+                "seq": self.seq,
+                "rooms": len(self._rooms),
+                "eventos_retenidos": sum(len(b.eventos) for b in self._rooms.values()),
+            })
+            return datos
+
+
+replay = BufferReplay()
+
+
+def registrar_replay(manager, eventos):
+    """
+    Numera y guarda los emits de los eventos indicados en la entrega local del
+    manager: emit() sin cola de mensajes, _handle_emit() de cada worker con cola.
+    """
+    def rooms_de(room):
+        if room is None:
+            return (None,)
+        return tuple(room) if isinstance(room, (list, tuple)) else (room,)
+
+    def con_meta(datos, meta):
+        return datos + (meta,) if isinstance(datos, tuple) else (datos, meta)
+
+    def marcar_si_descarte(event, data, room):
+        aviso = data[0] if isinstance(data, tuple) and data else data
+        if event == EVENTO_RESYNC and isinstance(aviso, dict) and aviso.get('motivo') == MOTIVO_DESCARTE:
+            replay.marcar_descarte(rooms_de(room))
+
+    if hasattr(manager, '_handle_emit'):
+        original = manager._handle_emit
+
+        def _handle_emit(message):
+            if message.get('event') not in eventos or message.get('namespace', '/') != '/':
+                marcar_si_descarte(message.get('event'), message.get('data'), message.get('room'))
+                return original(message)
+
+            def enviar(meta):
+                return original(dict(message, data=con_meta(message['data'], meta)))
+            return replay.entregar(message['event'], message['data'], rooms_de(message.get('room')), enviar)
+
+        manager._handle_emit = _handle_emit
+    else:
+        original = manager.emit
+
+        def emit(event, data, namespace, room=None, **kwargs):
+            if event not in eventos or namespace not in (None, '/'):
+                marcar_si_descarte(event, data, room)
+                return original(event, data, namespace, room=room, **kwargs)
+            return replay.entregar(
+                event, data, rooms_de(room),
+                lambda meta: original(event, con_meta(data, meta), namespace, room=room, **kwargs))
+
+        manager.emit = emit
@@ -10,13 +10,30 @@ from datetime import datetime
 from flask import Flask, request, jsonify, url_for, Blueprint
 from flask_cors import CORS
 from flask_socketio import emit, join_room, leave_room
+from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 
-from api.models import db, User, Cliente, Analista, Supervisor, Comentarios, Asignacion, Administrador, Ticket, Gestion
-from api.utils import generate_sitemap, APIException
+from api.models import (
+    db, User, Cliente, Analista, Supervisor, Comentarios, Asignacion, Administrador, Ticket, Gestion,
+    MensajeChat, ContadorVersion, TicketEliminado, Identidad, TicketWatcher, ROLES_IDENTIDAD,
+    CANAL_SUPERVISOR_ANALISTA, CANAL_ANALISTA_CLIENTE
+)
+from api.utils import (
+    generate_sitemap, APIException, leer_parametros_paginacion, paginar_keyset,
+    leer_modo_streaming, responder_streaming, etag_condicional, ESTADISTICAS_ETAG
+)
+from api.cache import cache_respuesta, estadisticas_cache
+from api.eventos import publicar, estadisticas_eventos
+from api.replay import replay
+from api.sesiones import registro_sesiones
+from api.presencia import presencia, PRESENCIA_INACTIVO_SEGUNDOS
+from api.watchers import cache_watchers
+from api.passwords import verificar_en_pool, hashear_en_pool, necesita_rehash, HashingSaturado
 from api.jwt_utils import (
     generate_token, verify_token, 
-    require_auth, require_role, refresh_token, get_user_from_token
+    require_auth, require_role, refresh_token, get_user_from_token,
+    get_token_from_request, revoke_token, revoke_user_tokens, revocation_list
 )
 
 api = Blueprint('api', __name__)
@@ -40,117 +57,16 @@ elif cloudinary_cloud_name and cloudinary_api_key and cloudinary_api_secret:
         api_secret=cloudinary_api_secret
     )
 
-# Función para obtener la instancia de socketio
-
-
-def get_socketio():
-    try:
-        from app import get_socketio as get_socketio_from_app
-        socketio_instance = get_socketio_from_app()
-        return socketio_instance
-    except ImportError:
-        return None
-    except Exception as e:
-        # Log del error pero no interrumpir la funcionalidad
-        return None
-
-# Función helper mejorada para emitir eventos WebSocket de manera segura
-def emit_websocket_event(event_name, data, room=None, include_self=False, callback=None):
-    """
-    Emite eventos WebSocket de manera robusta con manejo de errores
-    
-    Args:
-        event_name (str): Nombre del evento
-        data (dict): Datos a enviar
-        room (str, optional): Room específica. Si es None, envía a todos
-        include_self (bool): Si incluir al emisor en el broadcast
-        callback (callable, optional): Callback para manejar confirmación
-    """
-    try:
-        socketio = get_socketio()
-        if socketio:
-            # Agregar timestamp si no existe
-            if 'timestamp' not in data:
-                data['timestamp'] = datetime.now().isoformat()
-            
-            if room:
-                socketio.emit(event_name, data, room=room, include_self=include_self, callback=callback)
-                print(f"📤 Evento '{event_name}' enviado a room '{room}'")
-            else:
-                socketio.emit(event_name, data, callback=callback)
-                print(f"📤 Evento '{event_name}' enviado globalmente")
-                
-            return True
-    except Exception as e:
-        print(f"❌ Error enviando WebSocket '{event_name}': {e}")
-        # En caso de error, podrías implementar un sistema de cola aquí
-        return False
-    
-    return False
-
-def emit_websocket_to_role(event_name, data, role, include_self=False):
-    """Emite evento a todos los usuarios de un rol específico"""
-    role_room = f'role_{role}'
-    return emit_websocket_event(event_name, data, room=role_room, include_self=include_self)
-
-def emit_websocket_to_user(event_name, data, user_id):
-    """Emite evento a un usuario específico"""
-    user_room = f'user_{user_id}'
-    return emit_websocket_event(event_name, data, room=user_room)
-
-def emit_websocket_to_ticket(event_name, data, ticket_id, include_self=False):
-    """Emite evento a todos los usuarios conectados a un ticket"""
-    ticket_room = f'room_ticket_{ticket_id}'
-    return emit_websocket_event(event_name, data, room=ticket_room, include_self=include_self)
-
-def tiene_solicitud_reapertura_pendiente(ticket_id):
-    """Verifica si un ticket tiene una solicitud de reapertura pendiente"""
-    try:
-        # Buscar comentarios de solicitud de reapertura del cliente
-        solicitud_reapertura = Comentarios.query.filter_by(
-            id_ticket=ticket_id,
-            texto="Cliente solicitó reapertura del ticket - Pendiente de decisión del supervisor"
-        ).first()
-        
-        if solicitud_reapertura:
-            # Verificar si ya hay una decisión del supervisor después de la solicitud
-            decision_supervisor = Comentarios.query.filter(
-                Comentarios.id_ticket == ticket_id,
-                Comentarios.fecha_comentario > solicitud_reapertura.fecha_comentario,
-                Comentarios.id_supervisor.isnot(None),
-                Comentarios.texto.like("%Supervisor aprobó solicitud de reapertura%")
-            ).first()
-            
-            # Si no hay decisión del supervisor, la solicitud está pendiente
-            return decision_supervisor is None
-        
-        return False
-    except Exception as e:
-        print(f"Error verificando solicitud de reapertura: {e}")
-        return False
-
 def emit_critical_ticket_action(ticket_id, action, user_data):
-    """Emite evento crítico de ticket a todos los roles críticos"""
-    critical_roles = ['cliente', 'analista', 'supervisor']
-    
-    # Emitir a roles críticos
-    for role in critical_roles:
-        emit_websocket_to_role('critical_ticket_update', {
-            'ticket_id': ticket_id,
-            'action': action,
-            'user_id': user_data['id'],
-            'role': user_data['role'],
-            'priority': 'critical'
-        }, role, include_self=False)
-    
-    # Emitir al room del ticket
-    emit_websocket_to_ticket('critical_ticket_update', {
+    """Emite evento crítico de ticket a todos los roles críticos y al room del ticket"""
+    publicar('accion_critica', {
         'ticket_id': ticket_id,
         'action': action,
         'user_id': user_data['id'],
         'role': user_data['role'],
-        'priority': 'critical'
-    }, ticket_id, include_self=False)
+        'priority': 'critical',
+        'timestamp': datetime.now().isoformat()
+    }, ticket_id=ticket_id)
     
     print(f'🚨 Evento crítico emitido: {action} en ticket {ticket_id} por {user_data["role"]} (ID: {user_data["id"]})')
     return True
@@ -168,6 +84,72 @@ def handle_general_error(e, operation="operación"):
     """Maneja errores generales de manera consistente"""
     return jsonify({"message": f"Error en {operation}: {str(e)}"}), 500
 
+def responder_coleccion(query, columnas, serializar, descendente=False):
+    """
+    Responde una colección completa o, si la petición trae ?limit= o ?cursor=, una página keyset.
+    Con ?stream=1 o ?stream=ndjson la colección completa se escribe por lotes.
+    
+    Args:
+        query: Consulta base (filtros y opciones de carga, sin order_by)
+        columnas (list): Columnas del keyset, p.ej. [Ticket.fecha_creacion, Ticket.id]
+        serializar (callable): Recibe la lista de filas y devuelve la lista serializada
+        descendente (bool): Recorrer de más reciente a más antiguo
+    """
+    paginar, cursor, limit = leer_parametros_paginacion()
+    if not paginar:
+        modo_streaming = leer_modo_streaming()
+        if modo_streaming:
+            orden = [c.desc() if descendente else c.asc() for c in columnas]
+            return responder_streaming(query.order_by(*orden), serializar, modo_streaming)
+        return jsonify(serializar(query.all())), 200
+
+    filas, next_cursor = paginar_keyset(query, columnas, cursor, limit, descendente)
+    return jsonify({
+        "items": serializar(filas),
+        "next_cursor": next_cursor,
+        "limit": limit
+    }), 200
+
+def etag_tickets(*filtros, alcance):
+    """ETag de una lista de tickets: versión máxima y número de tickets del alcance"""
+    maximo, total = db.session.query(func.max(Ticket.version), func.count(Ticket.id)).filter(*filtros).one()
+    return f"{alcance}-{maximo or 0}-{total}"
+
+def etag_tickets_cliente():
+    user = request.current_user
+    return etag_tickets(Ticket.id_cliente == user['id'], Ticket.estado != 'cerrado',
+                        alcance=f"tickets-cliente-{user['id']}")
+
+def etag_tickets_analista():
+    user = request.current_user
+    asignados = db.session.query(Asignacion.id_ticket).filter(Asignacion.id_analista == user['id'])
+    return etag_tickets(Ticket.id.in_(asignados), Ticket.estado != 'cerrado',
+                        alcance=f"tickets-analista-{user['id']}")
+
+def etag_tickets_supervisor():
+    return etag_tickets(Ticket.estado != 'cerrado', alcance="tickets-supervisor")
+
+def etag_comentarios_ticket(id):
+    """Los comentarios suben la versión de su ticket; None si no existe o no hay permisos"""
+    user = request.current_user
+    consulta = db.session.query(Ticket.version).filter(Ticket.id == id)
+    if user['role'] == 'cliente':
+        consulta = consulta.filter(Ticket.id_cliente == user['id'])
+    elif user['role'] == 'analista':
+        consulta = consulta.filter(Ticket.asignaciones.any(Asignacion.id_analista == user['id']))
+    version = consulta.scalar()
+    return None if version is None else f"comentarios-{id}-{version}"
+
+
+def con_contraseña_hasheada(datos):
+    """
+    Copia de `datos` con la contraseña en texto plano de 'contraseña_hash' ya hasheada
+    en el pool (fuera del hub de eventlet); lanza HashingSaturado si no hay cupo
+    """
+    if not datos.get('contraseña_hash'):
+        return datos
+    return dict(datos, contraseña_hash=hashear_en_pool(datos['contraseña_hash']))
+
 
 @api.route('/hello', methods=['POST', 'GET'])
 def handle_hello():
@@ -178,6 +160,58 @@ def handle_hello():
 
     return jsonify(response_body), 200
 
+
+@api.route('/metricas', methods=['GET'])
+@require_role(['administrador'])
+def obtener_metricas():
+    """Contadores internos del servidor (GET condicionales, caché de respuestas, revocaciones, eventos, replay, sesiones, watchers)"""
+    return jsonify({
+        "etag": dict(ESTADISTICAS_ETAG),
+        "cache": estadisticas_cache(),
+        "tokens_revocados": revocation_list.stats(),
+        "eventos": estadisticas_eventos(),
+        "replay": replay.estadisticas(),
+        "sesiones": registro_sesiones.estadisticas(),
+        "watchers": cache_watchers.estadisticas()
+    }), 200
+
+
+@api.route('/presence', methods=['GET'])
+@require_role(['supervisor', 'administrador'])
+def obtener_presencia():
+    """Usuarios en línea por rol y disponibilidad de los analistas conectados (para asignar)"""
+    try:
+        en_linea = {user_id: (sockets, inactivo, desde) for user_id, sockets, inactivo, desde in presencia.usuarios('analista')}
+        analistas = []
+        if en_linea:
+            activos = dict(
+                db.session.query(Asignacion.id_analista, func.count(Ticket.id))
+                .join(Ticket, Ticket.id_asignacion_actual == Asignacion.id)
+                .filter(Asignacion.id_analista.in_(en_linea), Ticket.estado.in_(['en espera', 'en proceso']))
+                .group_by(Asignacion.id_analista)
+            )
+            for analista in Analista.query.filter(Analista.id.in_(en_linea)):
+                sockets, inactivo, desde = en_linea[analista.id]
+                analistas.append({
+                    "id": analista.id,
+                    "nombre": analista.nombre,
+                    "apellido": analista.apellido,
+                    "especialidad": analista.especialidad,
+                    "sockets": sockets,
+                    "en_linea_desde": datetime.fromtimestamp(desde).isoformat(),
+                    "inactivo_segundos": round(inactivo),
+                    "disponible": inactivo < PRESENCIA_INACTIVO_SEGUNDOS,
+                    "tickets_activos": activos.get(analista.id, 0)
+                })
+            analistas.sort(key=lambda a: (not a["disponible"], a["tickets_activos"], a["id"]))
+        return jsonify({
+            "roles": presencia.conteos(),
+            "analistas": analistas,
+            "timestamp": datetime.now().isoformat()
+        }), 200
+    except Exception as e:
+        return jsonify({"message": f"Error al obtener la presencia: {str(e)}"}), 500
+
 # Manejar solicitudes OPTIONS para CORS
 @api.route('/<path:path>', methods=['OPTIONS'])
 def handle_options(path):
@@ -209,8 +243,8 @@ def cloudinary_status():
 @api.route('/clientes', methods=['GET'])
 @require_role(['administrador', 'cliente'])
 def listar_clientes():
-    clientes = Cliente.query.all()
-    return jsonify([c.serialize() for c in clientes]), 200
+    return responder_coleccion(
+        Cliente.query, [Cliente.id], lambda clientes: [c.serialize() for c in clientes])
 
 
 @api.route('/clientes', methods=['POST'])
@@ -232,10 +266,12 @@ def create_cliente():
         if 'url_imagen' in body:
             cliente_data['url_imagen'] = body['url_imagen']
             
-        cliente = Cliente(**cliente_data)
+        cliente = Cliente(**con_contraseña_hasheada(cliente_data))
         db.session.add(cliente)
         db.session.commit()
         return jsonify(cliente.serialize()), 201
+    except HashingSaturado:
+        return jsonify({"message": "Servidor ocupado, intenta de nuevo en unos segundos"}), 503, {"Retry-After": "2"}
     except IntegrityError:
         db.session.rollback()
         return jsonify({"message": "Email ya existe"}), 400
@@ -261,11 +297,14 @@ def update_cliente(id):
     if not cliente:
         return jsonify({"message": "Cliente no encontrado"}), 404
     try:
+        body = con_contraseña_hasheada(body)
         for field in ["direccion", "telefono", "nombre", "apellido", "email", "contraseña_hash", "latitude", "longitude", "url_imagen"]:
             if field in body:
                 setattr(cliente, field, body[field])
         db.session.commit()
         return jsonify(cliente.serialize()), 200
+    except HashingSaturado:
+        return jsonify({"message": "Servidor ocupado, intenta de nuevo en unos segundos"}), 503, {"Retry-After": "2"}
     except IntegrityError:
         db.session.rollback()
         return jsonify({"message": "Email duplicado"}), 400
@@ -295,8 +334,10 @@ def delete_cliente(id):
 @require_role(['administrador', 'analista', 'supervisor'])
 def listar_analistas():
     try:
-        analistas = Analista.query.all()
-        return jsonify([a.serialize() for a in analistas]), 200
+        return responder_coleccion(
+            Analista.query, [Analista.id], lambda analistas: [a.serialize() for a in analistas])
+    except APIException:
+        raise
     except Exception as e:
         return handle_general_error(e, "listar analistas")
 
@@ -311,31 +352,20 @@ def create_analista():
     if missing:
         return jsonify({"message": f"Faltan campos: {', '.join(missing)}"}), 400
     try:
-        analista = Analista(**{k: body[k] for k in required})
+        analista = Analista(**con_contraseña_hasheada({k: body[k] for k in required}))
         db.session.add(analista)
         db.session.commit()
 
-        # Emitir evento WebSocket para notificar creación de analista
-        socketio = get_socketio()
-        if socketio:
-            try:
-                # Enviar a supervisores y administradores (rooms generales solo para gestión de usuarios)
-                socketio.emit('analista_creado', {
-                    'analista': analista.serialize(),
-                    'tipo': 'analista_creado',
-                    'timestamp': datetime.now().isoformat()
-                }, room='supervisores')
-
-                socketio.emit('analista_creado', {
-                    'analista': analista.serialize(),
-                    'tipo': 'analista_creado',
-                    'timestamp': datetime.now().isoformat()
-                }, room='administradores')
-                
-            except Exception as e:
-                print(f"Error enviando WebSocket: {e}")
+        # Notificar a supervisores y administradores (rooms generales solo para gestión de usuarios)
+        publicar('analista_creado', {
+            'analista': analista.serialize(),
+            'tipo': 'analista_creado',
+            'timestamp': datetime.now().isoformat()
+        })
 
         return jsonify(analista.serialize()), 201
+    except HashingSaturado:
+        return jsonify({"message": "Servidor ocupado, intenta de nuevo en unos segundos"}), 503, {"Retry-After": "2"}
     except IntegrityError:
         db.session.rollback()
         return jsonify({"message": "Email ya existe"}), 400
@@ -364,11 +394,14 @@ def update_analista(id):
     if not analista:
         return jsonify({"message": "Analista no encontrado"}), 404
     try:
+        body = con_contraseña_hasheada(body)
         for field in ["especialidad", "nombre", "apellido", "email", "contraseña_hash"]:
             if field in body:
                 setattr(analista, field, body[field])
         db.session.commit()
         return jsonify(analista.serialize()), 200
+    except HashingSaturado:
+        return jsonify({"message": "Servidor ocupado, intenta de nuevo en unos segundos"}), 503, {"Retry-After": "2"}
     except IntegrityError:
         db.session.rollback()
         return jsonify({"message": "Email duplicado"}), 400
@@ -396,28 +429,15 @@ def delete_analista(id):
         db.session.delete(analista)
         db.session.commit()
 
-        # Enviar notificación WebSocket
-        socketio = get_socketio()
-        if socketio:
-            try:
-                user = get_user_from_token()
-                eliminacion_data = {
-                    'analista_id': id,
-                    'analista_info': analista_info,
-                    'tipo': 'analista_eliminado',
-                    'usuario': user['role'],
-                    'timestamp': datetime.now().isoformat()
-                }
-
-                # Notificar a todos los roles sobre la eliminación del analista
-                socketio.emit('analista_eliminado', eliminacion_data, room='clientes')
-                socketio.emit('analista_eliminado', eliminacion_data, room='analistas')
-                socketio.emit('analista_eliminado', eliminacion_data, room='supervisores')
-                socketio.emit('analista_eliminado', eliminacion_data, room='administradores')
-                
-                    
-            except Exception as e:
-                print(f"Error enviando WebSocket: {e}")
+        # Notificar a todos los roles sobre la eliminación del analista
+        user = get_user_from_token()
+        publicar('analista_eliminado', {
+            'analista_id': id,
+            'analista_info': analista_info,
+            'tipo': 'analista_eliminado',
+            'usuario': user['role'],
+            'timestamp': datetime.now().isoformat()
+        })
 
         return jsonify({"message": "Analista eliminado"}), 200
     except Exception as e:
@@ -443,10 +463,12 @@ def create_supervisor():
     if missing:
         return jsonify({"message": f"Faltan campos: {', '.join(missing)}"}), 400
     try:
-        supervisor = Supervisor(**{k: body[k] for k in required})
+        supervisor = Supervisor(**con_contraseña_hasheada({k: body[k] for k in required}))
         db.session.add(supervisor)
         db.session.commit()
         return jsonify(supervisor.serialize()), 201
+    except HashingSaturado:
+        return jsonify({"message": "Servidor ocupado, intenta de nuevo en unos segundos"}), 503, {"Retry-After": "2"}
     except IntegrityError:
         db.session.rollback()
         return jsonify({"message": "Email ya existe"}), 400
@@ -472,11 +494,14 @@ def update_supervisor(id):
     if not supervisor:
         return jsonify({"message": "Supervisor no encontrado"}), 404
     try:
+        body = con_contraseña_hasheada(body)
         for field in ["area_responsable", "nombre", "apellido", "email", "contraseña_hash"]:
             if field in body:
                 setattr(supervisor, field, body[field])
         db.session.commit()
         return jsonify(supervisor.serialize()), 200
+    except HashingSaturado:
+        return jsonify({"message": "Servidor ocupado, intenta de nuevo en unos segundos"}), 503, {"Retry-After": "2"}
     except IntegrityError:
         db.session.rollback()
         return jsonify({"message": "Email duplicado"}), 400
@@ -505,12 +530,13 @@ def delete_supervisor(id):
 @api.route('/comentarios', methods=['GET'])
 @require_role(['analista', 'supervisor', 'administrador', 'cliente'])
 def listar_comentarios():
-    comentarios = Comentarios.query.all()
-    return jsonify([c.serialize() for c in comentarios]), 200
+    return responder_coleccion(
+        Comentarios.query, [Comentarios.id], lambda comentarios: [c.serialize() for c in comentarios])
 
 
 @api.route('/tickets/<int:id>/comentarios', methods=['GET'])
 @require_role(['cliente', 'analista', 'supervisor', 'administrador'])
+@etag_condicional(etag_comentarios_ticket)
 def get_ticket_comentarios(id):
     """Obtener comentarios de un ticket específico"""
     try:
@@ -572,33 +598,17 @@ def create_comentario():
         db.session.add(comentario)
         db.session.commit()
 
-        # Emitir evento WebSocket para notificar nuevo comentario al room del ticket
-        socketio = get_socketio()
-        if socketio:
-            try:
-                # Notificar a todos los usuarios conectados al room del ticket
-                ticket_room = f'room_ticket_{comentario.id_ticket}'
-                socketio.emit('nuevo_comentario', {
-                    'comentario': comentario.serialize(),
-                    'tipo': 'comentario_agregado',
-                    'timestamp': datetime.now().isoformat()
-                }, room=ticket_room)
-                
-                    
-            except Exception as e:
-                print(f"Error enviando WebSocket: {e}")
-
-        
-        # Emitir evento crítico para nuevo comentario
-        emit_critical_ticket_action(comentario.id_ticket, 'comentario_agregado', user)
-        
-        # También emitir evento normal para compatibilidad
-        emit_websocket_to_ticket('nuevo_comentario', {
+        # Notificar a todos los usuarios conectados al room del ticket
+        publicar('comentario_agregado', {
             'comentario': comentario.serialize(),
             'tipo': 'comentario_agregado',
             'usuario': user['role'],
-            'usuario_id': user['id']
-        }, comentario.id_ticket, include_self=False)
+            'usuario_id': user['id'],
+            'timestamp': datetime.now().isoformat()
+        }, ticket_id=comentario.id_ticket)
+
+        # Emitir evento crítico para nuevo comentario
+        emit_critical_ticket_action(comentario.id_ticket, 'comentario_agregado', user)
         
         return jsonify(comentario.serialize()), 201
     except IntegrityError:
@@ -662,8 +672,8 @@ def delete_comentario(id):
 @api.route('/asignaciones', methods=['GET'])
 @require_role(['supervisor', 'administrador', 'analista'])
 def listar_asignaciones():
-    asignaciones = Asignacion.query.all()
-    return jsonify([a.serialize() for a in asignaciones]), 200
+    return responder_coleccion(
+        Asignacion.query, [Asignacion.id], lambda asignaciones: [a.serialize() for a in asignaciones])
 
 
 @api.route('/asignaciones', methods=['POST'])
@@ -683,6 +693,10 @@ def create_asignacion():
             fecha_asignacion=datetime.fromisoformat(body["fecha_asignacion"])
         )
         db.session.add(asignacion)
+        db.session.flush()
+        ticket = db.session.get(Ticket, asignacion.id_ticket)
+        if ticket:
+            ticket.recalcular_asignacion_actual()
         db.session.commit()
         return jsonify(asignacion.serialize()), 201
     except IntegrityError:
@@ -710,12 +724,18 @@ def update_asignacion(id):
     if not asignacion:
         return jsonify({"message": "Asignación no encontrada"}), 404
     try:
+        id_ticket_anterior = asignacion.id_ticket
         for field in ["id_ticket", "id_supervisor", "id_analista", "fecha_asignacion"]:
             if field in body:
                 value = body[field]
                 if field == "fecha_asignacion" and value:
                     value = datetime.fromisoformat(value)
                 setattr(asignacion, field, value)
+        db.session.flush()
+        for ticket_id in {id_ticket_anterior, asignacion.id_ticket}:
+            ticket = db.session.get(Ticket, ticket_id)
+            if ticket:
+                ticket.recalcular_asignacion_actual()
         db.session.commit()
         return jsonify(asignacion.serialize()), 200
     except IntegrityError:
@@ -733,7 +753,13 @@ def delete_asignacion(id):
     if not asignacion:
         return jsonify({"message": "Asignación no encontrada"}), 404
     try:
+        ticket = db.session.get(Ticket, asignacion.id_ticket)
+        if ticket and ticket.id_asignacion_actual == asignacion.id:
+            ticket.asignacion_actual = None
+            db.session.flush()
         db.session.delete(asignacion)
+        if ticket:
+            ticket.recalcular_asignacion_actual()
         db.session.commit()
         return jsonify({"message": "Asignación eliminada"}), 200
     except Exception as e:
@@ -759,10 +785,12 @@ def create_administrador():
     if missing:
         return jsonify({"message": f"Faltan campos: {', '.join(missing)}"}), 400
     try:
-        administrador = Administrador(**{k: body[k] for k in required})
+        administrador = Administrador(**con_contraseña_hasheada({k: body[k] for k in required}))
         db.session.add(administrador)
         db.session.commit()
         return jsonify(administrador.serialize()), 201
+    except HashingSaturado:
+        return jsonify({"message": "Servidor ocupado, intenta de nuevo en unos segundos"}), 503, {"Retry-After": "2"}
     except IntegrityError:
         db.session.rollback()
         return jsonify({"message": "Email ya existe"}), 400
@@ -788,11 +816,14 @@ def update_administrador(id):
     if not administrador:
         return jsonify({"message": "Administrador no encontrado"}), 404
     try:
+        body = con_contraseña_hasheada(body)
         for field in ["permisos_especiales", "email", "contraseña_hash"]:
             if field in body:
                 setattr(administrador, field, body[field])
         db.session.commit()
         return jsonify(administrador.serialize()), 200
+    except HashingSaturado:
+        return jsonify({"message": "Servidor ocupado, intenta de nuevo en unos segundos"}), 503, {"Retry-After": "2"}
     except IntegrityError:
         db.session.rollback()
         return jsonify({"message": "Email duplicado"}), 400
@@ -820,40 +851,51 @@ def delete_administrador(id):
 
 @api.route('/tickets', methods=['GET'])
 @require_role(['administrador', 'supervisor', 'analista'])
+@cache_respuesta('global')
 def listar_tickets():
     try:
         print("Iniciando consulta de tickets...")
-        tickets = Ticket.query.all()
-        print(f"Tickets encontrados: {len(tickets)}")
-        
-        # Serializar tickets uno por uno para identificar problemas
-        serialized_tickets = []
-        for i, ticket in enumerate(tickets):
-            try:
-                serialized_ticket = ticket.serialize()
-                serialized_tickets.append(serialized_ticket)
-            except Exception as serialize_error:
-                print(f"Error serializando ticket {ticket.id}: {str(serialize_error)}")
-                # Agregar ticket básico sin relaciones problemáticas
-                serialized_tickets.append({
-                    "id": ticket.id,
-                    "id_cliente": ticket.id_cliente,
-                    "estado": ticket.estado,
-                    "titulo": ticket.titulo,
-                    "descripcion": ticket.descripcion,
-                    "fecha_creacion": ticket.fecha_creacion.isoformat() if ticket.fecha_creacion else None,
-                    "fecha_cierre": ticket.fecha_cierre.isoformat() if ticket.fecha_cierre else None,
-                    "prioridad": ticket.prioridad,
-                    "calificacion": ticket.calificacion,
-                    "comentario": ticket.comentario,
-                    "fecha_evaluacion": ticket.fecha_evaluacion.isoformat() if ticket.fecha_evaluacion else None,
-                    "url_imagen": ticket.url_imagen,
-                    "cliente": None,
-                    "asignacion_actual": None
-                })
-        
-        print(f"Tickets serializados exitosamente: {len(serialized_tickets)}")
-        return jsonify(serialized_tickets), 200
+
+        def serializar_tickets(tickets):
+            print(f"Tickets encontrados: {len(tickets)}")
+
+            # Serializar tickets uno por uno para identificar problemas
+            serialized_tickets = []
+            for i, ticket in enumerate(tickets):
+                try:
+                    serialized_ticket = ticket.serialize()
+                    serialized_tickets.append(serialized_ticket)
+                except Exception as serialize_error:
+                    print(f"Error serializando ticket {ticket.id}: {str(serialize_error)}")
+                    # Agregar ticket básico sin relaciones problemáticas
+                    serialized_tickets.append({
+                        "id": ticket.id,
+                        "id_cliente": ticket.id_cliente,
+                        "estado": ticket.estado,
+                        "titulo": ticket.titulo,
+                        "descripcion": ticket.descripcion,
+                        "fecha_creacion": ticket.fecha_creacion.isoformat() if ticket.fecha_creacion else None,
+                        "fecha_cierre": ticket.fecha_cierre.isoformat() if ticket.fecha_cierre else None,
+                        "prioridad": ticket.prioridad,
+                        "calificacion": ticket.calificacion,
+                        "comentario": ticket.comentario,
+                        "fecha_evaluacion": ticket.fecha_evaluacion.isoformat() if ticket.fecha_evaluacion else None,
+                        "url_imagen": ticket.url_imagen,
+                        "cliente": None,
+                        "asignacion_actual": None
+                    })
+
+            print(f"Tickets serializados exitosamente: {len(serialized_tickets)}")
+            return serialized_tickets
+
+        return responder_coleccion(
+            Ticket.query.options(*Ticket.opciones_serializacion()),
+            [Ticket.fecha_creacion, Ticket.id],
+            serializar_tickets,
+            descendente=True
+        )
+    except APIException:
+        raise
     except Exception as e:
         print(f"Error en listar_tickets: {str(e)}")
         return handle_general_error(e, "listar tickets")
@@ -896,61 +938,21 @@ def create_ticket():
         db.session.add(ticket)
         db.session.commit()
 
-        # Emitir evento WebSocket para notificar nuevo ticket
-        socketio = get_socketio()
-        if socketio:
-            try:
-                # Datos del ticket
-                ticket_data = {
-                    'ticket_id': ticket.id,
-                    'ticket_estado': ticket.estado,
-                    'ticket_titulo': ticket.titulo,
-                    'ticket_prioridad': ticket.prioridad,
-                    'cliente_id': ticket.id_cliente,
-                    'tipo': 'creado',
-                    'timestamp': datetime.now().isoformat()
-                }
-
-                # Notificar al room del ticket (todos los involucrados se unirán automáticamente)
-                ticket_room = f'room_ticket_{ticket.id}'
-                socketio.emit('nuevo_ticket', ticket_data, room=ticket_room)
-
-                # Notificar a supervisores y administradores para asignación
-                socketio.emit('nuevo_ticket_disponible',
-                              ticket_data, room='supervisores')
-                socketio.emit('nuevo_ticket_disponible',
-                              ticket_data, room='administradores')
-
-                # Notificar a administradores para actualizar CRUD de tickets
-                socketio.emit('nuevo_ticket', ticket_data, room='administradores')
-                
-            except Exception as e:
-                print(f"Error enviando WebSocket de nuevo ticket: {e}")
-
-        # Datos del ticket para notificaciones
-        ticket_data = {
+        # Notificar al room del ticket, a supervisores (asignación) y a administradores (CRUD)
+        publicar('ticket_creado', {
             'ticket_id': ticket.id,
             'ticket_estado': ticket.estado,
             'ticket_titulo': ticket.titulo,
             'ticket_prioridad': ticket.prioridad,
             'cliente_id': ticket.id_cliente,
-            'tipo': 'creado'
-        }
-        
+            'tipo': 'creado',
+            'timestamp': datetime.now().isoformat()
+        }, ticket_id=ticket.id)
+
         # Emitir evento crítico para nuevo ticket
         user_data = get_user_from_token()
         emit_critical_ticket_action(ticket.id, 'ticket_creado', user_data)
         
-        # Notificar al room del ticket
-        emit_websocket_to_ticket('nuevo_ticket', ticket_data, ticket.id, include_self=False)
-        
-        # Notificar a supervisores y administradores para asignación
-        emit_websocket_to_role('nuevo_ticket_disponible', ticket_data, 'supervisor', include_self=False)
-        emit_websocket_to_role('nuevo_ticket_disponible', ticket_data, 'administrador', include_self=False)
-        
-        # Notificar a administradores para actualizar CRUD de tickets
-        emit_websocket_to_role('nuevo_ticket', ticket_data, 'administrador', include_self=False)
-        
         return jsonify(ticket.serialize()), 201
 
     required = ["id_cliente", "estado", "titulo",
@@ -1084,35 +1086,18 @@ def update_ticket(id):
                 setattr(ticket, field, value)
         db.session.commit()
 
-        # Emitir evento WebSocket para notificar actualización al room del ticket
-        socketio = get_socketio()
-        if socketio:
-            try:
-                # Notificar a todos los usuarios conectados al room del ticket
-                ticket_room = f'room_ticket_{ticket.id}'
-                socketio.emit('ticket_actualizado', {
-                    'ticket': ticket.serialize(),
-                    'tipo': 'actualizado',
-                    'usuario': get_user_from_token()['role'],
-                    'timestamp': datetime.now().isoformat()
-                }, room=ticket_room)
-                
-                    
-            except Exception as e:
-                print(f"Error enviando WebSocket: {e}")
-
-        
-        # Emitir evento crítico para actualización de ticket
+        # Notificar a todos los usuarios conectados al room del ticket
         user = get_user_from_token()
-        emit_critical_ticket_action(ticket.id, 'ticket_actualizado', user)
-        
-        # También emitir evento normal para compatibilidad
-        emit_websocket_to_ticket('ticket_actualizado', {
+        publicar('ticket_actualizado', {
             'ticket': ticket.serialize(),
             'tipo': 'actualizado',
             'usuario': user['role'],
-            'usuario_id': user['id']
-        }, ticket.id, include_self=False)
+            'usuario_id': user['id'],
+            'timestamp': datetime.now().isoformat()
+        }, ticket_id=ticket.id)
+
+        # Emitir evento crítico para actualización de ticket
+        emit_critical_ticket_action(ticket.id, 'ticket_actualizado', user)
         
         return jsonify(ticket.serialize()), 200
     except IntegrityError:
@@ -1141,14 +1126,16 @@ def delete_ticket(id):
         # Obtener información del analista asignado antes de eliminar las asignaciones
         analista_asignado_id = None
         try:
-            if hasattr(ticket, 'asignaciones') and ticket.asignaciones:
-                asignacion_mas_reciente = max(
-                    ticket.asignaciones, key=lambda x: x.fecha_asignacion)
-                analista_asignado_id = asignacion_mas_reciente.id_analista
+            if ticket.asignacion_actual:
+                analista_asignado_id = ticket.asignacion_actual.id_analista
         except Exception as e:
             print(f"Error obteniendo asignación del ticket: {e}")
             # Continuar sin la información del analista
 
+        # Soltar el puntero a la asignación actual antes de borrar las asignaciones
+        ticket.asignacion_actual = None
+        db.session.flush()
+
         # Eliminar asignaciones relacionadas primero
         asignaciones = Asignacion.query.filter_by(id_ticket=id).all()
         for asignacion in asignaciones:
@@ -1168,41 +1155,15 @@ def delete_ticket(id):
         db.session.delete(ticket)
         db.session.commit()
 
-        # Emitir evento WebSocket para notificar eliminación a todos los roles
-        socketio = get_socketio()
-        if socketio:
-            try:
-                user = get_user_from_token()
-                eliminacion_data = {
-                    'ticket_id': id,
-                    'ticket_info': ticket_info,
-                    'tipo': 'eliminado',
-                    'usuario': user['role'],
-                    'timestamp': datetime.now().isoformat()
-                }
-
-                # Notificar a todos los roles sobre la eliminación
-                socketio.emit('ticket_eliminado',
-                              eliminacion_data, room='clientes')
-                socketio.emit('ticket_eliminado',
-                              eliminacion_data, room='analistas')
-                socketio.emit('ticket_eliminado',
-                              eliminacion_data, room='supervisores')
-                socketio.emit('ticket_eliminado',
-                              eliminacion_data, room='administradores')
-
-                # Notificar específicamente al analista asignado si existe
-                if analista_asignado_id:
-                    socketio.emit('ticket_eliminado', eliminacion_data,
-                                  room=f'analista_{analista_asignado_id}')
-
-                # Notificar al room del ticket (si hay usuarios conectados)
-                ticket_room = f'room_ticket_{id}'
-                socketio.emit('ticket_eliminado', eliminacion_data, room=ticket_room)
-                
-                    
-            except Exception as e:
-                print(f"Error enviando WebSocket: {e}")
+        # Notificar a todos los roles, al analista asignado (si existe) y al room del ticket
+        user = get_user_from_token()
+        publicar('ticket_eliminado', {
+            'ticket_id': id,
+            'ticket_info': ticket_info,
+            'tipo': 'eliminado',
+            'usuario': user['role'],
+            'timestamp': datetime.now().isoformat()
+        }, ticket_id=id, analista_id=analista_asignado_id)
 
         return jsonify({"message": "Ticket eliminado"}), 200
     except Exception as e:
@@ -1215,8 +1176,8 @@ def delete_ticket(id):
 @api.route('/gestiones', methods=['GET'])
 @require_role(['analista', 'supervisor', 'administrador', 'cliente'])
 def obtener_gestiones():
-    gestiones = Gestion.query.all()
-    return jsonify([t.serialize() for t in gestiones]), 200
+    return responder_coleccion(
+        Gestion.query, [Gestion.id], lambda gestiones: [t.serialize() for t in gestiones])
 
 
 @api.route('/gestiones', methods=['POST'])
@@ -1321,7 +1282,7 @@ def register():
                 'telefono': '0000000000'
             }
 
-            cliente = Cliente(**cliente_data)
+            cliente = Cliente(**con_contraseña_hasheada(cliente_data))
             db.session.add(cliente)
             db.session.commit()
             
@@ -1354,7 +1315,7 @@ def register():
             if 'longitude' in body:
                 cliente_data['longitude'] = body['longitude']
 
-            cliente = Cliente(**cliente_data)
+            cliente = Cliente(**con_contraseña_hasheada(cliente_data))
             db.session.add(cliente)
             db.session.commit()
 
@@ -1363,6 +1324,8 @@ def register():
                 "success": True
             }), 201
 
+    except HashingSaturado:
+        return jsonify({"message": "Servidor ocupado, intenta de nuevo en unos segundos"}), 503, {"Retry-After": "2"}
     except Exception as e:
         db.session.rollback()
         return jsonify({"message": f"Error al registrar: {str(e)}"}), 500
@@ -1399,7 +1362,7 @@ def complete_client_info():
 
         # Actualizar contraseña si se proporciona
         if 'password' in body and body['password']:
-            cliente.contraseña_hash = body['password']
+            cliente.contraseña_hash = hashear_en_pool(body['password'])
 
         db.session.commit()
 
@@ -1408,6 +1371,8 @@ def complete_client_info():
             "cliente": cliente.serialize()
         }), 200
 
+    except HashingSaturado:
+        return jsonify({"message": "Servidor ocupado, intenta de nuevo en unos segundos"}), 503, {"Retry-After": "2"}
     except Exception as e:
         db.session.rollback()
         return jsonify({"message": f"Error al completar información: {str(e)}"}), 500
@@ -1419,40 +1384,104 @@ def login():
     body = request.get_json(silent=True) or {}
     email = body.get('email')
     password = body.get('password')
-    role = body.get('role', 'cliente')
+    role = body.get('role')
 
     if not email or not password:
         return jsonify({"message": "Email y contraseña requeridos"}), 400
+    if role is not None and role not in ROLES_IDENTIDAD.values():
+        return jsonify({"message": "Rol inválido"}), 400
 
     try:
-        user = None
-        if role == 'cliente':
-            user = Cliente.query.filter_by(email=email).first()
-        elif role == 'analista':
-            user = Analista.query.filter_by(email=email).first()
-        elif role == 'supervisor':
-            user = Supervisor.query.filter_by(email=email).first()
-        elif role == 'administrador':
-            user = Administrador.query.filter_by(email=email).first()
-        else:
-            return jsonify({"message": "Rol inválido"}), 400
+        # Una sola consulta por email; el rol se resuelve en el servidor. Si el email existe
+        # en varios roles, se prueba primero el rol enviado por el cliente
+        identidades = sorted(Identidad.buscar_credenciales(email), key=lambda i: i.rol != role)
+        identidad = next((i for i in identidades if verificar_en_pool(i.contraseña_hash, password)), None)
 
-        if not user or user.contraseña_hash != password:
+        if not identidad:
             return jsonify({"message": "Credenciales inválidas"}), 401
 
-        token = generate_token(user.id, user.email, role)
+        # Hash en texto plano o con un costo anterior: se regenera con el actual
+        if necesita_rehash(identidad.contraseña_hash):
+            try:
+                nuevo_hash = hashear_en_pool(password)
+                modelo = next(m for m, r in ROLES_IDENTIDAD.items() if r == identidad.rol)
+                db.session.get(modelo, identidad.id_usuario).contraseña_hash = nuevo_hash
+                db.session.commit()
+            except HashingSaturado:
+                # Las credenciales ya son válidas; se regenerará en el próximo login
+                pass
+
+        token = generate_token(identidad.id_usuario, identidad.email, identidad.rol)
 
         return jsonify({
             "message": "Login exitoso",
-            "token": token
+            "token": token,
             # "user": user.serialize(),
-            # "role": role
+            "role": identidad.rol
         }), 200
 
+    except HashingSaturado:
+        return jsonify({"message": "Servidor ocupado, intenta de nuevo en unos segundos"}), 503, {"Retry-After": "2"}
     except Exception as e:
         return jsonify({"message": f"Error en login: {str(e)}"}), 500
 
 
+@api.route('/logout', methods=['POST'])
+@require_auth
+def logout():
+    """Revocar el token con el que se hace la petición"""
+    try:
+        payload = verify_token(get_token_from_request())
+        if not revoke_token(payload):
+            # Tokens emitidos antes de incluir jti: se revocan todas las sesiones del usuario
+            revoke_user_tokens(payload['role'], payload['user_id'])
+        return jsonify({"message": "Sesión cerrada"}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": f"Error al cerrar sesión: {str(e)}"}), 500
+
+
+@api.route('/logout-all', methods=['POST'])
+@require_auth
+def logout_all():
+    """Revocar todos los tokens emitidos hasta ahora al usuario autenticado"""
+    try:
+        user = get_user_from_token()
+        revoke_user_tokens(user['role'], user['id'])
+        return jsonify({"message": "Todas las sesiones fueron cerradas"}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": f"Error al cerrar sesiones: {str(e)}"}), 500
+
+
+@api.route('/admin/revocar-sesiones', methods=['POST'])
+@require_role(['administrador'])
+def revocar_sesiones():
+    """
+    Kill switch de sesiones: {"rol": ..., "id_usuario": ...} para un usuario
+    o {"todos": true} para todos los tokens emitidos hasta ahora
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        if body.get('todos') is True:
+            revoke_user_tokens()
+            return jsonify({"message": "Todas las sesiones del sistema fueron revocadas"}), 200
+
+        rol = body.get('rol')
+        id_usuario = body.get('id_usuario')
+        if rol not in ROLES_IDENTIDAD.values() or not isinstance(id_usuario, int):
+            return jsonify({"message": "Se requiere rol válido e id_usuario, o todos: true"}), 400
+
+        revoke_user_tokens(rol, id_usuario)
+        return jsonify({"message": f"Sesiones revocadas para {rol} {id_usuario}"}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": f"Error al revocar sesiones: {str(e)}"}), 500
+
+
 @api.route('/refresh', methods=['POST'])
 def refresh_token_endpoint():
     """Refrescar token con JWT"""
@@ -1479,6 +1508,8 @@ def refresh_token_endpoint():
 
 @api.route('/tickets/cliente', methods=['GET'])
 @require_role(['cliente'])
+@etag_condicional(etag_tickets_cliente)
+@cache_respuesta('cliente')
 def get_cliente_tickets():
     """Obtener tickets del cliente autenticado con JWT"""
     try:
@@ -1488,12 +1519,12 @@ def get_cliente_tickets():
             return jsonify({"message": "Acceso denegado"}), 403
 
         # Obtener tickets del cliente, excluyendo los cerrados por supervisor y cerrados por cliente
-        tickets = Ticket.query.filter(
+        tickets = Ticket.query.options(*Ticket.opciones_serializacion()).filter(
             Ticket.id_cliente == user['id'],
             Ticket.estado != 'cerrado'
         ).all()
 
-        return jsonify([t.serialize() for t in tickets]), 200
+        return jsonify(Ticket.serialize_many(tickets)), 200
 
     except Exception as e:
         return jsonify({"message": f"Error al obtener tickets: {str(e)}"}), 500
@@ -1501,6 +1532,7 @@ def get_cliente_tickets():
 
 @api.route('/tickets/analista/<int:id>', methods=['GET'])
 @require_role(['supervisor', 'administrador'])
+@cache_respuesta('global')
 def get_analista_tickets_by_id(id):
     """Obtener tickets de un analista específico por ID"""
     try:
@@ -1517,9 +1549,10 @@ def get_analista_tickets_by_id(id):
             return jsonify([]), 200
         
         # Obtener todos los tickets asignados al analista
-        tickets = Ticket.query.filter(Ticket.id.in_(ticket_ids)).all()
+        tickets = Ticket.query.options(*Ticket.opciones_serializacion()).filter(
+            Ticket.id.in_(ticket_ids)).all()
         
-        return jsonify([t.serialize() for t in tickets]), 200
+        return jsonify(Ticket.serialize_many(tickets)), 200
         
     except Exception as e:
         return handle_general_error(e, "obtener tickets del analista")
@@ -1527,6 +1560,8 @@ def get_analista_tickets_by_id(id):
 
 @api.route('/tickets/analista', methods=['GET'])
 @require_role(['analista', 'administrador'])
+@etag_condicional(etag_tickets_analista)
+@cache_respuesta('analista')
 def get_analista_tickets():
     """Obtener tickets asignados al analista autenticado (excluyendo tickets escalados)"""
     try:
@@ -1541,7 +1576,7 @@ def get_analista_tickets():
         ticket_ids = [a.id_ticket for a in asignaciones]
 
         # Obtener tickets asignados al analista, excluyendo los cerrados
-        tickets = Ticket.query.filter(
+        tickets = Ticket.query.options(*Ticket.opciones_serializacion()).filter(
             Ticket.id.in_(ticket_ids),
             Ticket.estado != 'cerrado'
         ).all()
@@ -1594,7 +1629,7 @@ def get_analista_tickets():
             # Incluir el ticket
             tickets_filtrados.append(ticket)
 
-        return jsonify([t.serialize() for t in tickets_filtrados]), 200
+        return jsonify(Ticket.serialize_many(tickets_filtrados)), 200
 
     except Exception as e:
         # Log del error para debugging
@@ -1603,14 +1638,16 @@ def get_analista_tickets():
 
 @api.route('/tickets/supervisor', methods=['GET'])
 @require_role(['supervisor', 'administrador'])
+@etag_condicional(etag_tickets_supervisor)
+@cache_respuesta('global')
 def get_supervisor_tickets():
     """Obtener todos los tickets activos para el supervisor"""
     try:
         # Obtener solo tickets activos (excluyendo cerrados)
-        tickets = Ticket.query.filter(
+        tickets = Ticket.query.options(*Ticket.opciones_serializacion()).filter(
             Ticket.estado != 'cerrado'
         ).all()
-        return jsonify([t.serialize() for t in tickets]), 200
+        return jsonify(Ticket.serialize_many(tickets)), 200
 
     except Exception as e:
         return jsonify({"message": f"Error al obtener tickets: {str(e)}"}), 500
@@ -1618,19 +1655,69 @@ def get_supervisor_tickets():
 
 @api.route('/tickets/supervisor/cerrados', methods=['GET'])
 @require_role(['supervisor', 'administrador'])
+@cache_respuesta('global')
 def get_supervisor_closed_tickets():
     """Obtener tickets cerrados para el supervisor"""
     try:
         # Obtener solo tickets cerrados
-        tickets = Ticket.query.filter(
+        tickets = Ticket.query.options(*Ticket.opciones_serializacion()).filter(
             Ticket.estado == 'cerrado'
-        ).all()
-        return jsonify([t.serialize() for t in tickets]), 200
+        )
+        return responder_coleccion(
+            tickets, [Ticket.fecha_creacion, Ticket.id], Ticket.serialize_many, descendente=True)
 
+    except APIException:
+        raise
     except Exception as e:
         return jsonify({"message": f"Error al obtener tickets cerrados: {str(e)}"}), 500
 
 
+@api.route('/tickets/changes', methods=['GET'])
+@require_role(['cliente', 'analista', 'supervisor', 'administrador'])
+def get_tickets_changes():
+    """Sincronización incremental: tickets con version > since y tickets borrados desde since"""
+    try:
+        user = get_user_from_token()
+        if not user:
+            return jsonify({"message": "Token inválido o expirado"}), 401
+
+        since = request.args.get('since', '0')
+        try:
+            since = int(since)
+        except (TypeError, ValueError):
+            raise APIException("El parámetro since debe ser un token de versión válido", 400)
+        if since < 0:
+            raise APIException("El parámetro since debe ser un token de versión válido", 400)
+
+        # Se lee antes de consultar: lo que se confirme después aparecerá en la siguiente llamada
+        version_actual = ContadorVersion.actual()
+
+        tickets = Ticket.query.options(*Ticket.opciones_serializacion()).filter(Ticket.version > since)
+        eliminados = TicketEliminado.query.filter(TicketEliminado.version > since)
+
+        if user['role'] == 'cliente':
+            tickets = tickets.filter(Ticket.id_cliente == user['id'])
+            eliminados = eliminados.filter(TicketEliminado.id_cliente == user['id'])
+        elif user['role'] == 'analista':
+            tickets = tickets.filter(Ticket.id.in_(
+                db.session.query(Asignacion.id_ticket).filter(Asignacion.id_analista == user['id'])
+            ))
+
+        tickets = tickets.order_by(Ticket.version, Ticket.id).all()
+
+        return jsonify({
+            "tickets": Ticket.serialize_many(tickets),
+            "deleted_ids": [e.id_ticket for e in eliminados.order_by(TicketEliminado.version).all()],
+            "since": since,
+            "next_since": version_actual
+        }), 200
+
+    except APIException:
+        raise
+    except Exception as e:
+        return jsonify({"message": f"Error al obtener cambios de tickets: {str(e)}"}), 500
+
+
 @api.route('/tickets/<int:id>/test-reapertura', methods=['POST'])
 @require_role(['cliente', 'analista', 'supervisor', 'administrador'])
 def test_reapertura(id):
@@ -1669,6 +1756,7 @@ def test_reapertura(id):
                     fecha_comentario=datetime.now()
                 )
                 db.session.add(comentario_solicitud)
+                ticket.reapertura_pendiente = True
                 db.session.commit()
                 
                 return jsonify({
@@ -1798,6 +1886,7 @@ def cambiar_estado_ticket(id):
             if nuevo_estado_lower == 'cerrado' and estado_actual == 'solucionado':
                 ticket.estado = 'cerrado'
                 ticket.fecha_cierre = datetime.now()
+                ticket.reapertura_pendiente = False
                 # Incluir evaluación automática al cerrar
                 calificacion = body.get('calificacion')
                 comentario = body.get('comentario', '')
@@ -1816,39 +1905,16 @@ def cambiar_estado_ticket(id):
                 db.session.add(comentario_cierre)
 
                 # Notificar inmediatamente a supervisores sobre el cierre
-                socketio = get_socketio()
-                if socketio:
-                    try:
-                        cierre_data = {
-                            'ticket_id': ticket.id,
-                            'ticket_estado': ticket.estado,
-                            'ticket_titulo': ticket.titulo,
-                            'ticket_prioridad': ticket.prioridad,
-                            'cliente_id': ticket.id_cliente,
-                            'calificacion': calificacion,
-                            'tipo': 'cerrado',
-                            'timestamp': datetime.now().isoformat()
-                        }
-
-                        # Notificar a supervisores y administradores sobre el cierre
-                        socketio.emit('ticket_cerrado',
-                                      cierre_data, room='supervisores')
-                        socketio.emit('ticket_cerrado',
-                                      cierre_data, room='administradores')
-
-                        # También notificar al room del ticket
-                        ticket_room = f'room_ticket_{ticket.id}'
-                        socketio.emit('ticket_cerrado',
-                                      cierre_data, room=ticket_room)
-                        
-                        # Emitir eventos de actualización genérica para sincronización completa
-                        socketio.emit('ticket_actualizado', cierre_data, room=ticket_room)
-                        socketio.emit('ticket_actualizado', cierre_data, room='supervisores')
-                        socketio.emit('global_ticket_update', cierre_data)
-
-                        print(f"📤 TICKET CERRADO NOTIFICADO: {cierre_data}")
-                    except Exception as ws_error:
-                        print(f"Error enviando WebSocket de cierre: {ws_error}")
+                publicar('ticket_cerrado', {
+                    'ticket_id': ticket.id,
+                    'ticket_estado': ticket.estado,
+                    'ticket_titulo': ticket.titulo,
+                    'ticket_prioridad': ticket.prioridad,
+                    'cliente_id': ticket.id_cliente,
+                    'calificacion': calificacion,
+                    'tipo': 'cerrado',
+                    'timestamp': datetime.now().isoformat()
+                }, ticket_id=ticket.id)
             elif nuevo_estado_lower == 'solicitud reapertura' and estado_actual == 'solucionado':
                 print(f"✅ CONDICIÓN CUMPLIDA: solicitud reapertura desde solucionado")
                 print(f"   🎯 ENTRANDO A LÓGICA DE SOLICITUD DE REAPERTURA")
@@ -1858,6 +1924,7 @@ def cambiar_estado_ticket(id):
                 
                 # El ticket permanece en "solucionado" pero se marca la solicitud
                 ticket.estado = 'solucionado'  # Mantiene el estado
+                ticket.reapertura_pendiente = True
                 
                 # Crear comentario de solicitud de reapertura
                 comentario_solicitud = Comentarios(
@@ -1869,37 +1936,15 @@ def cambiar_estado_ticket(id):
                 db.session.add(comentario_solicitud)
  
                 # Notificar al supervisor sobre la solicitud de reapertura
-                socketio = get_socketio()
-                if socketio:
-                    try:
-                        solicitud_data = {
-                            'ticket_id': ticket.id,
-                            'ticket_estado': ticket.estado,
-                            'ticket_titulo': ticket.titulo,
-                            'ticket_prioridad': ticket.prioridad,
-                            'cliente_id': ticket.id_cliente,
-                            'tipo': 'solicitud_reapertura',
-                            'timestamp': datetime.now().isoformat()
-                        }
-                        
-                        # Notificar a supervisores y administradores sobre la solicitud
-                        socketio.emit('solicitud_reapertura', solicitud_data, room='supervisores')
-                        socketio.emit('solicitud_reapertura', solicitud_data, room='administradores')
-                        
-                        # También notificar al room del ticket
-                        ticket_room = f'room_ticket_{ticket.id}'
-                        socketio.emit('solicitud_reapertura',
-                                      solicitud_data, room=ticket_room)
-                        
-                        # Emitir eventos de actualización genérica para sincronización completa
-                        socketio.emit('ticket_actualizado', solicitud_data, room=ticket_room)
-                        socketio.emit('ticket_actualizado', solicitud_data, room='supervisores')
-                        socketio.emit('global_ticket_update', solicitud_data)
-
-                        print(
-                            f"📤 SOLICITUD DE REAPERTURA NOTIFICADA: {solicitud_data}")
-                    except Exception as ws_error:
-                        print(f"Error enviando WebSocket de solicitud: {ws_error}")
+                publicar('solicitud_reapertura', {
+                    'ticket_id': ticket.id,
+                    'ticket_estado': ticket.estado,
+                    'ticket_titulo': ticket.titulo,
+                    'ticket_prioridad': ticket.prioridad,
+                    'cliente_id': ticket.id_cliente,
+                    'tipo': 'solicitud_reapertura',
+                    'timestamp': datetime.now().isoformat()
+                }, ticket_id=ticket.id)
             elif nuevo_estado_lower == 'reabierto' and estado_actual == 'cerrado':
                 # Cliente reabre un ticket cerrado - vuelve a "en espera"
                 ticket.estado = 'en espera'
@@ -1915,35 +1960,15 @@ def cambiar_estado_ticket(id):
                 db.session.add(comentario_reapertura)
 
                 # Notificar inmediatamente a supervisores sobre la reapertura
-                socketio = get_socketio()
-                if socketio:
-                    try:
-                        reapertura_data = {
-                            'ticket_id': ticket.id,
-                            'ticket_estado': ticket.estado,
-                            'ticket_titulo': ticket.titulo,
-                            'ticket_prioridad': ticket.prioridad,
-                            'cliente_id': ticket.id_cliente,
-                            'tipo': 'reabierto',
-                            'timestamp': datetime.now().isoformat()
-                        }
-
-                        # Notificar a supervisores y administradores sobre la reapertura
-                        socketio.emit('ticket_reabierto',
-                                      reapertura_data, room='supervisores')
-                        socketio.emit('ticket_reabierto',
-                                      reapertura_data, room='administradores')
-
-                        # También notificar al room del ticket
-                        ticket_room = f'room_ticket_{ticket.id}'
-                        socketio.emit('ticket_reabierto',
-                                      reapertura_data, room=ticket_room)
-
-                        print(
-                            f"📤 TICKET REABIERTO NOTIFICADO: {reapertura_data}")
-                    except Exception as ws_error:
-                        print(
-                            f"Error enviando WebSocket de reapertura: {ws_error}")
+                publicar('ticket_reabierto', {
+                    'ticket_id': ticket.id,
+                    'ticket_estado': ticket.estado,
+                    'ticket_titulo': ticket.titulo,
+                    'ticket_prioridad': ticket.prioridad,
+                    'cliente_id': ticket.id_cliente,
+                    'tipo': 'reabierto',
+                    'timestamp': datetime.now().isoformat()
+                }, ticket_id=ticket.id)
             else:
                 print(f"❌ TRANSICIÓN NO VÁLIDA PARA CLIENTE:")
                 print(f"   Estado actual: '{estado_actual}'")
@@ -1978,38 +2003,16 @@ def cambiar_estado_ticket(id):
                 db.session.commit()
                 print(f"✅ COMMIT realizado para inicio del ticket {id}")
                 
-                # Pequeño delay para asegurar sincronización completa de BD
-                import time
-                time.sleep(0.1)
-                
                 # Notificar inicio del trabajo
-                socketio = get_socketio()
-                if socketio:
-                    try:
-                        inicio_data = {
-                            'ticket_id': ticket.id,
-                            'ticket_estado': ticket.estado,
-                            'ticket_titulo': ticket.titulo,
-                            'ticket_prioridad': ticket.prioridad,
-                            'analista_id': user['id'],
-                            'tipo': 'en_proceso',
-                            'timestamp': datetime.now().isoformat()
-                        }
-                        
-                        # Notificar a todos los usuarios del ticket
-                        ticket_room = f'room_ticket_{ticket.id}'
-                        socketio.emit('ticket_actualizado', inicio_data, room=ticket_room)
-                        socketio.emit('ticket_actualizado', inicio_data, room='supervisores')
-                        socketio.emit('ticket_actualizado', inicio_data, room='role_supervisor')
-                        socketio.emit('ticket_actualizado', inicio_data, room='administradores')
-                        
-                        # Emitir evento de estado cambiado específico
-                        socketio.emit('ticket_estado_changed', inicio_data, room=ticket_room)
-                        socketio.emit('global_ticket_update', inicio_data)
-                        
-                        print(f"📤 TICKET INICIADO POR ANALISTA NOTIFICADO: {inicio_data}")
-                    except Exception as ws_error:
-                        print(f"Error enviando WebSocket de inicio: {ws_error}")
+                publicar('ticket_iniciado', {
+                    'ticket_id': ticket.id,
+                    'ticket_estado': ticket.estado,
+                    'ticket_titulo': ticket.titulo,
+                    'ticket_prioridad': ticket.prioridad,
+                    'analista_id': user['id'],
+                    'tipo': 'en_proceso',
+                    'timestamp': datetime.now().isoformat()
+                }, ticket_id=ticket.id)
                 
                 # CORRECCIÓN: Retornar inmediatamente
                 return jsonify(ticket.serialize()), 200
@@ -2032,47 +2035,16 @@ def cambiar_estado_ticket(id):
                 db.session.commit()
                 print(f"✅ COMMIT realizado para solución del ticket {id}")
                 
-                # Pequeño delay para asegurar sincronización completa de BD
-                import time
-                time.sleep(0.1)
-                
                 # Notificar solución del ticket
-                socketio = get_socketio()
-                if socketio:
-                    try:
-                        solucion_data = {
-                            'ticket_id': ticket.id,
-                            'ticket_estado': ticket.estado,
-                            'ticket_titulo': ticket.titulo,
-                            'ticket_prioridad': ticket.prioridad,
-                            'analista_id': user['id'],
-                            'tipo': 'solucionado',
-                            'timestamp': datetime.now().isoformat()
-                        }
-                        
-                        # Notificar a todos los usuarios del ticket
-                        ticket_room = f'room_ticket_{ticket.id}'
-                        socketio.emit('ticket_solucionado', solucion_data, room=ticket_room)
-                        socketio.emit('ticket_solucionado', solucion_data, room='supervisores')
-                        socketio.emit('ticket_solucionado', solucion_data, room='role_supervisor')
-                        socketio.emit('ticket_solucionado', solucion_data, room='administradores')
-                        
-                        # Emitir eventos de actualización genérica para sincronización completa
-                        socketio.emit('ticket_actualizado', solucion_data, room=ticket_room)
-                        socketio.emit('ticket_actualizado', solucion_data, room='role_supervisor')
-                        socketio.emit('ticket_estado_changed', solucion_data, room=ticket_room)
-                        socketio.emit('global_ticket_update', solucion_data)
-                        
-                        # Notificar específicamente al cliente si existe
-                        if ticket.id_cliente:
-                            cliente_room = f'cliente_{ticket.id_cliente}'
-                            socketio.emit('ticket_solucionado', solucion_data, room=cliente_room)
-                            socketio.emit('ticket_actualizado', solucion_data, room=cliente_room)
-                            print(f"📤 NOTIFICACIÓN ENVIADA AL CLIENTE: room {cliente_room}")
-                        
-                        print(f"📤 TICKET SOLUCIONADO POR ANALISTA NOTIFICADO: {solucion_data}")
-                    except Exception as ws_error:
-                        print(f"Error enviando WebSocket de solución: {ws_error}")
+                publicar('ticket_solucionado', {
+                    'ticket_id': ticket.id,
+                    'ticket_estado': ticket.estado,
+                    'ticket_titulo': ticket.titulo,
+                    'ticket_prioridad': ticket.prioridad,
+                    'analista_id': user['id'],
+                    'tipo': 'solucionado',
+                    'timestamp': datetime.now().isoformat()
+                }, ticket_id=ticket.id, cliente_id=ticket.id_cliente)
                 
                 # CORRECCIÓN: Retornar inmediatamente
                 return jsonify(ticket.serialize()), 200
@@ -2095,6 +2067,8 @@ def cambiar_estado_ticket(id):
                 ).all()
 
                 for asignacion in asignaciones_analista:
+                    if ticket.id_asignacion_actual == asignacion.id:
+                        ticket.asignacion_actual = None
                     db.session.delete(asignacion)
 
                 # Crear comentario automático de escalación
@@ -2111,65 +2085,18 @@ def cambiar_estado_ticket(id):
                 db.session.commit()
                 print(f"✅ COMMIT realizado para escalación del ticket {id}")
                 
-                # Pequeño delay para asegurar sincronización completa de BD
-                import time
-                time.sleep(0.1)
 
                 # Notificar inmediatamente a supervisores sobre la escalación
-                socketio = get_socketio()
-                if socketio:
-                    try:
-                        escalacion_data = {
-                            'ticket_id': ticket.id,
-                            'ticket_estado': ticket.estado,
-                            'ticket_titulo': ticket.titulo,
-                            'ticket_prioridad': ticket.prioridad,
-                            'cliente_id': ticket.id_cliente,
-                            'analista_id': user['id'],
-                            'tipo': 'escalado',
-                            'timestamp': datetime.now().isoformat()
-                        }
-
-                        print(f"📤 ESCALACIÓN - Notificando a supervisores:")
-                        print(f"   → Ticket ID: {ticket.id}")
-                        print(f"   → Estado: {ticket.estado}")
-                        print(f"   → Analista que escaló: {user['id']}")
-
-                        # Notificar a supervisores y administradores sobre la escalación
-                        socketio.emit('ticket_escalado',
-                                      escalacion_data, room='supervisores')
-                        socketio.emit('ticket_escalado',
-                                      escalacion_data, room='administradores')
-                        print(f"   ✅ Eventos 'ticket_escalado' enviados a supervisores y administradores")
-
-                        # CORRECCIÓN: Notificar también a room de role
-                        socketio.emit('ticket_escalado', escalacion_data, room='role_supervisor')
-                        print(f"   ✅ Evento 'ticket_escalado' enviado a role_supervisor")
-
-                        # También notificar al room del ticket
-                        ticket_room = f'room_ticket_{ticket.id}'
-                        socketio.emit('ticket_escalado',
-                                      escalacion_data, room=ticket_room)
-                        print(f"   ✅ Evento 'ticket_escalado' enviado a {ticket_room}")
-                        
-                        # Emitir eventos de actualización genérica para sincronización completa
-                        socketio.emit('ticket_actualizado', escalacion_data, room=ticket_room)
-                        socketio.emit('ticket_actualizado', escalacion_data, room='supervisores')
-                        socketio.emit('ticket_actualizado', escalacion_data, room='role_supervisor')
-                        socketio.emit('ticket_estado_changed', escalacion_data, room=ticket_room)
-                        socketio.emit('global_ticket_update', escalacion_data)
-                        print(f"   ✅ Eventos de actualización genérica enviados")
-                        
-                        # Notificar como nuevo ticket disponible para que aparezca en la bandeja del supervisor
-                        socketio.emit('nuevo_ticket_disponible', escalacion_data, room='supervisores')
-                        socketio.emit('nuevo_ticket_disponible', escalacion_data, room='role_supervisor')
-                        print(f"   ✅ Eventos 'nuevo_ticket_disponible' enviados")
-
-                        print(
-                            f"📤 TICKET ESCALADO NOTIFICADO COMPLETAMENTE")
-                    except Exception as ws_error:
-                        print(
-                            f"❌ Error enviando WebSocket de escalación: {ws_error}")
+                publicar('ticket_escalado', {
+                    'ticket_id': ticket.id,
+                    'ticket_estado': ticket.estado,
+                    'ticket_titulo': ticket.titulo,
+                    'ticket_prioridad': ticket.prioridad,
+                    'cliente_id': ticket.id_cliente,
+                    'analista_id': user['id'],
+                    'tipo': 'escalado',
+                    'timestamp': datetime.now().isoformat()
+                }, ticket_id=ticket.id)
                 
                 # CORRECCIÓN: Retornar inmediatamente después de la escalación
                 # No esperar al commit general al final que podría causar conflictos
@@ -2201,6 +2128,7 @@ def cambiar_estado_ticket(id):
                 
                 ticket.estado = 'cerrado'
                 ticket.fecha_cierre = datetime.now()
+                ticket.reapertura_pendiente = False
                 
                 # Crear comentario automático de cierre
                 comentario_cierre = Comentarios(
@@ -2212,35 +2140,16 @@ def cambiar_estado_ticket(id):
                 db.session.add(comentario_cierre)
                 
                 # Notificar cierre del ticket
-                socketio = get_socketio()
-                if socketio:
-                    try:
-                        cierre_data = {
-                            'ticket_id': ticket.id,
-                            'ticket_estado': ticket.estado,
-                            'ticket_titulo': ticket.titulo,
-                            'ticket_prioridad': ticket.prioridad,
-                            'tipo': 'cerrado_por_supervisor',
-                            'supervisor_id': user['id'],
-                            'estado_anterior': estado_actual,
-                            'timestamp': datetime.now().isoformat()
-                        }
-                        
-                        # Notificar a todos los usuarios del ticket
-                        ticket_room = f'room_ticket_{ticket.id}'
-                        socketio.emit('ticket_cerrado', cierre_data, room=ticket_room)
-                        socketio.emit('ticket_cerrado', cierre_data, room='supervisores')
-                        socketio.emit('ticket_cerrado', cierre_data, room='administradores')
-                        
-                        # Emitir eventos de actualización genérica para sincronización completa
-                        socketio.emit('ticket_actualizado', cierre_data, room=ticket_room)
-                        socketio.emit('ticket_actualizado', cierre_data, room='supervisores')
-                        socketio.emit('ticket_estado_changed', cierre_data, room=ticket_room)
-                        socketio.emit('global_ticket_update', cierre_data)
-                        
-                        print(f"📤 TICKET CERRADO POR SUPERVISOR NOTIFICADO: {cierre_data}")
-                    except Exception as ws_error:
-                        print(f"Error enviando WebSocket de cierre: {ws_error}")
+                publicar('ticket_cerrado_por_supervisor', {
+                    'ticket_id': ticket.id,
+                    'ticket_estado': ticket.estado,
+                    'ticket_titulo': ticket.titulo,
+                    'ticket_prioridad': ticket.prioridad,
+                    'tipo': 'cerrado_por_supervisor',
+                    'supervisor_id': user['id'],
+                    'estado_anterior': estado_actual,
+                    'timestamp': datetime.now().isoformat()
+                }, ticket_id=ticket.id)
             elif nuevo_estado_lower == 'reabierto' and (estado_actual in ['cerrado', 'solucionado'] or estado_actual.startswith('cerrado')):
                 # Supervisor reabre un ticket cerrado o aprueba solicitud de reapertura
                 print(f"✅ SUPERVISOR REABRIENDO TICKET: {id}")
@@ -2248,10 +2157,12 @@ def cambiar_estado_ticket(id):
                 
                 ticket.estado = 'en espera'
                 ticket.fecha_cierre = None  # Reset fecha de cierre
+                ticket.reapertura_pendiente = False
                 
                 # Si es una solicitud de reapertura desde "solucionado", eliminar asignaciones del analista anterior
                 if estado_actual == 'solucionado':
                     print(f"🗑️ Eliminando asignaciones del analista anterior para permitir nueva asignación")
+                    ticket.asignacion_actual = None
                     asignaciones_anteriores = Asignacion.query.filter_by(id_ticket=ticket.id).all()
                     for asignacion in asignaciones_anteriores:
                         db.session.delete(asignacion)
@@ -2268,42 +2179,16 @@ def cambiar_estado_ticket(id):
                 db.session.add(comentario_reapertura)
                 
                 # Notificar reapertura del ticket
-                socketio = get_socketio()
-                if socketio:
-                    try:
-                        reapertura_data = {
-                            'ticket_id': ticket.id,
-                            'ticket_estado': ticket.estado,
-                            'ticket_titulo': ticket.titulo,
-                            'ticket_prioridad': ticket.prioridad,
-                            'tipo': 'reabierto_por_supervisor',
-                            'supervisor_id': user['id'],
-                            'estado_anterior': estado_actual,
-                            'timestamp': datetime.now().isoformat()
-                        }
-                        
-                        # Notificar a todos los usuarios del ticket
-                        ticket_room = f'room_ticket_{ticket.id}'
-                        socketio.emit('ticket_reabierto', reapertura_data, room=ticket_room)
-                        socketio.emit('ticket_reabierto', reapertura_data, room='supervisores')
-                        socketio.emit('ticket_reabierto', reapertura_data, room='administradores')
-                        
-                        # Emitir eventos de actualización genérica para sincronización completa
-                        socketio.emit('ticket_actualizado', reapertura_data, room=ticket_room)
-                        socketio.emit('ticket_actualizado', reapertura_data, room='supervisores')
-                        socketio.emit('ticket_estado_changed', reapertura_data, room=ticket_room)
-                        socketio.emit('global_ticket_update', reapertura_data)
-                        
-                        # Notificar específicamente al cliente si existe
-                        if ticket.id_cliente:
-                            cliente_room = f'cliente_{ticket.id_cliente}'
-                            socketio.emit('ticket_reabierto', reapertura_data, room=cliente_room)
-                            socketio.emit('ticket_actualizado', reapertura_data, room=cliente_room)
-                            print(f"📤 NOTIFICACIÓN ENVIADA AL CLIENTE: room {cliente_room}")
-                        
-                        print(f"📤 TICKET REABIERTO POR SUPERVISOR NOTIFICADO: {reapertura_data}")
-                    except Exception as ws_error:
-                        print(f"Error enviando WebSocket de reapertura: {ws_error}")
+                publicar('ticket_reabierto_por_supervisor', {
+                    'ticket_id': ticket.id,
+                    'ticket_estado': ticket.estado,
+                    'ticket_titulo': ticket.titulo,
+                    'ticket_prioridad': ticket.prioridad,
+                    'tipo': 'reabierto_por_supervisor',
+                    'supervisor_id': user['id'],
+                    'estado_anterior': estado_actual,
+                    'timestamp': datetime.now().isoformat()
+                }, ticket_id=ticket.id, cliente_id=ticket.id_cliente)
             else:
                 print(f"❌ TRANSICIÓN NO VÁLIDA PARA SUPERVISOR:")
                 print(f"   Estado actual: '{estado_actual}'")
@@ -2316,6 +2201,8 @@ def cambiar_estado_ticket(id):
         # Administrador puede cambiar cualquier estado
         elif user['role'] == 'administrador':
             ticket.estado = nuevo_estado
+            if nuevo_estado_lower != 'solucionado':
+                ticket.reapertura_pendiente = False
             if nuevo_estado_lower == 'cerrado':
                 ticket.fecha_cierre = datetime.now()
             elif nuevo_estado_lower == 'reabierto':
@@ -2323,30 +2210,15 @@ def cambiar_estado_ticket(id):
 
         db.session.commit()
 
-        # Emitir evento WebSocket para notificar cambios de estado al room del ticket
-        socketio = get_socketio()
-        if socketio:
-            try:
-                # Datos para notificaciones
-                estado_data = {
-                    'ticket_id': ticket.id,
-                    'ticket_estado': ticket.estado,
-                    'tipo': 'estado_cambiado',
-                    'nuevo_estado': nuevo_estado,
-                    'usuario': user['role'],
-                    'timestamp': datetime.now().isoformat()
-                }
-
-                # Notificar a todos los usuarios conectados al room del ticket
-                ticket_room = f'room_ticket_{ticket.id}'
-                socketio.emit('ticket_actualizado',
-                              estado_data, room=ticket_room)
-
-                print(
-                    f"📤 Estado de ticket actualizado enviado al room: {ticket_room}")
-
-            except Exception as e:
-                print(f"Error enviando WebSocket: {e}")
+        # Notificar cambios de estado al room del ticket
+        publicar('estado_cambiado', {
+            'ticket_id': ticket.id,
+            'ticket_estado': ticket.estado,
+            'tipo': 'estado_cambiado',
+            'nuevo_estado': nuevo_estado,
+            'usuario': user['role'],
+            'timestamp': datetime.now().isoformat()
+        }, ticket_id=ticket.id)
 
         return jsonify(ticket.serialize()), 200
 
@@ -2388,24 +2260,14 @@ def evaluar_ticket(id):
 
         db.session.commit()
 
-        # Emitir evento WebSocket para notificar evaluación al room del ticket
-        socketio = get_socketio()
-        if socketio:
-            try:
-                # Notificar a todos los usuarios conectados al room del ticket
-                ticket_room = f'room_ticket_{ticket.id}'
-                socketio.emit('ticket_actualizado', {
-                    'ticket': ticket.serialize(),
-                    'tipo': 'evaluado',
-                    'calificacion': calificacion,
-                    'comentario': comentario,
-                    'timestamp': datetime.now().isoformat()
-                }, room=ticket_room)
-
-                print(f"📤 Evaluación de ticket enviada al room: {ticket_room}")
-
-            except Exception as e:
-                print(f"Error enviando WebSocket: {e}")
+        # Notificar evaluación al room del ticket
+        publicar('ticket_evaluado', {
+            'ticket': ticket.serialize(),
+            'tipo': 'evaluado',
+            'calificacion': calificacion,
+            'comentario': comentario,
+            'timestamp': datetime.now().isoformat()
+        }, ticket_id=ticket.id)
 
         return jsonify(ticket.serialize()), 200
 
@@ -2414,6 +2276,43 @@ def evaluar_ticket(id):
         return jsonify({"message": f"Error al evaluar ticket: {str(e)}"}), 500
 
 
+@api.route('/tickets/<int:id>/seguir', methods=['POST', 'DELETE'])
+@require_auth
+def seguir_ticket(id):
+    """Empezar (POST) o dejar (DELETE) de recibir en tiempo real los eventos de un ticket"""
+    user = get_user_from_token()
+    try:
+        ticket = db.session.get(Ticket, id)
+        if not ticket:
+            return jsonify({"message": "Ticket no encontrado"}), 404
+
+        if not Ticket.visible_para(id, user['role'], user['id']):
+            return jsonify({"message": "No tienes permisos para seguir este ticket"}), 403
+
+        seguidor = TicketWatcher.query.filter_by(
+            id_ticket=id, rol=user['role'], id_usuario=user['id'], motivo='seguidor'
+        ).first()
+
+        if request.method == 'DELETE':
+            if seguidor:
+                db.session.delete(seguidor)
+                db.session.commit()
+            return jsonify({"message": "Ya no sigues este ticket", "siguiendo": False}), 200
+
+        if not seguidor:
+            db.session.add(TicketWatcher(id_ticket=id, rol=user['role'], id_usuario=user['id'], motivo='seguidor'))
+            db.session.commit()
+        return jsonify({"message": "Ahora sigues este ticket", "siguiendo": True}), 200
+
+    except IntegrityError:
+        # Otra petición del mismo usuario lo registró primero
+        db.session.rollback()
+        return jsonify({"message": "Ahora sigues este ticket", "siguiendo": True}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": f"Error al actualizar el seguimiento: {str(e)}"}), 500
+
+
 @api.route('/tickets/<int:id>/asignacion-status', methods=['GET'])
 @require_role(['supervisor', 'administrador'])
 def get_ticket_asignacion_status(id):
@@ -2423,19 +2322,16 @@ def get_ticket_asignacion_status(id):
         if not ticket:
             return jsonify({"message": "Ticket no encontrado"}), 404
 
-        # Verificar si el ticket ya tiene asignaciones
-        asignaciones = Asignacion.query.filter_by(id_ticket=id).all()
+        # Verificar si el ticket ya tiene asignación (puntero desnormalizado)
+        asignacion_mas_reciente = ticket.asignacion_actual
 
-        if not asignaciones:
+        if not asignacion_mas_reciente:
             return jsonify({
                 "tiene_asignacion": False,
                 "accion": "asignar",
                 "ticket": ticket.serialize()
             }), 200
         else:
-            # Obtener la asignación más reciente
-            asignacion_mas_reciente = max(
-                asignaciones, key=lambda x: x.fecha_asignacion)
             return jsonify({
                 "tiene_asignacion": True,
                 "accion": "reasignar",
@@ -2482,6 +2378,7 @@ def asignar_ticket(id):
         # El analista existe y está disponible (no hay campo activo en el modelo)
 
         # Eliminar todas las asignaciones anteriores para este ticket
+        ticket.asignacion_actual = None
         asignaciones_anteriores = Asignacion.query.filter_by(
             id_ticket=id).all()
         for asignacion_anterior in asignaciones_anteriores:
@@ -2502,6 +2399,7 @@ def asignar_ticket(id):
         ticket.estado = 'en espera'
 
         db.session.add(asignacion)
+        ticket.asignacion_actual = asignacion
 
         # Crear comentario automático de asignación
         accion_texto = f"Ticket {'reasignado' if es_reasignacion else 'asignado'} a {analista.nombre} {analista.apellido}"
@@ -2524,69 +2422,24 @@ def asignar_ticket(id):
             db.session.add(nuevo_comentario)
 
         db.session.commit()
-        
-        # Pequeño delay para asegurar que la transacción se complete completamente en la BD
-        # Esto previene race conditions donde el analista recibe el evento antes de que la BD esté lista
-        import time
-        time.sleep(0.1)  # 100ms de espera
 
-        # Emitir evento WebSocket para notificar asignación
-        socketio = get_socketio()
-        if socketio:
-            try:
-                # Crear datos de asignación con estructura consistente
-                asignacion_data = {
-                    'id': ticket.id,
-                    'ticket_id': ticket.id,
-                    'estado': ticket.estado,
-                    'titulo': ticket.titulo,
-                    'prioridad': ticket.prioridad,
-                    'descripcion': ticket.descripcion,
-                    'fecha_creacion': ticket.fecha_creacion.isoformat() if ticket.fecha_creacion else None,
-                    'id_cliente': ticket.id_cliente,
-                    'id_analista': id_analista,
-                    'analista_id': id_analista,  # Campo adicional para compatibilidad
-                    'analista_nombre': f"{analista.nombre} {analista.apellido}",
-                    'tipo': 'asignado',
-                    'accion': "reasignado" if es_reasignacion else "asignado",
-                    'timestamp': datetime.now().isoformat()
-                }
-                
-                analista_room = f'analista_{id_analista}'
-                ticket_room = f'room_ticket_{ticket.id}'
-                
-                print(f"📤 ASIGNACIÓN - Notificando:")
-                print(f"   → Analista room: {analista_room}")
-                print(f"   → Ticket room: {ticket_room}")
-                print(f"   → Ticket ID: {ticket.id}")
-                print(f"   → Analista ID: {id_analista}")
-
-                # Notificar específicamente al analista asignado (room individual)
-                socketio.emit('ticket_asignado_a_mi', asignacion_data, room=analista_room)
-                print(f"   ✅ Evento 'ticket_asignado_a_mi' enviado a {analista_room}")
-
-                # CORRECCIÓN CRÍTICA: Notificar también a las rooms de role
-                socketio.emit('ticket_asignado_a_mi', asignacion_data, room='role_analista')
-                socketio.emit('ticket_asignado', asignacion_data, room='role_analista')
-                print(f"   ✅ Eventos enviados a role_analista")
-
-                # Notificar a todos los usuarios conectados al room del ticket
-                socketio.emit('ticket_asignado', asignacion_data, room=ticket_room)
-                print(f"   ✅ Evento 'ticket_asignado' enviado a {ticket_room}")
-
-                # Notificar a supervisores y administradores sobre la asignación
-                socketio.emit('ticket_asignado', asignacion_data, room='supervisores')
-                socketio.emit('ticket_asignado', asignacion_data, room='administradores')
-                print(f"   ✅ Eventos enviados a supervisores y administradores")
-                
-                # Emitir evento de actualización genérica para asegurar sincronización
-                socketio.emit('ticket_actualizado', asignacion_data, room=ticket_room)
-                socketio.emit('ticket_actualizado', asignacion_data, room='role_analista')
-                socketio.emit('global_ticket_update', asignacion_data)
-                print(f"   ✅ Eventos de actualización genérica enviados")
-
-            except Exception as e:
-                print(f"Error enviando WebSocket: {e}")
+        # Notificar la asignación (el despachador emite después del commit)
+        publicar('ticket_asignado', {
+            'id': ticket.id,
+            'ticket_id': ticket.id,
+            'estado': ticket.estado,
+            'titulo': ticket.titulo,
+            'prioridad': ticket.prioridad,
+            'descripcion': ticket.descripcion,
+            'fecha_creacion': ticket.fecha_creacion.isoformat() if ticket.fecha_creacion else None,
+            'id_cliente': ticket.id_cliente,
+            'id_analista': id_analista,
+            'analista_id': id_analista,  # Campo adicional para compatibilidad
+            'analista_nombre': f"{analista.nombre} {analista.apellido}",
+            'tipo': 'asignado',
+            'accion': "reasignado" if es_reasignacion else "asignado",
+            'timestamp': datetime.now().isoformat()
+        }, ticket_id=ticket.id, analista_id=id_analista)
 
         accion = "reasignado" if es_reasignacion else "asignado"
         return jsonify({
@@ -2932,60 +2785,41 @@ def generar_recomendacion_ia(ticket_id):
 
 # ==================== RUTAS DE CHAT ====================
 
-@api.route('/tickets/<int:ticket_id>/chat-supervisor-analista', methods=['GET'])
-@require_auth
-def obtener_chat_supervisor_analista(ticket_id):
-    """Obtener mensajes del chat entre supervisor y analista para un ticket"""
+def responder_mensajes_chat(ticket_id, canal):
+    """Lista los mensajes de un canal de chat del ticket, opcionalmente solo los posteriores a ?after_id="""
     try:
+        after_id = request.args.get('after_id', type=int)
+
         # Verificar que el ticket existe
-        ticket = Ticket.query.get(ticket_id)
-        if not ticket:
+        if not db.session.query(Ticket.id).filter_by(id=ticket_id).first():
             return jsonify({"message": "Ticket no encontrado"}), 404
 
-        # Obtener mensajes del chat (usando la tabla de comentarios con un tipo específico)
-        mensajes = Comentarios.query.filter_by(
-            id_ticket=ticket_id
+        # Usa el índice (id_ticket, canal, id)
+        consulta = MensajeChat.query.options(
+            joinedload(MensajeChat.cliente),
+            joinedload(MensajeChat.analista),
+            joinedload(MensajeChat.supervisor)
         ).filter(
-            Comentarios.texto.like('CHAT_SUPERVISOR_ANALISTA:%')
-        ).order_by(Comentarios.fecha_comentario.asc()).all()
-
-        # Procesar mensajes para el formato del chat
-        chat_mensajes = []
-        for mensaje in mensajes:
-            # Extraer el mensaje real del texto (remover el prefijo)
-            mensaje_texto = mensaje.texto.replace(
-                'CHAT_SUPERVISOR_ANALISTA:', '')
-
-            # Determinar el autor basado en los campos de relación
-            autor = None
-            if mensaje.supervisor:
-                autor = {
-                    'id': mensaje.supervisor.id,
-                    'nombre': mensaje.supervisor.nombre,
-                    'apellido': mensaje.supervisor.apellido,
-                    'rol': 'supervisor'
-                }
-            elif mensaje.analista:
-                autor = {
-                    'id': mensaje.analista.id,
-                    'nombre': mensaje.analista.nombre,
-                    'apellido': mensaje.analista.apellido,
-                    'rol': 'analista'
-                }
-
-            chat_mensajes.append({
-                'id': mensaje.id,
-                'mensaje': mensaje_texto,
-                'fecha_mensaje': mensaje.fecha_comentario.isoformat(),
-                'autor': autor
-            })
+            MensajeChat.id_ticket == ticket_id,
+            MensajeChat.canal == canal
+        )
+        if after_id:
+            consulta = consulta.filter(MensajeChat.id > after_id)
 
-        return jsonify(chat_mensajes), 200
+        mensajes = consulta.order_by(MensajeChat.id.asc()).all()
+        return jsonify([m.serialize() for m in mensajes]), 200
 
     except Exception as e:
         return jsonify({"message": f"Error al obtener mensajes del chat: {str(e)}"}), 500
 
 
+@api.route('/tickets/<int:ticket_id>/chat-supervisor-analista', methods=['GET'])
+@require_auth
+def obtener_chat_supervisor_analista(ticket_id):
+    """Obtener mensajes del chat entre supervisor y analista para un ticket (?after_id= para solo los nuevos)"""
+    return responder_mensajes_chat(ticket_id, CANAL_SUPERVISOR_ANALISTA)
+
+
 @api.route('/chat-supervisor-analista', methods=['POST'])
 @require_auth
 def enviar_mensaje_supervisor_analista():
@@ -3008,61 +2842,42 @@ def enviar_mensaje_supervisor_analista():
         if not user_info:
             return jsonify({"message": "Token inválido"}), 401
 
-        # Crear el comentario con prefijo especial para el chat
-        comentario = Comentarios(
+        # Crear el mensaje en el canal supervisor-analista
+        mensaje_chat = MensajeChat(
             id_ticket=ticket_id,
-            texto=f'CHAT_SUPERVISOR_ANALISTA:{mensaje}',
-            fecha_comentario=datetime.now()
+            canal=CANAL_SUPERVISOR_ANALISTA,
+            mensaje=mensaje,
+            fecha_mensaje=datetime.now()
         )
 
         # Asignar el autor según el rol
         if user_info['role'] == 'supervisor':
-            comentario.id_supervisor = user_info['id']
+            mensaje_chat.id_supervisor = user_info['id']
         elif user_info['role'] == 'analista':
-            comentario.id_analista = user_info['id']
+            mensaje_chat.id_analista = user_info['id']
         else:
             return jsonify({"message": "Solo supervisores y analistas pueden usar este chat"}), 403
 
-        db.session.add(comentario)
+        db.session.add(mensaje_chat)
         db.session.commit()
 
-        # Emitir evento WebSocket
-        socketio = get_socketio()
-        if socketio:
-            # Room específico para chat supervisor-analista
-            chat_room = f'chat_supervisor_analista_{ticket_id}'
-            
-            socketio.emit('nuevo_mensaje_chat_supervisor_analista', {
-                'ticket_id': ticket_id,
-                'mensaje': mensaje,
-                'autor': {
-                    'id': user_info['id'],
-                    'nombre': user_info.get('nombre', 'Usuario'),
-                    'rol': user_info['role']
-                },
-                'fecha': datetime.now().isoformat()
-            }, room=chat_room)
-
-            # También notificar al room general del ticket para otros eventos
-            general_room = f'room_ticket_{ticket_id}'
-            socketio.emit('nuevo_mensaje_chat', {
-                'ticket_id': ticket_id,
-                'tipo': 'chat_supervisor_analista',
-                'mensaje': mensaje,
-                'autor': {
-                    'id': user_info['id'],
-                    'nombre': user_info.get('nombre', 'Usuario'),
-                    'rol': user_info['role']
-                },
-                'fecha': datetime.now().isoformat()
-            }, room=general_room)
-        else:
-            # WebSocket no disponible, continuar sin notificación
-            pass
+        # Notificar al room del chat supervisor-analista y al room general del ticket
+        publicar('mensaje_chat_supervisor_analista', {
+            'ticket_id': ticket_id,
+            'mensaje_id': mensaje_chat.id,
+            'tipo': 'chat_supervisor_analista',
+            'mensaje': mensaje,
+            'autor': {
+                'id': user_info['id'],
+                'nombre': user_info.get('nombre', 'Usuario'),
+                'rol': user_info['role']
+            },
+            'fecha': datetime.now().isoformat()
+        }, ticket_id=ticket_id)
         
         return jsonify({
             "message": "Mensaje enviado exitosamente",
-            "mensaje_id": comentario.id
+            "mensaje_id": mensaje_chat.id
         }), 201
 
     except Exception as e:
@@ -3470,54 +3285,8 @@ SÉ ESPECÍFICO, TÉCNICO Y ENFÁTICO en tu análisis. Cada palabra debe aportar
 @api.route('/tickets/<int:ticket_id>/chat-analista-cliente', methods=['GET'])
 @require_auth
 def obtener_chat_analista_cliente(ticket_id):
-    """Obtener mensajes del chat entre analista y cliente para un ticket"""
-    try:
-        # Verificar que el ticket existe
-        ticket = Ticket.query.get(ticket_id)
-        if not ticket:
-            return jsonify({"message": "Ticket no encontrado"}), 404
-
-        # Obtener mensajes del chat (usando la tabla de comentarios con un tipo específico)
-        mensajes = Comentarios.query.filter_by(
-            id_ticket=ticket_id
-        ).filter(
-            Comentarios.texto.like('CHAT_ANALISTA_CLIENTE:%')
-        ).order_by(Comentarios.fecha_comentario.asc()).all()
-
-        # Procesar mensajes para el formato del chat
-        chat_mensajes = []
-        for mensaje in mensajes:
-            # Extraer el mensaje real del texto (remover el prefijo)
-            mensaje_texto = mensaje.texto.replace('CHAT_ANALISTA_CLIENTE:', '')
-
-            # Determinar el autor basado en los campos de relación
-            autor = None
-            if mensaje.analista:
-                autor = {
-                    'id': mensaje.analista.id,
-                    'nombre': mensaje.analista.nombre,
-                    'apellido': mensaje.analista.apellido,
-                    'rol': 'analista'
-                }
-            elif mensaje.cliente:
-                autor = {
-                    'id': mensaje.cliente.id,
-                    'nombre': mensaje.cliente.nombre,
-                    'apellido': mensaje.cliente.apellido,
-                    'rol': 'cliente'
-                }
-
-            chat_mensajes.append({
-                'id': mensaje.id,
-                'mensaje': mensaje_texto,
-                'fecha_mensaje': mensaje.fecha_comentario.isoformat(),
-                'autor': autor
-            })
-
-        return jsonify(chat_mensajes), 200
-
-    except Exception as e:
-        return jsonify({"message": f"Error al obtener mensajes del chat: {str(e)}"}), 500
+    """Obtener mensajes del chat entre analista y cliente para un ticket (?after_id= para solo los nuevos)"""
+    return responder_mensajes_chat(ticket_id, CANAL_ANALISTA_CLIENTE)
 
 
 @api.route('/chat-analista-cliente', methods=['POST'])
@@ -3542,61 +3311,42 @@ def enviar_mensaje_analista_cliente():
         if not user_info:
             return jsonify({"message": "Token inválido"}), 401
 
-        # Crear el comentario con prefijo especial para el chat
-        comentario = Comentarios(
+        # Crear el mensaje en el canal analista-cliente
+        mensaje_chat = MensajeChat(
             id_ticket=ticket_id,
-            texto=f'CHAT_ANALISTA_CLIENTE:{mensaje}',
-            fecha_comentario=datetime.now()
+            canal=CANAL_ANALISTA_CLIENTE,
+            mensaje=mensaje,
+            fecha_mensaje=datetime.now()
         )
 
         # Asignar el autor según el rol
         if user_info['role'] == 'analista':
-            comentario.id_analista = user_info['id']
+            mensaje_chat.id_analista = user_info['id']
         elif user_info['role'] == 'cliente':
-            comentario.id_cliente = user_info['id']
+            mensaje_chat.id_cliente = user_info['id']
         else:
             return jsonify({"message": "Solo analistas y clientes pueden usar este chat"}), 403
 
-        db.session.add(comentario)
+        db.session.add(mensaje_chat)
         db.session.commit()
 
-        # Emitir evento WebSocket
-        socketio = get_socketio()
-        if socketio:
-            # Room específico para chat analista-cliente
-            chat_room = f'chat_analista_cliente_{ticket_id}'
-            
-            socketio.emit('nuevo_mensaje_chat_analista_cliente', {
-                'ticket_id': ticket_id,
-                'mensaje': mensaje,
-                'autor': {
-                    'id': user_info['id'],
-                    'nombre': user_info.get('nombre', 'Usuario'),
-                    'rol': user_info['role']
-                },
-                'fecha': datetime.now().isoformat()
-            }, room=chat_room)
-
-            # También notificar al room general del ticket para otros eventos
-            general_room = f'room_ticket_{ticket_id}'
-            socketio.emit('nuevo_mensaje_chat', {
-                'ticket_id': ticket_id,
-                'tipo': 'chat_analista_cliente',
-                'mensaje': mensaje,
-                'autor': {
-                    'id': user_info['id'],
-                    'nombre': user_info.get('nombre', 'Usuario'),
-                    'rol': user_info['role']
-                },
-                'fecha': datetime.now().isoformat()
-            }, room=general_room)
-        else:
-            # WebSocket no disponible, continuar sin notificación
-            pass
+        # Notificar al room del chat analista-cliente y al room general del ticket
+        publicar('mensaje_chat_analista_cliente', {
+            'ticket_id': ticket_id,
+            'mensaje_id': mensaje_chat.id,
+            'tipo': 'chat_analista_cliente',
+            'mensaje': mensaje,
+            'autor': {
+                'id': user_info['id'],
+                'nombre': user_info.get('nombre', 'Usuario'),
+                'rol': user_info['role']
+            },
+            'fecha': datetime.now().isoformat()
+        }, ticket_id=ticket_id)
         
         return jsonify({
             "message": "Mensaje enviado exitosamente",
-            "mensaje_id": comentario.id
+            "mensaje_id": mensaje_chat.id
         }), 201
 
     except Exception as e:
@@ -3612,42 +3362,54 @@ def get_heatmap_data():
     """Obtener datos de coordenadas de tickets para el mapa de calor"""
     try:
         # Obtener todos los tickets con sus clientes que tengan coordenadas válidas
-        tickets = db.session.query(Ticket, Cliente).join(
+        consulta = db.session.query(Ticket, Cliente).join(
             Cliente, Ticket.id_cliente == Cliente.id
         ).filter(
             Cliente.latitude.isnot(None),
             Cliente.longitude.isnot(None)
-        ).all()
+        )
         
         # Preparar datos para el mapa de calor
-        heatmap_data = []
-        for ticket, cliente in tickets:
-            try:
-                # Convertir coordenadas a float
-                lat = float(cliente.latitude)
-                lng = float(cliente.longitude)
-                
-                # Verificar que las coordenadas sean válidas
-                if -90 <= lat <= 90 and -180 <= lng <= 180:
-                    heatmap_data.append({
-                        'lat': lat,
-                        'lng': lng,
-                        'ticket_id': ticket.id,
-                        'ticket_titulo': ticket.titulo,
-                        'ticket_descripcion': ticket.descripcion or 'Sin descripción',
-                        'ticket_estado': ticket.estado,
-                        'ticket_prioridad': ticket.prioridad,
-                        'ticket_fecha_creacion': ticket.fecha_creacion.isoformat() if ticket.fecha_creacion else None,
-                        'cliente_nombre': cliente.nombre,
-                        'cliente_apellido': cliente.apellido,
-                        'cliente_email': cliente.email,
-                        'cliente_direccion': cliente.direccion or 'Dirección no disponible',
-                        'cliente_telefono': cliente.telefono,
-                        'cliente_id': cliente.id
-                    })
-            except (ValueError, TypeError):
-                # Saltar coordenadas inválidas
-                continue
+        def serializar_puntos(filas):
+            puntos = []
+            for ticket, cliente in filas:
+                try:
+                    # Convertir coordenadas a float
+                    lat = float(cliente.latitude)
+                    lng = float(cliente.longitude)
+                    
+                    # Verificar que las coordenadas sean válidas
+                    if -90 <= lat <= 90 and -180 <= lng <= 180:
+                        puntos.append({
+                            'lat': lat,
+                            'lng': lng,
+                            'ticket_id': ticket.id,
+                            'ticket_titulo': ticket.titulo,
+                            'ticket_descripcion': ticket.descripcion or 'Sin descripción',
+                            'ticket_estado': ticket.estado,
+                            'ticket_prioridad': ticket.prioridad,
+                            'ticket_fecha_creacion': ticket.fecha_creacion.isoformat() if ticket.fecha_creacion else None,
+                            'cliente_nombre': cliente.nombre,
+                            'cliente_apellido': cliente.apellido,
+                            'cliente_email': cliente.email,
+                            'cliente_direccion': cliente.direccion or 'Dirección no disponible',
+                            'cliente_telefono': cliente.telefono,
+                            'cliente_id': cliente.id
+                        })
+                except (ValueError, TypeError):
+                    # Saltar coordenadas inválidas
+                    continue
+            return puntos
+        
+        modo_streaming = leer_modo_streaming()
+        if modo_streaming:
+            return responder_streaming(
+                consulta.order_by(Ticket.id), serializar_puntos, modo_streaming,
+                encabezado={"message": "Datos de mapa de calor de tickets obtenidos exitosamente"},
+                clave_items="data", clave_total="total_points"
+            )
+        
+        heatmap_data = serializar_puntos(consulta.all())
         
         return jsonify({
             "message": "Datos de mapa de calor de tickets obtenidos exitosamente",
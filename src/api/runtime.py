@@ -0,0 +1,56 @@
+"""
+Runtime de Socket.IO.
+
+En producción gunicorn corre con el worker de eventlet (ver Procfile), que parchea la
+librería estándar antes de importar la app: cada conexión de Socket.IO es un green
+thread en lugar de un hilo del sistema, y una conexión inactiva cuesta unos pocos KB.
+En desarrollo (python src/app.py, flask run, comandos de flask) sigue 'threading'.
+SOCKETIO_ASYNC_MODE fuerza un modo.
+"""
+import os
+
+MODOS_SOPORTADOS = ('threading', 'eventlet')
+
+
+def eventlet_activo():
+    """True si el proceso corre con eventlet.monkey_patch() (gunicorn -k eventlet)"""
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return False
+    return patcher.is_monkey_patched('socket')
+
+
+def detectar_async_mode():
+    modo = os.getenv('SOCKETIO_ASYNC_MODE')
+    if modo:
+        if modo not in MODOS_SOPORTADOS:
+            raise ValueError(f"SOCKETIO_ASYNC_MODE inválido: {modo}. Válidos: {', '.join(MODOS_SOPORTADOS)}")
+        return modo
+    return 'eventlet' if eventlet_activo() else 'threading'
+
+
+def preparar_runtime(modo):
+    """Ajustes para que las librerías bloqueantes cedan el hub de eventlet"""
+    if modo != 'eventlet':
+        return
+    if not eventlet_activo():
+        print("⚠️ async_mode 'eventlet' sin monkey_patch: usar gunicorn -k eventlet (ver Procfile)")
+        return
+    try:
+        from eventlet.support import psycopg2_patcher
+    except ImportError:
+        # Sin psycopg2 (SQLite en desarrollo) no hay nada que parchear
+        return
+    psycopg2_patcher.make_psycopg_green()
+
+
+def ejecutar_bloqueante(funcion, *args):
+    """
+    Ejecuta trabajo de CPU que no cede el hub (PBKDF2) en un hilo real del sistema
+    cuando corre bajo eventlet; en modo threading lo ejecuta directamente.
+    """
+    if eventlet_activo():
+        from eventlet import tpool
+        return tpool.execute(funcion, *args)
+    return funcion(*args)
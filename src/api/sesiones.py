@@ -0,0 +1,130 @@
+"""
+Registro de sockets autenticados.
+
+handle_connect verifica el JWT de auth={'token': ...} y registra el socket; desde ahí
+los handlers y la API REST saben quién está detrás de cada sid (y qué sids tiene cada
+usuario) sin volver a la base de datos. Los ids de usuario son por tabla (cliente 1 y
+analista 1 son personas distintas), así que un usuario es el par (rol, id).
+
+Cada proceso registra solo sus propios sockets: con varios workers la vista es local.
+"""
+import threading
+from datetime import datetime
+from api.models import Ticket
+
+# Rooms de rol/usuario y roles que pueden unirse a cada una (además del dueño)
+ROOMS_POR_ROL = {
+    'supervisores': ('supervisor', 'administrador'),
+    'administradores': ('administrador',),
+    'analistas': ('analista', 'supervisor', 'administrador'),
+    'clientes': ('cliente', 'supervisor', 'administrador'),
+}
+# Prefijo de room personal -> (rol dueño, roles que también pueden unirse)
+ROOMS_PERSONALES = {
+    'cliente_': ('cliente', ('supervisor', 'administrador')),
+    'analista_': ('analista', ('supervisor', 'administrador')),
+}
+# Rooms de un ticket: prefijo -> roles que pueden unirse si además ven el ticket
+ROOMS_TICKET = {
+    'room_ticket_': ('cliente', 'analista', 'supervisor', 'administrador'),
+    'chat_supervisor_analista_': ('analista', 'supervisor', 'administrador'),
+    'chat_analista_cliente_': ('cliente', 'analista', 'supervisor', 'administrador'),
+}
+# Canales generales que usa el frontend; el servidor no emite datos de tickets en ellos
+ROOMS_ABIERTAS = frozenset({'global_tickets', 'global_system_room', 'ticket_status_changes'})
+
+
+def room_usuario(role, user_id):
+    """Room personal de un usuario; handle_connect mete en ella a cada socket autenticado"""
+    return f'usuario_{role}_{user_id}'
+
+
+class RegistroSesiones:
+    """Diccionarios sid -> usuario y (rol, id) -> sids, protegidos por un bloqueo"""
+
+    def __init__(self):
+        self._por_sid = {}
+        self._por_usuario = {}
+        self._bloqueo = threading.Lock()
+
+    def registrar(self, sid, payload):
+        """Asocia el sid al usuario del payload de verify_token()"""
+        usuario = {
+            'user_id': payload['user_id'],
+            'role': payload['role'],
+            'email': payload.get('email'),
+            'connected_at': datetime.now().isoformat(),
+        }
+        clave = (usuario['role'], usuario['user_id'])
+        with self._bloqueo:
+            self._por_sid[sid] = usuario
+            self._por_usuario.setdefault(clave, set()).add(sid)
+        return usuario
+
+    def eliminar(self, sid):
+        """Quita el sid; devuelve el usuario que tenía o None si era anónimo"""
+        with self._bloqueo:
+            usuario = self._por_sid.pop(sid, None)
+            if usuario is None:
+                return None
+            clave = (usuario['role'], usuario['user_id'])
+            sids = self._por_usuario.get(clave)
+            if sids is not None:
+                sids.discard(sid)
+                if not sids:
+                    del self._por_usuario[clave]
+        return usuario
+
+    def usuario(self, sid):
+        return self._por_sid.get(sid)
+
+    def sids_de(self, role, user_id):
+        with self._bloqueo:
+            return list(self._por_usuario.get((role, user_id), ()))
+
+    def conectado(self, role, user_id):
+        return (role, user_id) in self._por_usuario
+
+    def estadisticas(self):
+        with self._bloqueo:
+            return {"sockets_autenticados": len(self._por_sid), "usuarios_conectados": len(self._por_usuario)}
+
+
+registro_sesiones = RegistroSesiones()
+
+
+def room_ticket(room):
+    """(prefijo, ticket_id) si la room es de un ticket, si no None"""
+    for prefijo in ROOMS_TICKET:
+        if room.startswith(prefijo) and room[len(prefijo):].isdigit():
+            return prefijo, int(room[len(prefijo):])
+    return None
+
+
+def puede_unirse(usuario, room):
+    """
+    True si el usuario puede entrar a la room. Un socket anónimo (usuario None) no
+    entra a ninguna y toda room que no esté contemplada aquí se rechaza. Las rooms de
+    ticket y de chat consultan la base con Ticket.visible_para.
+    """
+    if usuario is None or not isinstance(room, str):
+        return False
+    if room in ROOMS_POR_ROL:
+        return usuario['role'] in ROOMS_POR_ROL[room]
+    if room.startswith('role_'):
+        return usuario['role'] == room[len('role_'):]
+    if room.startswith('usuario_'):
+        return room == room_usuario(usuario['role'], usuario['user_id'])
+    if room.startswith('user_'):
+        return room == f"user_{usuario['user_id']}"
+    for prefijo, (dueño, otros) in ROOMS_PERSONALES.items():
+        if room.startswith(prefijo):
+            if usuario['role'] == dueño:
+                return room == f"{prefijo}{usuario['user_id']}"
+            return usuario['role'] in otros
+    de_ticket = room_ticket(room)
+    if de_ticket is not None:
+        prefijo, ticket_id = de_ticket
+        return (usuario['role'] in ROOMS_TICKET[prefijo]
+                and Ticket.visible_para(ticket_id, usuario['role'], usuario['user_id']))
+    return room in ROOMS_ABIERTAS
@@ -1,4 +1,19 @@
-from flask import jsonify, url_for
+import base64
+import json
+import threading
+from datetime import datetime
+from functools import wraps
+from itertools import islice
+from flask import jsonify, url_for, request, make_response, Response, stream_with_context
+from sqlalchemy import and_, or_
+from api.json_provider import dumps_bytes
+
+# Paginación por cursor (keyset)
+PAGINACION_LIMITE_POR_DEFECTO = 50
+PAGINACION_LIMITE_MAXIMO = 200
+
+# Respuestas en streaming: filas cargadas y serializadas por lote
+STREAMING_TAMANO_LOTE = 500
 
 class APIException(Exception):
     status_code = 400
@@ -15,6 +30,190 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def leer_parametros_paginacion():
+    """
+    Lee ?limit= y ?cursor= de la petición.
+
+    La paginación solo se activa si alguno de los dos viene en la URL, así los
+    clientes que esperan la lista completa siguen recibiendo el formato anterior.
+
+    Returns:
+        tuple: (paginar, cursor, limit)
+    """
+    cursor = request.args.get('cursor') or None
+    limit_crudo = request.args.get('limit')
+    if cursor is None and limit_crudo is None:
+        return False, None, None
+
+    try:
+        limit = int(limit_crudo) if limit_crudo is not None else PAGINACION_LIMITE_POR_DEFECTO
+    except ValueError:
+        raise APIException("El parámetro limit debe ser un entero", status_code=400)
+    if limit < 1:
+        raise APIException("El parámetro limit debe ser mayor que 0", status_code=400)
+    return True, cursor, min(limit, PAGINACION_LIMITE_MAXIMO)
+
+def codificar_cursor(valores):
+    """Codifica los valores de la última fila en un cursor opaco"""
+    crudo = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in valores])
+    return base64.urlsafe_b64encode(crudo.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decodificar_cursor(cursor, columnas):
+    """Decodifica un cursor generado por codificar_cursor para las columnas dadas"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno).decode('utf-8'))
+        if not isinstance(valores, list) or len(valores) != len(columnas):
+            raise ValueError("cursor con formato inesperado")
+        return [
+            datetime.fromisoformat(v) if c.type.python_type is datetime else c.type.python_type(v)
+            for c, v in zip(columnas, valores)
+        ]
+    except (ValueError, TypeError, NotImplementedError, UnicodeDecodeError):
+        raise APIException("Cursor inválido", status_code=400)
+
+def paginar_keyset(query, columnas, cursor=None, limit=PAGINACION_LIMITE_POR_DEFECTO, descendente=False):
+    """
+    Pagina una consulta por keyset sobre columnas únicas en conjunto (p.ej. (fecha_creacion, id)).
+
+    Args:
+        query: Consulta SQLAlchemy sin order_by
+        columnas (list): Columnas del keyset, la última debe ser única (id)
+        cursor (str, optional): Cursor devuelto por la página anterior
+        limit (int): Tamaño de página
+        descendente (bool): Recorrer de más reciente a más antiguo
+
+    Returns:
+        tuple: (filas, next_cursor) donde next_cursor es None en la última página
+    """
+    if cursor:
+        valores = decodificar_cursor(cursor, columnas)
+        condiciones = []
+        for i, columna in enumerate(columnas):
+            comparacion = columna < valores[i] if descendente else columna > valores[i]
+            iguales = [columnas[j] == valores[j] for j in range(i)]
+            condiciones.append(and_(*iguales, comparacion))
+        query = query.filter(or_(*condiciones))
+
+    orden = [c.desc() if descendente else c.asc() for c in columnas]
+    filas = query.order_by(*orden).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(filas) > limit:
+        filas = filas[:limit]
+        ultima = filas[-1]
+        next_cursor = codificar_cursor([getattr(ultima, c.key) for c in columnas])
+    return filas, next_cursor
+
+def leer_modo_streaming():
+    """
+    Lee el modo streaming de la petición.
+
+    Returns:
+        str: 'ndjson' con ?stream=ndjson o Accept: application/x-ndjson, 'json' con
+            ?stream=1 (arreglo JSON escrito por partes), None para la respuesta normal
+    """
+    stream = (request.args.get('stream') or '').lower()
+    if stream == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', ''):
+        return 'ndjson'
+    if stream in ('1', 'true', 'json'):
+        return 'json'
+    return None
+
+def responder_streaming(query, serializar, modo, encabezado=None, clave_items=None, clave_total=None,
+                        tamano_lote=STREAMING_TAMANO_LOTE):
+    """
+    Escribe la respuesta mientras recorre la consulta con yield_per, así la memoria
+    no crece con el número de filas.
+
+    Args:
+        query: Consulta SQLAlchemy ya ordenada
+        serializar (callable): Recibe un lote de filas y devuelve la lista de dicts
+        modo (str): 'json' o 'ndjson' (ver leer_modo_streaming)
+        encabezado (dict, optional): En modo json, claves escritas antes de los items
+        clave_items (str, optional): En modo json, envuelve los items en {clave_items: [...]}
+        clave_total (str, optional): En modo json, agrega al final el número de items
+        tamano_lote (int): Filas por lote
+
+    Returns:
+        Response: Respuesta en streaming
+    """
+    filas = iter(query.yield_per(tamano_lote))
+
+    def lotes():
+        while True:
+            lote = list(islice(filas, tamano_lote))
+            if not lote:
+                return
+            yield serializar(lote)
+
+    def generar_ndjson():
+        for lote in lotes():
+            yield b"".join(dumps_bytes(item) + b"\n" for item in lote)
+
+    def generar_json():
+        total = 0
+        if clave_items:
+            inicio = dumps_bytes(encabezado or {})[:-1]
+            yield inicio + (b"," if len(inicio) > 1 else b"") + dumps_bytes(clave_items) + b":["
+        else:
+            yield b"["
+        for lote in lotes():
+            if lote:
+                yield (b"," if total else b"") + b",".join(dumps_bytes(item) for item in lote)
+                total += len(lote)
+        if clave_items:
+            final = b"]"
+            if clave_total:
+                final += b"," + dumps_bytes(clave_total) + b":" + dumps_bytes(total)
+            yield final + b"}"
+        else:
+            yield b"]"
+
+    if modo == 'ndjson':
+        return Response(stream_with_context(generar_ndjson()), mimetype='application/x-ndjson')
+    return Response(stream_with_context(generar_json()), mimetype='application/json')
+
+# GET condicionales: respuestas servidas con y sin cuerpo (expuestas en /api/metricas)
+ESTADISTICAS_ETAG = {"respuestas_304": 0, "respuestas_200": 0}
+_bloqueo_estadisticas_etag = threading.Lock()
+
+def _contar_etag(clave):
+    with _bloqueo_estadisticas_etag:
+        ESTADISTICAS_ETAG[clave] += 1
+
+def etag_condicional(calcular_etag):
+    """
+    Decorador de GET condicional con ETag débil. Va debajo de require_role.
+
+    Args:
+        calcular_etag (callable): Recibe los argumentos de la ruta y devuelve el valor del
+            ETag a partir de un agregado barato de versiones, o None si no aplica
+            (recurso inexistente o sin permisos); en ese caso responde la vista normal
+
+    Returns:
+        Decorator function
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # Se calcula antes de cargar nada: si los datos cambian mientras tanto, el
+            # siguiente poll ya no coincidirá y recibirá la versión nueva
+            etag = calcular_etag(**kwargs)
+            if etag is not None and request.if_none_match.contains_weak(etag):
+                _contar_etag("respuestas_304")
+                respuesta = make_response('', 304)
+                respuesta.set_etag(etag, weak=True)
+                return respuesta
+
+            respuesta = make_response(f(*args, **kwargs))
+            if etag is not None and respuesta.status_code == 200:
+                _contar_etag("respuestas_200")
+                respuesta.set_etag(etag, weak=True)
+            return respuesta
+        return decorated_function
+    return decorator
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
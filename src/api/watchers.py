@@ -0,0 +1,88 @@
+"""
+Caché de watchers de tickets (models.TicketWatcher).
+
+publicar() resuelve aquí a quién le importa un ticket y el evento va a la room
+personal de cada uno (usuario_<rol>_<id>, a la que entra todo socket autenticado al
+conectarse) en lugar de a role_cliente/role_analista/role_supervisor enteras.
+
+Cada entrada se carga con una consulta por id_ticket, se invalida en el commit que
+cambia los watchers del ticket y vence a los WATCHERS_TTL_SEGUNDOS: otros workers no
+ven esa invalidación y se ponen al día por TTL.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, select
+from api.models import db, TicketWatcher
+from api.sesiones import room_usuario
+
+WATCHERS_CACHE_MAX = int(os.getenv('WATCHERS_CACHE_MAX', '10000'))
+WATCHERS_TTL_SEGUNDOS = float(os.getenv('WATCHERS_TTL_SEGUNDOS', '30'))
+
+
+class CacheWatchers:
+    """LRU acotada ticket_id -> ((rol, id_usuario), ...)"""
+
+    def __init__(self, maximo=WATCHERS_CACHE_MAX, ttl=WATCHERS_TTL_SEGUNDOS):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._entradas = OrderedDict()
+        self._bloqueo = threading.Lock()
+        self._estadisticas = {"aciertos": 0, "fallos": 0, "invalidaciones": 0}
+
+    def obtener(self, ticket_id, guardar=True):
+        """
+        Watchers del ticket. Con guardar=False (la transacción tiene cambios sin
+        confirmar) se consultan sin cachear el resultado.
+        """
+        ahora = time.monotonic()
+        with self._bloqueo:
+            entrada = self._entradas.get(ticket_id)
+            if entrada is not None and ahora - entrada[0] < self.ttl:
+                self._entradas.move_to_end(ticket_id)
+                self._estadisticas["aciertos"] += 1
+                return entrada[1]
+            self._estadisticas["fallos"] += 1
+
+        tabla = TicketWatcher.__table__
+        watchers = tuple(sorted(set(db.session.execute(
+            select(tabla.c.rol, tabla.c.id_usuario).where(tabla.c.id_ticket == ticket_id)
+        ).all())))
+        if guardar:
+            with self._bloqueo:
+                self._entradas[ticket_id] = (ahora, watchers)
+                self._entradas.move_to_end(ticket_id)
+                while len(self._entradas) > self.maximo:
+                    self._entradas.popitem(last=False)
+        return watchers
+
+    def invalidar(self, ids_ticket):
+        with self._bloqueo:
+            for ticket_id in ids_ticket:
+                if self._entradas.pop(ticket_id, None) is not None:
+                    self._estadisticas["invalidaciones"] += 1
+
+    def estadisticas(self):
+        with self._bloqueo:
+            return dict(self._estadisticas, tickets=len(self._entradas))
+
+
+cache_watchers = CacheWatchers()
+
+
+def rooms_watchers(ticket_id, guardar=True):
+    """Rooms personales de los watchers del ticket"""
+    return tuple(room_usuario(rol, id_usuario) for rol, id_usuario in cache_watchers.obtener(ticket_id, guardar))
+
+
+@event.listens_for(db.session, "after_commit")
+def invalidar_watchers_confirmados(session):
+    ids_ticket = session.info.pop("watchers_modificados", None)
+    if ids_ticket:
+        cache_watchers.invalidar(ids_ticket)
+
+
+@event.listens_for(db.session, "after_rollback")
+def descartar_watchers_modificados(session):
+    session.info.pop("watchers_modificados", None)
@@ -10,10 +10,15 @@ from flask import Flask, request, jsonify, url_for, send_from_directory
 from dotenv import load_dotenv
 from flask_migrate import Migrate
 from flask_swagger import swagger
-from flask_socketio import SocketIO, emit, join_room, leave_room
+from flask_socketio import SocketIO, emit, join_room, leave_room, rooms
 from flask_cors import CORS
 from api.utils import APIException, generate_sitemap
-from api.models import db
+from api import json_provider, mensajeria, runtime
+from api.eventos import publicar, contar_entregas, EVENTOS_SOCKET
+from api.replay import replay, registrar_replay
+from api.sesiones import registro_sesiones, puede_unirse, room_usuario
+from api.presencia import presencia
+from api.models import db, Ticket
 from api.routes import api
 from api.admin import setup_admin
 from api.commands import setup_commands
@@ -27,6 +32,7 @@ static_file_dir = os.path.join(os.path.dirname(
     os.path.realpath(__file__)), '../dist/')
 app = Flask(__name__)
 app.url_map.strict_slashes = False
+app.json = json_provider.JSONRapido(app)
 
 # Configurar CORS global
 CORS(app, origins="*", allow_headers=["Content-Type", "Authorization"], methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
@@ -34,6 +40,12 @@ CORS(app, origins="*", allow_headers=["Content-Type", "Authorization"], methods=
 # Configurar CORS para SocketIO
 app.config['SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-super-secret-jwt-key-change-in-production')
 
+# eventlet bajo gunicorn -k eventlet (Procfile), threading en desarrollo
+SOCKETIO_ASYNC_MODE = runtime.detectar_async_mode()
+runtime.preparar_runtime(SOCKETIO_ASYNC_MODE)
+# Cola compartida para repartir emits entre workers (ver api/mensajeria.py)
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+
 # Configuración más robusta para SocketIO
 socketio = SocketIO(
     app, 
@@ -46,15 +58,22 @@ socketio = SocketIO(
     allow_upgrades=True,
     transports=['polling', 'websocket'],
     # Configuraciones adicionales para mejor rendimiento
-    async_mode='threading',
+    async_mode=SOCKETIO_ASYNC_MODE,
     manage_session=False,
     # Configuración para reconexión automática
     always_connect=True,
     # Configuración de rooms
     channel='socketio',
+    client_manager=mensajeria.crear_client_manager(SOCKETIO_MESSAGE_QUEUE, 'socketio'),
     # Configuración de memoria
-    memory=True
+    memory=True,
+    # Mismo codificador JSON que las respuestas HTTP
+    json=json_provider
 )
+# Copias ahorradas al emitir a varias rooms a la vez (ver api/eventos.py)
+contar_entregas(socketio.server.manager)
+# Secuencia y buffers para reanudar tras una reconexión (ver api/replay.py)
+registrar_replay(socketio.server.manager, EVENTOS_SOCKET)
 
 # database condiguration
 db_url = os.getenv("DATABASE_URL")
@@ -95,13 +114,14 @@ def handle_connect(auth=None):
             from api.jwt_utils import verify_token
             user_data = verify_token(auth['token'])
             if user_data:
-                # Almacenar información del usuario en la sesión
-                socketio.session[request.sid] = {
-                    'user_id': user_data['id'],
-                    'role': user_data['role'],
-                    'connected_at': datetime.now().isoformat()
-                }
-                print(f'✅ Usuario autenticado: {user_data["role"]} (ID: {user_data["id"]})')
+                # Registrar el socket para los handlers y la API REST
+                usuario = registro_sesiones.registrar(request.sid, user_data)
+                # Room personal: ahí llegan los eventos de los tickets que sigue (api/watchers.py)
+                join_room(room_usuario(usuario['role'], usuario['user_id']))
+                print(f'✅ Usuario autenticado: {usuario["role"]} (ID: {usuario["user_id"]})')
+                delta = presencia.conectar(usuario['role'], usuario['user_id'])
+                if delta:
+                    publicar('presencia_cambiada', delta)
             else:
                 print('❌ Token inválido')
         except Exception as e:
@@ -110,7 +130,9 @@ def handle_connect(auth=None):
     emit('connected', {
         'data': 'Conectado al servidor',
         'session_id': request.sid,
-        'timestamp': datetime.now().isoformat()
+        'timestamp': datetime.now().isoformat(),
+        'replay': replay.posicion(),
+        'autenticado': registro_sesiones.usuario(request.sid) is not None
     })
 
 
@@ -120,15 +142,29 @@ def handle_disconnect():
     print(f'🔌 Cliente desconectado: {request.sid}')
     
     # Limpiar sesión
-    if request.sid in socketio.session:
-        user_info = socketio.session[request.sid]
-        print(f'🧹 Limpiando sesión para usuario: {user_info.get("role", "desconocido")}')
-        del socketio.session[request.sid]
+    user_info = registro_sesiones.eliminar(request.sid)
+    if user_info:
+        print(f'🧹 Limpiando sesión para usuario: {user_info["role"]} (ID: {user_info["user_id"]})')
+        delta = presencia.desconectar(user_info['role'], user_info['user_id'])
+        if delta:
+            publicar('presencia_cambiada', delta)
 
 @socketio.on('ping')
 def handle_ping():
-    """Manejar ping para mantener conexión activa"""
-    emit('pong', {'timestamp': datetime.now().isoformat()})
+    """Manejar ping para mantener conexión activa (y renovar la presencia del usuario)"""
+    usuario = registro_sesiones.usuario(request.sid)
+    if usuario:
+        presencia.latido(usuario['role'], usuario['user_id'])
+    emit('pong', {'timestamp': datetime.now().isoformat(), 'replay': replay.posicion()})
+
+
+def unirse_con_permiso(room):
+    """join_room si el socket puede entrar (api/sesiones.puede_unirse); si no, emite 'error'"""
+    if not puede_unirse(registro_sesiones.usuario(request.sid), room):
+        emit('error', {'message': f'Sin permiso para unirse a {room}'})
+        return False
+    join_room(room)
+    return True
 
 
 @socketio.on('join_room')
@@ -138,8 +174,9 @@ def handle_join_room(data):
     if not room:
         emit('error', {'message': 'Room requerida'})
         return
+    if not unirse_con_permiso(room):
+        return
     
-    join_room(room)
     print(f'🏠 Cliente {request.sid} se unió a la sala: {room}')
     emit('joined_room', {
         'room': room,
@@ -157,7 +194,8 @@ def handle_join_ticket(data):
         return
 
     room = f'room_ticket_{ticket_id}'
-    join_room(room)
+    if not unirse_con_permiso(room):
+        return
     print(f'Usuario se unió al ticket room: {room}')
     emit('joined_ticket', {'room': room, 'ticket_id': ticket_id})
 
@@ -185,7 +223,8 @@ def handle_join_chat_supervisor_analista(data):
         return
 
     room = f'chat_supervisor_analista_{ticket_id}'
-    join_room(room)
+    if not unirse_con_permiso(room):
+        return
     print(f'✅ Usuario se unió al chat supervisor-analista: {room}')
     emit('joined_chat_supervisor_analista', {
          'room': room, 'ticket_id': ticket_id})
@@ -215,7 +254,8 @@ def handle_join_chat_analista_cliente(data):
         return
 
     room = f'chat_analista_cliente_{ticket_id}'
-    join_room(room)
+    if not unirse_con_permiso(room):
+        return
     print(f'✅ Usuario se unió al chat analista-cliente: {room}')
     emit('joined_chat_analista_cliente', {
          'room': room, 'ticket_id': ticket_id})
@@ -237,12 +277,16 @@ def handle_leave_chat_analista_cliente(data):
 # Eventos mejorados para sincronización global
 @socketio.on('join_role_room')
 def handle_join_role_room(data):
-    """Unirse al room específico del rol del usuario"""
-    role = data.get('role')
-    user_id = data.get('user_id')
+    """Unirse al room específico del rol del usuario (el del token, no el que envía el cliente)"""
+    usuario = registro_sesiones.usuario(request.sid)
+    if usuario is None:
+        emit('error', {'message': 'Autenticación requerida'})
+        return
+    role = usuario['role']
+    user_id = usuario['user_id']
     
-    if not role or not user_id:
-        emit('error', {'message': 'role y user_id requeridos'})
+    if data.get('role', role) != role or str(data.get('user_id', user_id)) != str(user_id):
+        emit('error', {'message': 'role y user_id no coinciden con la sesión'})
         return
     
     # Room específico del rol
@@ -289,98 +333,104 @@ def handle_leave_role_room(data):
 
 @socketio.on('request_sync')
 def handle_request_sync(data):
-    """Solicitar sincronización de datos"""
+    """Solicitar sincronización de datos (solo para quien la pide)"""
     sync_type = data.get('type', 'all')
     user_id = data.get('user_id')
     role = data.get('role')
     
     print(f'🔄 Solicitud de sincronización: {sync_type} para usuario {user_id} ({role})')
     
-    # Emitir evento de sincronización solicitada
+    # Los demás clientes del rol no perdieron nada: ya no se les pide recargar
     emit('sync_requested', {
         'type': sync_type,
         'user_id': user_id,
         'role': role,
-        'timestamp': datetime.now().isoformat()
+        'timestamp': datetime.now().isoformat(),
+        'replay': replay.posicion()
     })
+
+@socketio.on('resume')
+def handle_resume(data):
+    """Reenviar los eventos perdidos durante una desconexión (tras volver a unirse a las rooms)"""
+    data = data or {}
+    rooms_cliente = [room for room in rooms() if room != request.sid]
+    eventos, motivo = replay.pendientes(data.get('epoca'), data.get('ultimo_seq'), rooms_cliente)
+    posicion = replay.posicion()
     
-    # Notificar a otros usuarios del mismo rol si es necesario
-    if role:
-        role_room = f'role_{role}'
-        emit('sync_triggered', {
-            'type': sync_type,
-            'triggered_by': user_id,
-            'role': role,
+    if motivo:
+        print(f'🔄 Resincronización completa para {request.sid}: {motivo}')
+        emit('resync_required', {
+            'motivo': motivo,
+            'replay': posicion,
             'timestamp': datetime.now().isoformat()
-        }, room=role_room, include_self=False)
+        })
+        return
+    
+    print(f'⏩ Reanudación de {request.sid}: {len(eventos)} eventos reenviados')
+    emit('resumed', {
+        'eventos': [{'seq': seq, 'evento': evento, 'datos': datos} for seq, evento, datos in eventos],
+        'replay': posicion,
+        'timestamp': datetime.now().isoformat()
+    })
 
 @socketio.on('critical_ticket_action')
 def handle_critical_ticket_action(data):
     """Manejar acciones críticas de tickets que requieren sincronización inmediata"""
     ticket_id = data.get('ticket_id')
     action = data.get('action')
-    user_id = data.get('user_id')
-    role = data.get('role')
+    # El autor es siempre el del token: role/user_id del mensaje se ignoran
+    usuario = registro_sesiones.usuario(request.sid)
+    if usuario is None:
+        emit('error', {'message': 'Autenticación requerida'})
+        return
+    user_id, role = usuario['user_id'], usuario['role']
     
     if not ticket_id or not action:
         emit('error', {'message': 'ticket_id y action requeridos'})
         return
+    if not str(ticket_id).isdigit() or not Ticket.visible_para(int(ticket_id), role, user_id):
+        emit('error', {'message': 'Sin permiso sobre el ticket'})
+        return
+    ticket_id = int(ticket_id)
     
     print(f'🚨 ACCIÓN CRÍTICA DE TICKET: {action} en ticket {ticket_id} por {role} (ID: {user_id})')
     
-    # Emitir a todos los roles críticos (cliente, analista, supervisor)
-    critical_roles = ['cliente', 'analista', 'supervisor']
-    
-    for critical_role in critical_roles:
-        role_room = f'role_{critical_role}'
-        emit('critical_ticket_update', {
-            'ticket_id': ticket_id,
-            'action': action,
-            'user_id': user_id,
-            'role': role,
-            'timestamp': datetime.now().isoformat(),
-            'priority': 'critical'
-        }, room=role_room)
-    
-    # También emitir al room específico del ticket
-    ticket_room = f'room_ticket_{ticket_id}'
-    emit('critical_ticket_update', {
+    # Una copia por socket entre los roles críticos (cliente, analista, supervisor) y el room del ticket
+    publicar('accion_critica', {
         'ticket_id': ticket_id,
         'action': action,
         'user_id': user_id,
         'role': role,
         'timestamp': datetime.now().isoformat(),
         'priority': 'critical'
-    }, room=ticket_room)
+    }, ticket_id=ticket_id)
     
-    print(f'📤 Evento crítico enviado a roles: {critical_roles} y room: {ticket_room}')
+    print(f'📤 Evento crítico enviado a roles críticos y room: room_ticket_{ticket_id}')
 
 @socketio.on('join_critical_rooms')
 def handle_join_critical_rooms(data):
-    """Unirse a rooms críticos para sincronización inmediata"""
-    user_id = data.get('user_id')
-    role = data.get('role')
-    ticket_ids = data.get('ticket_ids', [])
-    
-    if not user_id or not role:
-        emit('error', {'message': 'user_id y role requeridos'})
+    """Unirse a rooms críticos: el del rol y los de los tickets abiertos del usuario"""
+    usuario = registro_sesiones.usuario(request.sid)
+    if usuario is None:
+        emit('error', {'message': 'Autenticación requerida'})
         return
+    user_id = usuario['user_id']
+    role = usuario['role']
     
-    print(f'🔐 Usuario {user_id} ({role}) uniéndose a rooms críticos')
+    # Los tickets salen de la base y no de data['ticket_ids']: el cliente no puede pedir
+    # tickets ajenos ni mandar miles en cada reconexión
+    consulta = Ticket.consulta_ids_relevantes(role, user_id)
+    ticket_ids = [ticket_id for ticket_id, in consulta] if consulta is not None else []
     
-    # Unirse al room del rol
     role_room = f'role_{role}'
-    join_room(role_room)
-    
-    # Unirse a rooms de tickets específicos
-    for ticket_id in ticket_ids:
-        ticket_room = f'room_ticket_{ticket_id}'
-        join_room(ticket_room)
-        print(f'🏠 Unido a room crítico: {ticket_room}')
+    ticket_rooms = [f'room_ticket_{ticket_id}' for ticket_id in ticket_ids]
+    for room in (role_room, *ticket_rooms):
+        join_room(room)
     
+    print(f'🔐 Usuario {user_id} ({role}) unido a {role_room} y {len(ticket_rooms)} rooms de tickets')
     emit('joined_critical_rooms', {
         'role_room': role_room,
-        'ticket_rooms': [f'room_ticket_{tid}' for tid in ticket_ids],
+        'ticket_rooms': ticket_rooms,
         'user_id': user_id,
         'role': role,
         'timestamp': datetime.now().isoformat()
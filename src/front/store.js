@@ -650,13 +650,69 @@ export const authActions = {
         dispatch({ type: "websocket_notification", payload: data });
       });
 
+      // Última posición vista del bus de eventos ({ epoca, seq }) para reanudar
+      // tras una reconexión en lugar de recargar todo
+      const actualizarReplay = (meta) => {
+        if (!meta || !meta.epoca) return;
+        const actual = window.websocketReplay;
+        if (!actual || actual.epoca !== meta.epoca || meta.seq > actual.seq) {
+          window.websocketReplay = { epoca: meta.epoca, seq: meta.seq };
+        }
+      };
+
+      // seq de los eventos recibidos en vivo desde la última conexión: si vuelven a
+      // llegar dentro de "resumed" ya se procesaron y se descartan
+      let vistosEnVivo = new Set();
+
+      socket.onAny((evento, datos, meta) => {
+        if (meta && meta.epoca) vistosEnVivo.add(meta.seq);
+        actualizarReplay(meta);
+      });
+
+      socket.on("connected", (data) => {
+        // Primera conexión: se parte de la posición actual del servidor
+        if (!window.websocketReplay) actualizarReplay(data.replay);
+      });
+
+      socket.on("resumed", (data) => {
+        console.log(`⏩ Reanudado: ${data.eventos.length} eventos reenviados`);
+        data.eventos.forEach(({ evento, datos, seq }) => {
+          if (vistosEnVivo.has(seq)) return;
+          const meta = { epoca: data.replay.epoca, seq };
+          socket.listeners(evento).forEach((listener) => listener(datos, meta));
+        });
+        actualizarReplay(data.replay);
+      });
+
+      socket.on("resync_required", (data) => {
+        console.log("🔄 Resincronización completa requerida:", data.motivo);
+        // El aviso de eventos descartados (motivo "descartado") no trae posición
+        if (data.replay) window.websocketReplay = data.replay;
+        dispatch({ type: "sync_requested", payload: data });
+      });
+
       socket.on("connect", () => {
         window.websocketConnecting = false;
         console.log("🔌 WebSocket conectado exitosamente");
         dispatch({ type: "websocket_connected", payload: socket });
 
-        // Unirse automáticamente a rooms del rol si el usuario está autenticado
+        // Reconexión: pedir los eventos perdidos una vez de vuelta en las rooms. La
+        // posición se toma ahora, antes de unirse: los eventos en vivo que lleguen
+        // mientras tanto la adelantarían por encima del hueco
         const currentUser = dispatch.getState?.()?.auth?.user;
+        vistosEnVivo = new Set();
+        if (window.websocketReplay) {
+          const posicion = { ...window.websocketReplay };
+          const reanudar = () =>
+            socket.emit("resume", {
+              epoca: posicion.epoca,
+              ultimo_seq: posicion.seq,
+            });
+          if (currentUser) socket.once("joined_critical_rooms", reanudar);
+          else reanudar();
+        }
+
+        // Unirse automáticamente a rooms del rol si el usuario está autenticado
         if (currentUser) {
           // Unirse a todas las rooms críticas
           authActions.joinAllCriticalRooms(socket, currentUser);
@@ -732,11 +788,6 @@ export const authActions = {
       });
 
       // Eventos de sincronización global
-      socket.on("sync_triggered", (data) => {
-        console.log("🔄 Sincronización global solicitada:", data);
-        dispatch({ type: "sync_triggered", payload: data });
-      });
-
       socket.on("sync_requested", (data) => {
         console.log("🔄 Solicitud de sincronización recibida:", data);
         dispatch({ type: "sync_requested", payload: data });
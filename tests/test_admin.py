@@ -0,0 +1,67 @@
+"""
+Panel de administración (api/admin.py): los usuarios creados o editados desde el
+formulario guardan el hash de la contraseña, nunca el texto.
+"""
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'src'))
+
+from api import passwords  # noqa: E402
+from api.admin import setup_admin  # noqa: E402
+from api.models import db, Cliente, Analista  # noqa: E402
+from api.passwords import es_hash, verificar_contraseña  # noqa: E402
+
+
+@pytest.fixture
+def cliente_http(monkeypatch):
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_ITERACIONES', 1000)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+    setup_admin(app)
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+
+def test_crear_cliente_hashea_la_contraseña(cliente_http):
+    respuesta = cliente_http.post('/admin/cliente/new/', data={
+        'nombre': 'c', 'apellido': 'x', 'email': 'c@test.com', 'direccion': 'd',
+        'telefono': '1', 'contraseña': 'secreta',
+    })
+    assert respuesta.status_code == 302
+
+    cliente = Cliente.query.one()
+    assert es_hash(cliente.contraseña_hash)
+    assert verificar_contraseña(cliente.contraseña_hash, 'secreta')
+
+
+def test_editar_sin_contraseña_conserva_la_actual(cliente_http):
+    cliente_http.post('/admin/analista/new/', data={
+        'nombre': 'a', 'apellido': 'x', 'email': 'a@test.com', 'especialidad': 'e', 'contraseña': 'vieja',
+    })
+    analista = Analista.query.one()
+    anterior = analista.contraseña_hash
+
+    respuesta = cliente_http.post(f'/admin/analista/edit/?id={analista.id}', data={
+        'nombre': 'a', 'apellido': 'y', 'email': 'a@test.com', 'especialidad': 'e', 'contraseña': '',
+    })
+    assert respuesta.status_code == 302
+
+    db.session.expire_all()
+    analista = Analista.query.one()
+    assert analista.apellido == 'y' and analista.contraseña_hash == anterior
+
+
+def test_crear_sin_contraseña_no_crea_el_usuario(cliente_http):
+    respuesta = cliente_http.post('/admin/analista/new/', data={
+        'nombre': 'a', 'apellido': 'x', 'email': 'a@test.com', 'especialidad': 'e', 'contraseña': '',
+    })
+    assert respuesta.status_code == 200
+    assert Analista.query.count() == 0
@@ -0,0 +1,28 @@
+"""
+Buffers de reenvío (api/replay.py): las rooms que solo tienen descartes también caducan.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'src'))
+
+from api import replay as modulo_replay  # noqa: E402
+from api.replay import BufferReplay  # noqa: E402
+
+
+def test_entrega_tras_caducar_una_room_con_descarte(monkeypatch):
+    monkeypatch.setattr(modulo_replay, '_INTERVALO_PODA', 0)
+    buffer = BufferReplay(ttl=0.01)
+    buffer.marcar_descarte(['room_ticket_1'])
+    time.sleep(0.02)
+
+    enviados = []
+    buffer.entregar('ticket_actualizado', {'id': 2}, ['room_ticket_2'], enviados.append)
+
+    assert enviados == [{'seq': 2, 'epoca': buffer.epoca}]
+    assert buffer.estadisticas()['rooms'] == 1
+    # Quien vio menos que el descarte ya no puede reanudar esa room
+    assert buffer.pendientes(buffer.epoca, 0, ['room_ticket_1']) == (None, 'room_caducada')
+    eventos, motivo = buffer.pendientes(buffer.epoca, 1, ['room_ticket_1', 'room_ticket_2'])
+    assert motivo is None and [e[0] for e in eventos] == [2]
@@ -0,0 +1,65 @@
+"""
+Lista de tokens revocados (api/jwt_utils.RevocationList): una revocación que se
+confirma después de otra con id mayor no se pierde en el refresco incremental.
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'src'))
+
+from api.models import db, TokenRevocado  # noqa: E402
+from api.jwt_utils import RevocationList  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def revocar(id, jti, fecha):
+    db.session.add(TokenRevocado(id=id, jti=jti, expira=datetime.utcnow() + timedelta(hours=1),
+                                fecha_revocacion=fecha))
+    db.session.commit()
+
+
+def revocado(lista, jti):
+    lista._next_refresh = 0
+    return lista.is_revoked({'jti': jti, 'iat': 0})
+
+
+def test_revocaciones_confirmadas_fuera_de_orden(app):
+    lista = RevocationList()
+    assert not revocado(lista, 'a')
+
+    ahora = datetime.utcnow()
+    # El id 10 se toma antes pero su logout se confirma después que el del id 11
+    revocar(11, 'b', ahora)
+    assert revocado(lista, 'b')
+    revocar(10, 'a', ahora - timedelta(seconds=1))
+    assert revocado(lista, 'a')
+    assert lista.stats()['ultimo_id'] == 11
+
+
+def test_la_poda_recarga_toda_la_tabla(app):
+    lista = RevocationList()
+    revocado(lista, 'x')
+
+    ahora = datetime.utcnow()
+    revocar(11, 'b', ahora)
+    revocado(lista, 'b')
+    # Fuera de la ventana de solapamiento: solo la recarga completa la recupera
+    revocar(10, 'a', ahora - timedelta(hours=2))
+    assert not revocado(lista, 'a')
+    lista._next_prune = 0
+    assert revocado(lista, 'a')
@@ -0,0 +1,95 @@
+"""
+Serializar una lista de tickets cuesta un número fijo de consultas, sin importar
+cuántos tickets haya (Ticket.opciones_serializacion + Ticket.serialize_many).
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'src'))
+
+from api.models import (  # noqa: E402
+    db, Cliente, Analista, Supervisor, Ticket, Asignacion, Comentarios
+)
+from api.passwords import hashear_contraseña  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def crear_tickets(n):
+    contraseña = hashear_contraseña('123456', iteraciones=1000)
+    cliente = Cliente(nombre='c', apellido='x', email='c@test.com', contraseña_hash=contraseña,
+                      direccion='d', telefono='1')
+    analista = Analista(nombre='a', apellido='x', email='a@test.com', contraseña_hash=contraseña, especialidad='e')
+    supervisor = Supervisor(nombre='s', apellido='x', email='s@test.com', contraseña_hash=contraseña,
+                            area_responsable='r')
+    db.session.add_all([cliente, analista, supervisor])
+    db.session.flush()
+
+    ahora = datetime.now()
+    for i in range(n):
+        ticket = Ticket(id_cliente=cliente.id, estado=['en espera', 'solucionado', 'en proceso'][i % 3],
+                        titulo=f't{i}', descripcion='d', prioridad='alta',
+                        fecha_creacion=ahora + timedelta(seconds=i), reapertura_pendiente=(i % 3 == 1))
+        db.session.add(ticket)
+        db.session.flush()
+        asignacion = Asignacion(id_ticket=ticket.id, id_supervisor=supervisor.id, id_analista=analista.id,
+                                fecha_asignacion=ahora)
+        db.session.add(asignacion)
+        db.session.flush()
+        ticket.asignacion_actual = asignacion
+        db.session.add(Comentarios(id_ticket=ticket.id, id_cliente=cliente.id, texto='hola', fecha_comentario=ahora))
+        db.session.add(Comentarios(id_ticket=ticket.id, id_analista=analista.id, texto='visto', fecha_comentario=ahora))
+    db.session.commit()
+    db.session.expunge_all()
+
+
+def consultas_al_serializar():
+    sentencias = []
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        sentencias.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", contar)
+    try:
+        tickets = Ticket.query.options(*Ticket.opciones_serializacion()).order_by(Ticket.id).all()
+        serializados = Ticket.serialize_many(tickets)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", contar)
+    return len(sentencias), serializados
+
+
+@pytest.mark.parametrize("n", [4, 40])
+def test_serializa_todos_los_tickets(app, n):
+    crear_tickets(n)
+    _, serializados = consultas_al_serializar()
+    assert len(serializados) == n
+    assert all(t["asignacion_actual"]["analista"] and len(t["comentarios"]) == 2 for t in serializados)
+    assert sum(t["tiene_solicitud_reapertura_pendiente"] for t in serializados) == len(range(1, n, 3))
+
+
+def test_consultas_constantes_con_mas_tickets(app):
+    crear_tickets(4)
+    pocas, _ = consultas_al_serializar()
+
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    crear_tickets(40)
+    muchas, _ = consultas_al_serializar()
+
+    assert pocas == muchas